@@ -0,0 +1,313 @@
+"""Serveur web asynchrone: le dashboard sur la boucle du bot et du checker
+
+    python aio_server.py
+
+Un seul processus, une seule boucle asyncio. aiohttp sert lui-même les
+routes appelées en continu par le dashboard (/api/services, /api/status,
+/api/logs, /api/ping, /api/stream) à partir de l'état du checker, des
+buffers de résultats et des caches partagés; un client SSE ne coûte plus
+un thread. Le bot Discord tourne sur la même boucle. Les autres routes
+(OAuth, pages, import/export...) passent par l'application Flask,
+appelée dans un pool de threads (pont WSGI): pas d'ASGI à ajouter,
+aiohttp est déjà utilisé par le checker.
+"""
+import asyncio
+import hashlib
+import io
+import json
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from functools import partial
+from urllib.parse import unquote_to_bytes
+
+from aiohttp import web
+from itsdangerous import BadSignature
+from werkzeug.http import parse_etags, quote_etag
+
+from app import (
+    app as flask_app, owned_service, user_services, status_counts, service_logs, record_ping, run_ping, HTTP_SECONDS,
+)
+from config import DISCORD_TOKEN, CHECKER_MODE, SSE_HEARTBEAT, IMPORT_MAX_BYTES, WEB_PORT, WEB_THREADS
+from discord_bot import bot, checker
+from events import broker
+from jobs import jobs
+
+executor = ThreadPoolExecutor(max_workers=WEB_THREADS, thread_name_prefix="web")
+# Fin de réponse dans le pont WSGI
+_END = object()
+
+
+def session_user(request):
+    """user_id de la session Flask (cookie signé avec SECRET_KEY), ou None"""
+    cookie = request.cookies.get(flask_app.config["SESSION_COOKIE_NAME"])
+    if not cookie:
+        return None
+    serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+    try:
+        data = serializer.loads(cookie, max_age=int(flask_app.permanent_session_lifetime.total_seconds()))
+    except BadSignature:
+        return None
+    return data.get("user_id")
+
+
+def require_login(handler):
+    async def wrapper(request):
+        user_id = session_user(request)
+        if user_id is None:
+            raise web.HTTPFound("/")
+        return await handler(request, user_id)
+    return wrapper
+
+
+def run_blocking(fn, *args, **kwargs):
+    return asyncio.get_running_loop().run_in_executor(executor, partial(fn, *args, **kwargs))
+
+
+@web.middleware
+async def timing(request, handler):
+    started = time.perf_counter()
+    response = await handler(request)
+    route = request.match_info.route.name
+    # Routes Flask: déjà mesurées par after_request; le flux SSE reste ouvert
+    if route not in (None, "stream"):
+        HTTP_SECONDS.observe(time.perf_counter() - started,
+                             endpoint=route, method=request.method, status=response.status)
+    return response
+
+
+@require_login
+async def get_services(request, user_id):
+    # Statut confirmé par le checker de ce processus, plus frais que le cache
+    services = await run_blocking(user_services, user_id, checker.states.status)
+    body = json.dumps(services).encode()
+    etag = hashlib.sha1(body).hexdigest()
+    # Même règle que Flask (make_conditional): liste d'ETags, W/ et * compris
+    if parse_etags(request.headers.get("If-None-Match")).contains_weak(etag):
+        return web.Response(status=304, headers={"ETag": quote_etag(etag)})
+    return web.Response(body=body, content_type="application/json", headers={"ETag": quote_etag(etag)})
+
+
+async def api_status(request):
+    return web.json_response(await run_blocking(status_counts))
+
+
+@require_login
+async def get_logs(request, user_id):
+    body, status = await run_blocking(service_logs, user_id, int(request.match_info["service_id"]))
+    return web.json_response(body, status=status)
+
+
+async def _ping(job_id, service):
+    """Ping par le moteur de probes du checker (pool de connexions partagé, quorum des points de vue)"""
+    try:
+        result = await checker.probe(service)
+        outcome = await run_blocking(record_ping, job_id, service, result["status"], result["latency_ms"])
+    except Exception as e:
+        jobs.finish(job_id, service["owner_id"], error=str(e))
+        return
+    jobs.finish(job_id, service["owner_id"], outcome)
+
+
+@require_login
+async def manual_ping(request, user_id):
+    try:
+        service, denied = await run_blocking(owned_service, user_id, int(request.match_info["service_id"]))
+    except Exception as e:
+        return web.json_response({"error": str(e)}, status=500)
+    if denied:
+        return web.json_response(denied[0], status=denied[1])
+    if CHECKER_MODE == "embedded":
+        job_id = jobs.create(user_id)
+        task = asyncio.create_task(_ping(job_id, service))
+        checker.pending_checks.add(task)
+        task.add_done_callback(checker.pending_checks.discard)
+    else:
+        # Les checks tournent ailleurs: même chemin que Flask (pool de jobs)
+        job_id = jobs.submit(user_id, run_ping, service)
+    return web.json_response({"job_id": job_id, "state": "pending"}, status=202)
+
+
+@require_login
+async def ping_job(request, user_id):
+    job = jobs.get(request.match_info["job_id"], user_id)
+    if job is None:
+        return web.json_response({"error": "Job not found"}, status=404)
+    return web.json_response({k: v for k, v in job.items() if k != "owner_id"})
+
+
+@require_login
+async def stream(request, user_id):
+    """Server-Sent Events, une file asyncio par client (aucun thread bloqué)"""
+    response = web.StreamResponse(headers={
+        "Content-Type": "text/event-stream",
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    })
+    await response.prepare(request)
+    subscription = broker.subscribe_async(user_id)
+    try:
+        await response.write(b"retry: 5000\n\n")
+        while True:
+            try:
+                event_type, data = await subscription.get(SSE_HEARTBEAT)
+            except asyncio.TimeoutError:
+                await response.write(b": keep-alive\n\n")
+                continue
+            await response.write(f"event: {event_type}\ndata: {json.dumps(data)}\n\n".encode())
+    except ConnectionResetError:
+        pass
+    finally:
+        broker.unsubscribe(subscription)
+    return response
+
+
+def _environ(request, body):
+    host, _, port = request.host.partition(":")
+    environ = {
+        "REQUEST_METHOD": request.method,
+        "SCRIPT_NAME": "",
+        # PEP 3333: chemin décodé, en str latin-1
+        "PATH_INFO": unquote_to_bytes(request.raw_path.split("?", 1)[0]).decode("latin-1"),
+        "QUERY_STRING": request.query_string,
+        "SERVER_NAME": host,
+        "SERVER_PORT": port or ("443" if request.scheme == "https" else "80"),
+        "SERVER_PROTOCOL": f"HTTP/{request.version.major}.{request.version.minor}",
+        "REMOTE_ADDR": request.remote or "",
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": request.scheme,
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+    if "Content-Type" in request.headers:
+        environ["CONTENT_TYPE"] = request.headers["Content-Type"]
+    for name, value in request.headers.items():
+        key = "HTTP_" + name.upper().replace("-", "_")
+        if key in ("HTTP_CONTENT_TYPE", "HTTP_CONTENT_LENGTH"):
+            continue
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+def _run_flask(environ, send):
+    """Appel WSGI complet dans un thread du pool; statut puis morceaux passent par send()
+
+    Toute l'itération reste dans le même thread: stream_with_context garde
+    le contexte de requête Flask du premier au dernier morceau.
+    """
+    started = {}
+
+    def start_response(status, headers, exc_info=None):
+        started["status"], started["headers"] = status, headers
+
+    try:
+        result = flask_app(environ, start_response)
+        try:
+            send(started)
+            for chunk in result:
+                if chunk:
+                    send(chunk)
+        finally:
+            if hasattr(result, "close"):
+                result.close()
+    finally:
+        send(_END)
+
+
+def _bridge_done(future):
+    """Erreur du thread Flask: loguée au lieu d'être perdue (un client parti n'en est pas une)"""
+    if future.cancelled() or isinstance(future.exception(), ConnectionResetError):
+        return
+    if future.exception() is not None:
+        print(f"⚠️ Erreur pont WSGI: {future.exception()!r}")
+
+
+async def wsgi_bridge(request):
+    """Route Flask: la réponse est relayée morceau par morceau, avec contre-pression"""
+    body = await request.read()
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(maxsize=8)
+    abandoned = threading.Event()
+
+    def send(item):
+        if abandoned.is_set():
+            raise ConnectionResetError("réponse abandonnée")
+        future = asyncio.run_coroutine_threadsafe(queue.put(item), loop)
+        # Réponse abandonnée pendant l'attente (client parti, arrêt du serveur):
+        # le put ne sera jamais lu, voire jamais exécuté si la boucle est fermée
+        while True:
+            try:
+                return future.result(timeout=1)
+            except FutureTimeout:
+                if abandoned.is_set():
+                    if not loop.is_closed():
+                        future.cancel()
+                    raise ConnectionResetError("réponse abandonnée") from None
+
+    future = loop.run_in_executor(executor, _run_flask, _environ(request, body), send)
+    future.add_done_callback(_bridge_done)
+    finished = False
+    try:
+        started = await queue.get()
+        if started is _END:
+            finished = True
+            return web.Response(status=500)
+        code, _, reason = started["status"].partition(" ")
+        response = web.StreamResponse(status=int(code), reason=reason or None)
+        for name, value in started["headers"]:
+            response.headers.add(name, value)
+        await response.prepare(request)
+        while (chunk := await queue.get()) is not _END:
+            await response.write(chunk)
+        finished = True
+        await response.write_eof()
+        return response
+    finally:
+        if not finished:
+            # Client parti: le thread Flask s'arrête au prochain send() au lieu d'attendre la boucle
+            abandoned.set()
+
+
+def create_app():
+    # En mode embedded le checker tourne sur cette boucle: le dashboard peut utiliser le flux SSE
+    flask_app.config["LIVE_STREAM"] = CHECKER_MODE == "embedded"
+    app = web.Application(middlewares=[timing], client_max_size=IMPORT_MAX_BYTES)
+    app.router.add_get("/api/services", get_services, name="get_services")
+    app.router.add_get("/api/status", api_status, name="api_status")
+    app.router.add_get("/api/logs/{service_id:\\d+}", get_logs, name="get_logs")
+    app.router.add_post("/api/ping/{service_id:\\d+}", manual_ping, name="manual_ping")
+    app.router.add_get("/api/ping/jobs/{job_id}", ping_job, name="ping_job")
+    app.router.add_get("/api/stream", stream, name="stream")
+    app.router.add_route("*", "/{path:.*}", wsgi_bridge)
+    return app
+
+
+async def serve(port=WEB_PORT):
+    runner = web.AppRunner(create_app(), handle_signals=False)
+    await runner.setup()
+    await web.TCPSite(runner, "0.0.0.0", port).start()
+    print(f"🌐 Dashboard (aiohttp) sur le port {port}")
+    try:
+        if DISCORD_TOKEN:
+            async with bot:
+                await bot.start(DISCORD_TOKEN)
+        elif CHECKER_MODE == "embedded":
+            # Sans bot, le checker tourne seul sur la boucle
+            await checker.run()
+        else:
+            await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+        executor.shutdown(wait=False)
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,221 @@
+"""Envoi groupé des alertes de changement de statut sur Discord"""
+import asyncio
+import time
+
+import aiohttp
+
+from config import DISCORD_TOKEN, ALERT_BATCH_WINDOW, ALERT_CHANNEL_RATE, ALERT_CHANNEL_PERIOD
+
+DISCORD_API = "https://discord.com/api/v10"
+# Limites d'un embed Discord
+MAX_DESCRIPTION = 4000
+
+
+class TokenBucket:
+    """rate envois par période, avec une rafale de rate au maximum"""
+
+    def __init__(self, rate, period, clock=time.monotonic):
+        self.capacity = max(1, rate)
+        self.refill = self.capacity / period
+        self.tokens = float(self.capacity)
+        self.clock = clock
+        self.updated = clock()
+        self.blocked_until = 0
+
+    def take(self):
+        now = self.clock()
+        if now < self.blocked_until:
+            return False
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.refill)
+        self.updated = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+    def block(self, seconds):
+        """Bloque le salon (limite annoncée par Discord)"""
+        self.blocked_until = max(self.blocked_until, self.clock() + seconds)
+
+
+class AlertDispatcher:
+    """Regroupe les transitions par salon et envoie un seul embed par salon
+
+    Les transitions arrivées pendant window secondes partent ensemble.
+    Un service qui revient à son statut de départ dans la fenêtre
+    n'apparaît pas. Si un salon a épuisé son quota, ses alertes restent en
+    attente et sont fusionnées avec les suivantes: une panne massive donne
+    un message par salon, pas un par service. Le salon est celui du
+    service (alert_channel_id), sinon le salon système du serveur, sinon
+    (service créé depuis le dashboard, guild_id 0) un message privé au
+    propriétaire. Les alertes sans destination sont comptées dans dropped.
+    """
+
+    def __init__(self, token=DISCORD_TOKEN, window=ALERT_BATCH_WINDOW,
+                 rate=ALERT_CHANNEL_RATE, period=ALERT_CHANNEL_PERIOD):
+        self.token = token
+        self.window = window
+        self.rate = rate
+        self.period = period
+        self.session = None
+        self._task = None
+        # cible -> {service_id: (service, ancien statut, nouveau statut, latence)}
+        self._pending = {}
+        self._buckets = {}
+        self._guild_channels = {}
+        self._dm_channels = {}
+        self._global_until = 0
+        self.sent = 0
+        self.dropped = 0
+
+    @property
+    def enabled(self):
+        return bool(self.token)
+
+    async def start(self):
+        if not self.enabled:
+            return
+        if self.session is None:
+            self.session = aiohttp.ClientSession(
+                headers={"Authorization": f"Bot {self.token}"},
+                timeout=aiohttp.ClientTimeout(total=10)
+            )
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.session is not None:
+            # Dernier envoi de ce qui reste (dans la limite des quotas)
+            await self.flush()
+            await self.session.close()
+            self.session = None
+
+    def notify(self, service, old, new, latency_ms=None):
+        """Ajoute une transition au prochain envoi (ne bloque pas)"""
+        if not self.enabled:
+            return
+        target = service.get("alert_channel_id") or (
+            ("guild", service["guild_id"]) if service.get("guild_id") else ("dm", service.get("owner_id")))
+        batch = self._pending.setdefault(target, {})
+        previous = batch.get(service["id"])
+        if previous is not None:
+            old = previous[1]
+        if old == new:
+            # Aller-retour dans la fenêtre: rien à signaler
+            batch.pop(service["id"], None)
+        else:
+            batch[service["id"]] = (service, old, new, latency_ms)
+        if not batch:
+            del self._pending[target]
+
+    def pending(self):
+        return sum(len(batch) for batch in self._pending.values())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.window)
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"⚠️ Erreur alertes: {e}")
+
+    async def flush(self):
+        for target in list(self._pending):
+            if time.monotonic() < self._global_until:
+                return
+            channel_id = await self._resolve(target)
+            if channel_id is None:
+                dropped = len(self._pending.pop(target))
+                self.dropped += dropped
+                print(f"⚠️ {dropped} alerte(s) sans salon ni destinataire ({target[0]} {target[1]}), ignorée(s)")
+                continue
+            bucket = self._buckets.setdefault(channel_id, TokenBucket(self.rate, self.period))
+            if not bucket.take():
+                continue
+            batch = self._pending.pop(target)
+            if not await self._send(channel_id, bucket, self._embed(batch.values())):
+                # On réessaie au prochain tour, fusionné avec les nouvelles transitions
+                for service_id, entry in batch.items():
+                    self._pending.setdefault(target, {}).setdefault(service_id, entry)
+
+    async def _resolve(self, target):
+        """Identifiant du salon d'une cible (salon système d'un serveur, message privé d'un utilisateur)"""
+        if not isinstance(target, tuple):
+            return str(target)
+        kind, target_id = target
+        if not target_id:
+            return None
+        channels = self._guild_channels if kind == "guild" else self._dm_channels
+        if target_id not in channels:
+            try:
+                if kind == "guild":
+                    request = self.session.get(f"{DISCORD_API}/guilds/{target_id}")
+                    field = "system_channel_id"
+                else:
+                    request = self.session.post(f"{DISCORD_API}/users/@me/channels",
+                                                json={"recipient_id": str(target_id)})
+                    field = "id"
+                async with request as resp:
+                    channel_id = (await resp.json()).get(field) if resp.status == 200 else None
+            except aiohttp.ClientError as e:
+                print(f"⚠️ Destination {kind} {target_id} introuvable: {e}")
+                return None
+            channels[target_id] = channel_id
+        return channels[target_id]
+
+    def _embed(self, entries):
+        entries = sorted(entries, key=lambda e: (e[2] == "online", e[0]["name"]))
+        down = sum(1 for _, _, new, _ in entries if new != "online")
+        lines = []
+        for service, _, new, latency_ms in entries:
+            if new == "online":
+                suffix = f" ({latency_ms}ms)" if latency_ms is not None else ""
+                lines.append(f"🟢 **{service['name']}** est de nouveau en ligne{suffix}")
+            else:
+                lines.append(f"🔴 **{service['name']}** est down")
+        description = ""
+        for i, line in enumerate(lines):
+            more = f"\n… et {len(lines) - i} autres"
+            if len(description) + len(line) + 1 + len(more) > MAX_DESCRIPTION:
+                description += more
+                break
+            description += ("\n" if description else "") + line
+        if down and down == len(entries):
+            title = f"🚨 {down} service(s) down"
+        elif not down:
+            title = f"✅ {len(entries)} service(s) rétabli(s)"
+        else:
+            title = f"📡 {down} down, {len(entries) - down} rétabli(s)"
+        return {"title": title, "description": description, "color": 0xE74C3C if down else 0x2ECC71}
+
+    async def _send(self, channel_id, bucket, embed):
+        try:
+            async with self.session.post(f"{DISCORD_API}/channels/{channel_id}/messages",
+                                         json={"embeds": [embed]}) as resp:
+                if resp.headers.get("X-RateLimit-Remaining") == "0":
+                    bucket.block(float(resp.headers.get("X-RateLimit-Reset-After", self.period)))
+                if resp.status == 429:
+                    data = await resp.json()
+                    retry_after = float(data.get("retry_after", self.period))
+                    if data.get("global"):
+                        self._global_until = time.monotonic() + retry_after
+                    else:
+                        bucket.block(retry_after)
+                    return False
+                if resp.status >= 400:
+                    # Salon supprimé ou permissions manquantes: inutile de réessayer
+                    print(f"⚠️ Alerte refusée par Discord ({channel_id}): {resp.status}")
+                    self.dropped += 1
+                    return True
+                self.sent += 1
+                return True
+        except aiohttp.ClientError as e:
+            print(f"⚠️ Erreur envoi alerte ({channel_id}): {e}")
+            return False
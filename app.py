@@ -1,10 +1,23 @@
-from flask import Flask, render_template, jsonify, request, session, redirect, url_for
-from config import DISCORD_CLIENT_ID, DISCORD_CLIENT_SECRET, SECRET_KEY, SUPABASE_URL, SUPABASE_KEY, DISCORD_TOKEN
-from discord_bot import bot
-import requests
-from functools import wraps
+from flask import Flask, render_template, jsonify, request, session, redirect, url_for, Response, stream_with_context
+from config import DISCORD_CLIENT_ID, DISCORD_CLIENT_SECRET, SECRET_KEY, DISCORD_TOKEN, CHECKER_MODE, CACHE_TTL, CACHE_MAX_ENTRIES, SSE_HEARTBEAT, HTTP_TIMEOUT, METRICS_TOKEN, RECENT_RESULTS_SIZE, SLA_MAX_DAYS
+from storage import get_storage, utcnow
+from rollups import pick_resolution, summarize
+from ringbuffer import recent
+from cache import TTLCache
+from events import broker
+from jobs import jobs, http
+from metrics import registry, profiler
+from probe import probe_once, validate_probe_settings
+from bulk import FORMATS, detect_format, read_rows, import_services, export_services
+from sla import uptime_report, maintenance_window
+import io
+import json
+import queue
+from datetime import datetime, timedelta, timezone
+from functools import partial, wraps
 import os
 import hashlib
+import hmac
 import time
 
 # Discord OAuth URLs
@@ -14,22 +27,104 @@ DISCORD_API_URL = "https://discord.com/api"
 
 app = Flask(__name__)
 app.secret_key = SECRET_KEY
+# Flux SSE du dashboard: seulement si le checker tourne dans ce processus
+# (aio_server.py, ou python app.py avec le bot). Sous gunicorn le checker
+# tourne ailleurs: le flux ne recevrait aucun événement, polling ETag.
+app.config["LIVE_STREAM"] = False
 
-# Supabase REST API headers
-SUPABASE_HEADERS = {
-    "apikey": SUPABASE_KEY,
-    "Authorization": f"Bearer {SUPABASE_KEY}",
-    "Content-Type": "application/json"
-}
+storage = get_storage()
 
-def query_supabase(table, query=""):
-    """Simple REST API call to Supabase"""
+# Caches des lectures fréquentes (le dashboard poll /api/services)
+services_cache = TTLCache("services", CACHE_TTL, CACHE_MAX_ENTRIES)
+status_cache = TTLCache("status", CACHE_TTL, 1)
+
+def invalidate_user(user_id, reload=True):
+    """À appeler après toute écriture sur les services d'un utilisateur"""
+    services_cache.invalidate(str(user_id))
+    status_cache.invalidate("counts")
+    if reload:
+        # Les autres onglets ouverts rechargent la liste
+        broker.publish(user_id, "resync", {})
+
+# Logique des routes servies à la fois par Flask et par aio_server.py: les
+# deux serveurs n'en gardent que la conversion en réponse HTTP.
+
+def owned_service(user_id, service_id):
+    """(service, None) si le service appartient à user_id, sinon (None, (erreur, code HTTP))"""
+    service = storage.get_service(service_id)
+    if not service:
+        return None, ({'error': 'Service not found'}, 404)
+    if str(service['owner_id']) != str(user_id):
+        return None, ({'error': 'Unauthorized'}, 403)
+    return service, None
+
+def check_owner(user_id, service_id):
+    """None si le service appartient à user_id, sinon (erreur, code HTTP)
+
+    La liste en cache de l'utilisateur évite une lecture du stockage à
+    chaque poll des logs; sinon le service est relu.
+    """
+    services = services_cache.get(str(user_id))
+    if services is not None and any(s['id'] == service_id for s in services):
+        return None
+    return owned_service(user_id, service_id)[1]
+
+def user_services(user_id, status=None):
+    """Services de user_id (en cache); status(id) donne un statut plus frais, celui du checker du processus"""
+    services = services_cache.get_or_load(str(user_id), lambda: storage.list_services(user_id))
+    if status is not None:
+        services = [{**s, 'status': status(s['id']) or s['status']} for s in services]
+    return services
+
+def status_counts():
+    """Compteurs par statut (en cache), zéros si le stockage ne répond pas"""
     try:
-        url = f"{SUPABASE_URL}/rest/v1/{table}{query}"
-        resp = requests.get(url, headers=SUPABASE_HEADERS, timeout=5)
-        return resp.json() if resp.status_code == 200 else []
-    except:
-        return []
+        # Compteurs calculés par le stockage, pas de scan de la table ici
+        return status_cache.get_or_load("counts", storage.count_by_status)
+    except Exception:
+        return {'online': 0, 'down': 0, 'total': 0}
+
+def service_logs(user_id, service_id):
+    """100 derniers pings d'un service de user_id: (logs ou erreur, code HTTP)"""
+    try:
+        denied = check_owner(user_id, service_id)
+        if denied:
+            return denied
+        # Derniers résultats en mémoire si le checker tourne dans ce processus
+        load = partial(storage.get_pings, service_id, limit=RECENT_RESULTS_SIZE, newest=True)
+        snapshot = recent.snapshot(service_id, load, limit=100)
+        logs = snapshot[0] if snapshot is not None else storage.get_pings(service_id, limit=100, newest=True)
+        return logs, 200
+    except Exception:
+        return [], 200
+
+HTTP_SECONDS = registry.histogram(
+    "downdetector_http_request_seconds", "Durée des requêtes Flask", ["endpoint", "method", "status"])
+
+@app.before_request
+def start_timer():
+    request.started_at = time.perf_counter()
+
+@app.after_request
+def record_request(response):
+    # Le flux SSE reste ouvert: sa durée n'a pas de sens ici
+    if request.endpoint not in (None, 'stream', 'static'):
+        HTTP_SECONDS.observe(time.perf_counter() - request.started_at,
+                             endpoint=request.endpoint, method=request.method, status=response.status_code)
+    return response
+
+def has_metrics_token():
+    auth = request.headers.get('Authorization', '')
+    return bool(METRICS_TOKEN) and hmac.compare_digest(auth, f"Bearer {METRICS_TOKEN}")
+
+def require_metrics_token(f):
+    """Profileur: désactivé tant que METRICS_TOKEN n'est pas défini"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not has_metrics_token():
+            return jsonify({'error': 'Unauthorized'}), 403
+        return f(*args, **kwargs)
+    return decorated_function
 
 def require_login(f):
     @wraps(f)
@@ -60,22 +155,23 @@ def callback_discord():
     
     callback_url = os.getenv("CALLBACK_URL", "http://localhost:5000/callback/discord")
     try:
-        resp = requests.post(DISCORD_TOKEN_URL, data={
+        resp = http.post(DISCORD_TOKEN_URL, data={
             'client_id': DISCORD_CLIENT_ID,
             'client_secret': DISCORD_CLIENT_SECRET,
             'grant_type': 'authorization_code',
             'code': code,
             'redirect_uri': callback_url
-        })
+        }, timeout=HTTP_TIMEOUT)
         
         token_data = resp.json()
         if 'error' in token_data:
             return redirect(url_for('index'))
         
         access_token = token_data.get('access_token')
-        user_resp = requests.get(
+        user_resp = http.get(
             f"{DISCORD_API_URL}/users/@me",
-            headers={'Authorization': f'Bearer {access_token}'}
+            headers={'Authorization': f'Bearer {access_token}'},
+            timeout=HTTP_TIMEOUT
         )
         user_data = user_resp.json()
         
@@ -102,7 +198,8 @@ def callback_discord():
 @app.route('/dashboard')
 @require_login
 def dashboard():
-    return render_template('dashboard.html', username=session.get('username'), avatar_url=session.get('avatar_url'))
+    return render_template('dashboard.html', username=session.get('username'), avatar_url=session.get('avatar_url'),
+                           live_stream=app.config["LIVE_STREAM"])
 
 @app.route('/logout')
 def logout():
@@ -113,9 +210,11 @@ def logout():
 @require_login
 def get_services():
     try:
-        user_id = session['user_id']
-        services = query_supabase("services", f"?owner_id=eq.{user_id}")
-        return jsonify(services), 200
+        services = user_services(session['user_id'])
+        # ETag: le polling de secours reçoit un 304 si rien n'a changé
+        resp = jsonify(services)
+        resp.add_etag()
+        return resp.make_conditional(request)
     except Exception as e:
         return jsonify([]), 200
 
@@ -125,33 +224,67 @@ def add_service():
     try:
         user_id = session['user_id']
         data = request.json
+        try:
+            validate_probe_settings(data.get('probe_mode'), data.get('accepted_status'), data.get('keyword'),
+                                    data.get('url') or '')
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
         
-        resp = requests.post(
-            f"{SUPABASE_URL}/rest/v1/services",
-            json={
-                'name': data.get('name'),
-                'url': data.get('url'),
-                'status': 'online',
-                'owner_id': user_id,
-                'guild_id': 0
-            },
-            headers=SUPABASE_HEADERS,
-            timeout=5
-        )
+        service = storage.add_service({
+            'name': data.get('name'),
+            'url': data.get('url'),
+            'status': 'online',
+            'owner_id': user_id,
+            'guild_id': 0,
+            'check_interval': data.get('check_interval'),
+            'probe_mode': data.get('probe_mode'),
+            'accepted_status': data.get('accepted_status'),
+            'keyword': data.get('keyword')
+        })
+        invalidate_user(user_id)
         
-        return jsonify(resp.json()[0] if resp.json() else {}), 201
+        return jsonify(service), 201
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/services/import', methods=['POST'])
+@require_login
+def import_services_route():
+    """Import CSV ou NDJSON (?format=, sinon Content-Type); un résultat NDJSON par ligne"""
+    user_id = session['user_id']
+    fmt = request.args.get('format') or detect_format(content_type=request.mimetype)
+    if fmt not in FORMATS:
+        return jsonify({'error': f"format inconnu: {fmt} ({', '.join(FORMATS)})"}), 400
+    
+    def results():
+        # Corps lu au fil de l'eau: le fichier n'est jamais chargé en entier
+        lines = io.TextIOWrapper(request.stream, encoding='utf-8-sig', newline='')
+        defaults = {'owner_id': user_id, 'guild_id': 0, 'status': 'online'}
+        try:
+            for result in import_services(storage, read_rows(lines, fmt), defaults):
+                yield json.dumps(result) + "\n"
+        finally:
+            invalidate_user(user_id)
+    
+    return Response(stream_with_context(results()), mimetype='application/x-ndjson')
+
+@app.route('/api/services/export')
+@require_login
+def export_services_route():
+    """Export de tous les services de l'utilisateur (?format=csv ou ndjson)"""
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in FORMATS:
+        return jsonify({'error': f"format inconnu: {fmt} ({', '.join(FORMATS)})"}), 400
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    return Response(stream_with_context(export_services(storage, session['user_id'], fmt)), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename=services.{fmt}'})
+
 @app.route('/api/services/<int:service_id>', methods=['DELETE'])
 @require_login
 def delete_service(service_id):
     try:
-        requests.delete(
-            f"{SUPABASE_URL}/rest/v1/services?id=eq.{service_id}",
-            headers=SUPABASE_HEADERS,
-            timeout=5
-        )
+        storage.delete_service(service_id=service_id, owner_id=session['user_id'])
+        invalidate_user(session['user_id'])
         return jsonify({'status': 'deleted'}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -167,78 +300,200 @@ def get_user():
 
 @app.route('/api/status')
 def api_status():
-    try:
-        services = query_supabase("services", "?select=status")
-        online = sum(1 for s in services if s.get('status') == 'online')
-        down = sum(1 for s in services if s.get('status') == 'down')
-        return jsonify({
-            'online': online,
-            'down': down,
-            'total': len(services)
-        })
-    except:
-        return jsonify({'online': 0, 'down': 0, 'total': 0})
+    return jsonify(status_counts())
+
+@app.route('/api/stream')
+@require_login
+def stream():
+    """Server-Sent Events: statut et latence des services à chaque probe
+
+    Exige un serveur threadé ou asynchrone qui héberge aussi le checker
+    (voir LIVE_STREAM). Sinon 204: EventSource ne se reconnecte pas.
+    """
+    if not app.config["LIVE_STREAM"]:
+        return Response(status=204)
+    user_id = session['user_id']
+    
+    def events():
+        q = broker.subscribe(user_id)
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    event_type, data = q.get(timeout=SSE_HEARTBEAT)
+                except queue.Empty:
+                    # Commentaire SSE: garde la connexion ouverte derrière les proxies
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: {event_type}\ndata: {json.dumps(data)}\n\n"
+        finally:
+            broker.unsubscribe(q)
+    
+    return Response(stream_with_context(events()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+@app.route('/api/cache/stats')
+def cache_stats():
+    if 'user_id' not in session and not has_metrics_token():
+        return jsonify({'error': 'Unauthorized'}), 403
+    return jsonify([services_cache.stats(), status_cache.stats()])
+
+@app.route('/metrics')
+def metrics():
+    if METRICS_TOKEN and not has_metrics_token():
+        return jsonify({'error': 'Unauthorized'}), 403
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/profiler', methods=['GET'])
+@require_metrics_token
+def profiler_report():
+    """Piles au format collapsed (flamegraph.pl / speedscope)"""
+    if request.args.get('format') == 'collapsed':
+        return Response(profiler.collapsed(), mimetype='text/plain')
+    return jsonify({**profiler.stats(), 'top': profiler.top(int(request.args.get('limit', 20)))})
+
+@app.route('/api/profiler/start', methods=['POST'])
+@require_metrics_token
+def profiler_start():
+    duration = request.args.get('duration', type=float)
+    if not profiler.start(duration):
+        return jsonify({'error': 'Profileur déjà actif'}), 409
+    return jsonify(profiler.stats()), 202
+
+@app.route('/api/profiler/stop', methods=['POST'])
+@require_metrics_token
+def profiler_stop():
+    profiler.stop()
+    return jsonify(profiler.stats())
 
 @app.route('/api/logs/<int:service_id>')
 @require_login
 def get_logs(service_id):
+    body, code = service_logs(session['user_id'], service_id)
+    return jsonify(body), code
+
+@app.route('/api/history/<int:service_id>')
+@require_login
+def get_history(service_id):
+    """Historique agrégé sur les N dernières heures (?hours=, 24 par défaut)"""
     try:
-        logs = query_supabase("pings", f"?service_id=eq.{service_id}&order=created_at.asc&limit=100")
-        return jsonify(logs), 200
+        hours = min(max(request.args.get('hours', 24, type=int), 1), 24 * 366)
+        service, denied = owned_service(session['user_id'], service_id)
+        if denied:
+            return jsonify(denied[0]), denied[1]
+        
+        resolution = pick_resolution(hours * 3600)
+        since = datetime.now(timezone.utc) - timedelta(hours=hours)
+        buckets = storage.get_rollups(service_id, resolution, since)
+        return jsonify({
+            'resolution': resolution,
+            'buckets': [summarize(b) for b in buckets]
+        }), 200
     except Exception as e:
-        return jsonify([]), 200
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/uptime/<int:service_id>')
+@require_login
+def get_uptime(service_id):
+    """Uptime, incidents et détail par jour sur les N derniers jours (?days=, 30 par défaut)"""
+    try:
+        days = min(max(request.args.get('days', 30, type=int), 1), SLA_MAX_DAYS)
+        service, denied = owned_service(session['user_id'], service_id)
+        if denied:
+            return jsonify(denied[0]), denied[1]
+        return jsonify(uptime_report(storage, service, days)), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/maintenance/<int:service_id>', methods=['POST'])
+@require_login
+def add_maintenance(service_id):
+    """Fenêtre de maintenance: {"minutes", "starts_at" (ISO, maintenant par défaut), "reason"}"""
+    try:
+        service, denied = owned_service(session['user_id'], service_id)
+        if denied:
+            return jsonify(denied[0]), denied[1]
+        data = request.json or {}
+        try:
+            minutes = int(data.get('minutes', 0))
+            starts_at = data.get('starts_at')
+            starts_at = datetime.fromisoformat(starts_at.replace('Z', '+00:00')) if starts_at else None
+        except (TypeError, ValueError, AttributeError):
+            return jsonify({'error': 'minutes ou starts_at invalide'}), 400
+        if starts_at is not None and starts_at.tzinfo is None:
+            starts_at = starts_at.replace(tzinfo=timezone.utc)
+        if not 1 <= minutes <= 7 * 24 * 60:
+            return jsonify({'error': 'minutes doit être entre 1 et 10080'}), 400
+        window = storage.add_maintenance(maintenance_window(service_id, minutes, starts_at, data.get('reason')))
+        return jsonify(window), 201
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def run_ping(job_id, service):
+    """Ping d'un service (thread du pool de jobs)"""
+    new_status, latency_ms = probe_once(service, http, HTTP_TIMEOUT)
+    return record_ping(job_id, service, new_status, latency_ms)
+
+def record_ping(job_id, service, new_status, latency_ms):
+    """Enregistre le résultat d'un ping manuel (log, statut, événement SSE)"""
+    checked_at = utcnow()
+    
+    # Enregistre le log (table pings)
+    storage.insert_pings([{
+        "service_id": service['id'],
+        "owner_id": service['owner_id'],
+        "service_name": service['name'],
+        "status": new_status,
+        "latency_ms": latency_ms,
+        "created_at": checked_at
+    }])
+    recent.record(service['id'], checked_at, new_status, latency_ms, create=False)
+    
+    # Update service status
+    storage.set_status([service['id']], new_status)
+    invalidate_user(service['owner_id'], reload=False)
+    broker.publish(service['owner_id'], "status", {
+        "id": service['id'],
+        "status": new_status,
+        "latency_ms": latency_ms,
+        "checked_at": checked_at,
+        "job_id": job_id
+    })
+    return {'status': new_status, 'latency_ms': latency_ms}
 
 @app.route('/api/ping/<int:service_id>', methods=['POST'])
 @require_login
 def manual_ping(service_id):
+    """Lance le ping en arrière-plan et retourne l'identifiant du job (202)"""
     try:
-        services = query_supabase("services", f"?id=eq.{service_id}")
-        if not services:
-            return jsonify({'error': 'Service not found'}), 404
-        
-        service = services[0]
-        if str(service['owner_id']) != str(session['user_id']):
-            return jsonify({'error': 'Unauthorized'}), 403
+        service, denied = owned_service(session['user_id'], service_id)
+        if denied:
+            return jsonify(denied[0]), denied[1]
         
-        start_time = time.time()
-        resp = requests.get(service['url'], timeout=5)
-        latency_ms = int((time.time() - start_time) * 1000)
-        new_status = "online" if resp.status_code == 200 else "down"
-        
-        # Enregistre le log via REST API (table pings)
-        log_resp = requests.post(
-            f"{SUPABASE_URL}/rest/v1/pings",
-            json={
-                "service_id": service_id,
-                "owner_id": session['user_id'],
-                "service_name": service['name'],
-                "status": new_status,
-                "latency_ms": latency_ms
-            },
-            headers=SUPABASE_HEADERS,
-            timeout=5
-        )
-        
-        # Update service status
-        requests.patch(
-            f"{SUPABASE_URL}/rest/v1/services?id=eq.{service_id}",
-            json={"status": new_status},
-            headers=SUPABASE_HEADERS,
-            timeout=5
-        )
-        
-        return jsonify({
-            'status': new_status,
-            'latency_ms': latency_ms
-        }), 200
+        job_id = jobs.submit(session['user_id'], run_ping, service)
+        return jsonify({'job_id': job_id, 'state': 'pending'}), 202
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/ping/jobs/<job_id>')
+@require_login
+def ping_job(job_id):
+    job = jobs.get(job_id, session['user_id'])
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify({k: v for k, v in job.items() if k != 'owner_id'}), 200
+
 
 if __name__ == '__main__':
     if DISCORD_TOKEN:
         print("🤖 Bot Discord lancé en arrière-plan...")
+        # Serveur de dev threadé, checker du bot dans le même processus
+        app.config["LIVE_STREAM"] = CHECKER_MODE == "embedded"
+        # Importé seulement ici: gunicorn app:app ne charge ni discord.py ni Pillow
         import threading
+        from discord_bot import bot
         bot_thread = threading.Thread(target=lambda: bot.run(DISCORD_TOKEN), daemon=True)
         bot_thread.start()
     
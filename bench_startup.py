@@ -0,0 +1,125 @@
+"""Temps de démarrage et mémoire de chaque type de processus
+
+    python bench_startup.py                       # tous les types, 5 lancements chacun
+    python bench_startup.py --types web,checker --runs 10
+    python bench_startup.py --output startup.json
+
+Chaque mesure tourne dans un interpréteur neuf: le temps d'import (et de
+construction des objets du processus), le temps total depuis le lancement
+de Python et la mémoire résidente (RSS) à la fin du démarrage. Le
+stockage pointe sur une base SQLite temporaire: rien n'est envoyé à
+Supabase ni à Discord.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+# Type de processus -> code exécuté au démarrage
+PROCESS_TYPES = {
+    "python": "pass",
+    "web": "import app",
+    "checker": "import checker; checker.Checker()",
+    "agent": "import vantage; vantage.VantageAgent('bench')",
+    "bot": "import discord_bot",
+    "aio": "import aio_server",
+}
+# Modules lourds dont on veut savoir s'ils sont chargés
+HEAVY_MODULES = ["discord", "PIL", "aiohttp", "flask", "requests"]
+
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+{code}
+boot_ms = (time.perf_counter() - started) * 1000
+rss_kb = None
+try:
+    with open("/proc/self/status") as f:
+        rss_kb = next(int(line.split()[1]) for line in f if line.startswith("VmRSS:"))
+except OSError:
+    import resource
+    rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        rss_kb //= 1024
+print(json.dumps({{
+    "boot_ms": boot_ms,
+    "rss_kb": rss_kb,
+    "modules": len(sys.modules),
+    "loaded": [m for m in {heavy!r} if m in sys.modules],
+}}))
+"""
+
+
+def measure(code, env, cwd):
+    started = time.perf_counter()
+    out = subprocess.run([sys.executable, "-c", PROBE.format(code=code, heavy=HEAVY_MODULES)],
+                         env=env, cwd=cwd, capture_output=True, text=True, check=True)
+    total_ms = (time.perf_counter() - started) * 1000
+    result = json.loads(out.stdout.strip().splitlines()[-1])
+    result["total_ms"] = total_ms
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Démarrage et mémoire des processus DownDetector")
+    parser.add_argument("--types", default=",".join(PROCESS_TYPES), help="types de processus, séparés par des virgules")
+    parser.add_argument("--runs", type=int, default=5, help="lancements par type (médiane)")
+    parser.add_argument("--output", default="startup.json")
+    args = parser.parse_args()
+
+    types = [t.strip() for t in args.types.split(",") if t.strip()]
+    unknown = [t for t in types if t not in PROCESS_TYPES]
+    if unknown:
+        parser.error(f"types inconnus: {', '.join(unknown)} (connus: {', '.join(PROCESS_TYPES)})")
+
+    root = os.path.dirname(os.path.abspath(__file__))
+    tmp = tempfile.TemporaryDirectory()
+    env = {
+        **os.environ,
+        "PYTHONPATH": root,
+        # Pas de .pyc écrits pendant la mesure, mais ceux existants servent
+        "PYTHONDONTWRITEBYTECODE": "1",
+        "STORAGE_BACKEND": "sqlite",
+        "SQLITE_PATH": os.path.join(tmp.name, "startup.db"),
+        "WRITER_SPILL_PATH": os.path.join(tmp.name, "spill.ndjson"),
+        "COMMAND_SYNC_STATE": os.path.join(tmp.name, "command_sync_hash"),
+    }
+
+    results = {}
+    try:
+        # Premier lancement à blanc: schéma SQLite créé, fichiers en cache
+        measure("import storage; storage.get_storage()", env, tmp.name)
+        for name in types:
+            runs = [measure(PROCESS_TYPES[name], env, tmp.name) for _ in range(args.runs)]
+            results[name] = {
+                "boot_ms": round(statistics.median(r["boot_ms"] for r in runs), 1),
+                "total_ms": round(statistics.median(r["total_ms"] for r in runs), 1),
+                "rss_mb": round(statistics.median(r["rss_kb"] for r in runs) / 1024, 1),
+                "modules": runs[-1]["modules"],
+                "loaded": runs[-1]["loaded"],
+            }
+            stats = results[name]
+            print(f"🚀 {name}: import {stats['boot_ms']}ms, total {stats['total_ms']}ms, "
+                  f"RSS {stats['rss_mb']} Mo, {stats['modules']} modules ({', '.join(stats['loaded']) or '-'})")
+    finally:
+        tmp.cleanup()
+
+    report = {
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "runs": args.runs,
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Résultats écrits dans {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,419 @@
+"""Benchmark du checker et de l'API sur une ferme de cibles locale
+
+    python benchmark.py                           # 100, 1k et 10k services
+    python benchmark.py --sizes 1000 --error-rate 0.05 --hang-rate 0.01
+    python benchmark.py --output bench.json       # résultats en JSON
+
+Tout tourne en local: une ferme aiohttp simule les services surveillés
+(latence, erreurs, connexions qui ne répondent jamais) et un stub
+compatible PostgREST remplace Supabase pour les tables services, pings et
+ping_rollups (la fonction rpc/merge_rollups et les compteurs par statut).
+Rien n'est envoyé à Discord ni à Supabase.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+from aiohttp import web
+
+from rollups import merge_rollup
+
+STUB_PORT = 54321
+FARM_PORT = 18080
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def summary_ms(values):
+    """p50 / p99 / max / moyenne d'une liste de durées en secondes, en ms"""
+    if not values:
+        return {}
+    return {
+        "p50_ms": round(percentile(values, 50) * 1000, 2),
+        "p99_ms": round(percentile(values, 99) * 1000, 2),
+        "max_ms": round(max(values) * 1000, 2),
+        "mean_ms": round(statistics.fmean(values) * 1000, 2),
+    }
+
+
+class BackgroundLoop:
+    """Boucle asyncio dans un thread, pour que les serveurs ne faussent pas les mesures"""
+
+    def __init__(self, name):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name=name, daemon=True)
+        self.thread.start()
+
+    def run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+
+class TargetFarm:
+    """Services simulés sur 127.0.0.1..127.0.0.N (un hôte par adresse)
+
+    Chaque requête répond après latency_ms (± jitter), renvoie un 500
+    avec la probabilité error_rate, ou ne répond jamais avec la
+    probabilité hang_rate (le probe finit en timeout).
+    """
+
+    def __init__(self, hosts, latency_ms, jitter_ms, error_rate, hang_rate, seed=0):
+        self.hosts = hosts
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.hang_rate = hang_rate
+        self.random = random.Random(seed)
+        self.requests = 0
+        self._runner = None
+        self._closing = None
+
+    async def _handle(self, request):
+        self.requests += 1
+        roll = self.random.random()
+        if roll < self.hang_rate:
+            # Ne répond pas avant l'arrêt de la ferme
+            await self._closing.wait()
+            return web.Response(status=503)
+        delay = max(0, self.latency_ms + self.random.uniform(-self.jitter_ms, self.jitter_ms))
+        await asyncio.sleep(delay / 1000)
+        if roll < self.hang_rate + self.error_rate:
+            return web.Response(status=500, text="error")
+        return web.Response(text="ok")
+
+    async def start(self):
+        self._closing = asyncio.Event()
+        app = web.Application()
+        app.router.add_get("/{tail:.*}", self._handle)
+        self._runner = web.AppRunner(app, handle_signals=False, shutdown_timeout=0.1)
+        await self._runner.setup()
+        for host in self.host_names():
+            await web.TCPSite(self._runner, host, FARM_PORT).start()
+
+    async def stop(self):
+        self._closing.set()
+        await self._runner.cleanup()
+
+    def host_names(self):
+        return [f"127.0.0.{i + 1}" for i in range(self.hosts)]
+
+    def url(self, index):
+        return f"http://127.0.0.{index % self.hosts + 1}:{FARM_PORT}/svc/{index}"
+
+
+class PostgrestStub:
+    """Sous-ensemble de PostgREST utilisé par SupabaseStorage (services, pings, ping_rollups, rpc/merge_rollups)"""
+
+    TABLES = ("services", "pings", "ping_rollups")
+
+    def __init__(self):
+        self.reset([])
+        self._runner = None
+
+    def reset(self, services):
+        self.tables = {table: [] for table in self.TABLES}
+        self.next_id = {table: 1 for table in self.TABLES}
+        self.calls = {}
+        self._insert("services", services)
+
+    def _insert(self, table, rows, on_conflict=None, merge=False):
+        created = []
+        keys = on_conflict.split(",") if on_conflict else None
+        if keys:
+            index = {tuple(str(r.get(k)) for k in keys): r for r in self.tables[table]}
+        for row in rows:
+            if keys:
+                existing = index.get(tuple(str(row.get(k)) for k in keys))
+                if existing is not None:
+                    if merge:
+                        existing.update(row)
+                        created.append(existing)
+                    continue
+            row = dict(row, id=self.next_id[table])
+            if table == "services":
+                row["shard"] = row["id"] % 256
+            self.next_id[table] += 1
+            self.tables[table].append(row)
+            created.append(row)
+        return created
+
+    @staticmethod
+    def _predicate(column, expr):
+        op, _, value = expr.partition(".")
+        if op == "in":
+            values = {v.strip('"') for v in value.strip("()").split(",")}
+        compare = {
+            "eq": lambda current: current == value,
+            "in": lambda current: current in values,
+            "gt": lambda current: current > value,
+            "gte": lambda current: current >= value,
+            "lt": lambda current: current < value,
+            "lte": lambda current: current <= value,
+        }.get(op, lambda current: True)
+        return lambda row: compare("" if row.get(column) is None else str(row.get(column)))
+
+    def _select(self, table, query):
+        rows = self.tables[table]
+        order, limit = None, None
+        for column, expr in query.items():
+            if column == "order":
+                order = expr
+            elif column == "limit":
+                limit = int(expr)
+            elif column not in ("select", "on_conflict"):
+                predicate = self._predicate(column, expr)
+                rows = [r for r in rows if predicate(r)]
+        if order:
+            column, _, direction = order.partition(".")
+            rows = sorted(rows, key=lambda r: str(r.get(column) or ""), reverse=direction == "desc")
+        return rows[:limit] if limit is not None else rows
+
+    async def _handle(self, request):
+        table = request.match_info["table"]
+        if table == "service_status_counts" and request.method == "GET":
+            # Tenue à jour par trigger dans Supabase: ici calculée à la lecture
+            self.calls[f"GET {table}"] = self.calls.get(f"GET {table}", 0) + 1
+            counts = Counter(row.get("status") or "" for row in self.tables["services"])
+            return web.json_response([{"status": status, "n": n} for status, n in counts.items()])
+        if table not in self.tables:
+            return web.json_response({"message": "table inconnue"}, status=404)
+        key = f"{request.method} {table}"
+        self.calls[key] = self.calls.get(key, 0) + 1
+        query = request.query
+        prefer = request.headers.get("Prefer", "")
+
+        if request.method in ("GET", "HEAD"):
+            rows = self._select(table, query)
+            headers = {"Content-Range": f"0-{max(len(rows) - 1, 0)}/{len(rows)}"} if "count=exact" in prefer else None
+            if request.method == "HEAD":
+                return web.Response(headers=headers)
+            return web.json_response(rows, headers=headers)
+        if request.method == "POST":
+            body = await request.json()
+            rows = self._insert(table, body if isinstance(body, list) else [body],
+                                query.get("on_conflict"), "merge-duplicates" in prefer)
+        elif request.method == "PATCH":
+            body = await request.json()
+            rows = self._select(table, query)
+            for row in rows:
+                row.update(body)
+        else:
+            rows = self._select(table, query)
+            ids = {id(r) for r in rows}
+            self.tables[table] = [r for r in self.tables[table] if id(r) not in ids]
+        if "return=representation" in prefer:
+            return web.json_response(rows, status=201 if request.method == "POST" else 200)
+        return web.Response(status=204)
+
+    def _merge_rollups(self, deltas):
+        """Même addition que la fonction SQL merge_rollups de setup_db.py"""
+        keys = ("service_id", "resolution", "bucket_start")
+        index = {tuple(str(r[k]) for k in keys): r for r in self.tables["ping_rollups"]}
+        for delta in deltas:
+            existing = index.get(tuple(str(delta[k]) for k in keys))
+            if existing is not None:
+                merge_rollup(existing, delta)
+            else:
+                index[tuple(str(delta[k]) for k in keys)] = self._insert("ping_rollups", [delta])[0]
+
+    async def _rpc(self, request):
+        function = request.match_info["function"]
+        if function != "merge_rollups":
+            return web.json_response({"message": "fonction inconnue"}, status=404)
+        key = f"POST rpc/{function}"
+        self.calls[key] = self.calls.get(key, 0) + 1
+        body = await request.json()
+        self._merge_rollups(body["deltas"])
+        return web.Response(status=204)
+
+    async def start(self):
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_post("/rest/v1/rpc/{function}", self._rpc)
+        app.router.add_route("*", "/rest/v1/{table}", self._handle)
+        self._runner = web.AppRunner(app, handle_signals=False)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, "127.0.0.1", STUB_PORT).start()
+
+    async def stop(self):
+        await self._runner.cleanup()
+
+
+class LoopLagMonitor:
+    """Mesure le retard de réveil de la boucle (tâche qui dort interval secondes)"""
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.samples = []
+        self._task = None
+
+    async def _run(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, time.perf_counter() - start - self.interval))
+
+    def start(self):
+        self.samples = []
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        return summary_ms(self.samples)
+
+
+def make_services(count, farm, owner_id="bench"):
+    return [
+        {"owner_id": owner_id, "guild_id": 0, "name": f"svc-{i}", "url": farm.url(i), "status": "online",
+         "check_interval": None, "alert_channel_id": None, "last_check": None,
+         "created_at": datetime.now(timezone.utc).isoformat()}
+        for i in range(count)
+    ]
+
+
+async def bench_sweep(storage, stub, args):
+    """Un sweep complet: probes + écriture groupée des résultats"""
+    from checker import Checker
+    from probe import ProbeEngine
+
+    checker = Checker(storage)
+    checker.probe_engine = ProbeEngine(args.concurrency, args.per_host, args.timeout)
+    checker.alerts.token = None
+    await checker.start()
+    services = await checker.fetch_services()
+    await checker.sync(services)
+
+    monitor = LoopLagMonitor()
+    monitor.start()
+    start = time.perf_counter()
+    stats = await checker.sweep(services)
+    sweep_s = time.perf_counter() - start
+    # close() attend que le writer ait tout envoyé au stub
+    await checker.close()
+    total_s = time.perf_counter() - start
+    lag = await monitor.stop()
+
+    return {
+        "duration_ms": stats["duration_ms"],
+        "probes_per_sec": round(len(services) / sweep_s, 1) if sweep_s else None,
+        "online": stats["online"],
+        "down": stats["down"],
+        "peak_in_flight": stats["peak_in_flight"],
+        "write_drain_ms": int((total_s - sweep_s) * 1000),
+        "pings_written": checker.writer.written,
+        "loop_lag": lag,
+        "storage_calls": dict(stub.calls),
+    }
+
+
+def bench_api(client, app_module, requests_count):
+    """p50/p99 de /api/services et /api/status, cache froid et cache chaud"""
+    results = {}
+    for path, cache in (("/api/services", app_module.services_cache), ("/api/status", app_module.status_cache)):
+        for mode in ("cold", "warm"):
+            durations = []
+            cache.clear()
+            for _ in range(requests_count):
+                if mode == "cold":
+                    cache.clear()
+                start = time.perf_counter()
+                resp = client.get(path)
+                durations.append(time.perf_counter() - start)
+                if resp.status_code != 200:
+                    raise RuntimeError(f"{path}: HTTP {resp.status_code}")
+            results[f"{path} {mode}"] = summary_ms(durations)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark DownDetector sur une ferme de cibles locale")
+    parser.add_argument("--sizes", default="100,1000,10000", help="nombres de services, séparés par des virgules")
+    parser.add_argument("--hosts", type=int, default=25, help="nombre d'hôtes simulés (127.0.0.x)")
+    parser.add_argument("--latency-ms", type=float, default=20)
+    parser.add_argument("--jitter-ms", type=float, default=10)
+    parser.add_argument("--error-rate", type=float, default=0.02)
+    parser.add_argument("--hang-rate", type=float, default=0.005)
+    parser.add_argument("--timeout", type=float, default=2, help="timeout des probes (s)")
+    parser.add_argument("--concurrency", type=int, default=None)
+    parser.add_argument("--per-host", type=int, default=None)
+    parser.add_argument("--requests", type=int, default=200, help="requêtes par endpoint et par mode")
+    parser.add_argument("--output", default="benchmark.json")
+    args = parser.parse_args()
+
+    # Le stockage de l'app et du checker pointe sur le stub avant tout import
+    os.environ["STORAGE_BACKEND"] = "supabase"
+    os.environ["SUPABASE_URL"] = f"http://127.0.0.1:{STUB_PORT}"
+    os.environ["SUPABASE_KEY"] = "benchmark"
+    spill_dir = tempfile.TemporaryDirectory()
+    os.environ["WRITER_SPILL_PATH"] = os.path.join(spill_dir.name, "spill.ndjson")
+
+    from config import PROBE_CONCURRENCY, PROBE_PER_HOST
+    import app as app_module
+
+    args.concurrency = args.concurrency or PROBE_CONCURRENCY
+    args.per_host = args.per_host or PROBE_PER_HOST
+    sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+
+    farm = TargetFarm(args.hosts, args.latency_ms, args.jitter_ms, args.error_rate, args.hang_rate)
+    stub = PostgrestStub()
+    farm_loop, stub_loop = BackgroundLoop("farm"), BackgroundLoop("postgrest-stub")
+    farm_loop.run(farm.start())
+    stub_loop.run(stub.start())
+
+    client = app_module.app.test_client()
+    with client.session_transaction() as session:
+        session["user_id"] = "bench"
+
+    results = []
+    try:
+        for size in sizes:
+            stub_loop.loop.call_soon_threadsafe(stub.reset, make_services(size, farm))
+            stub_loop.run(asyncio.sleep(0))
+            print(f"📊 {size} services...")
+            sweep = asyncio.run(bench_sweep(app_module.storage, stub, args))
+            print(f"   sweep {sweep['duration_ms']}ms, {sweep['probes_per_sec']} probes/s, "
+                  f"lag p99 {sweep['loop_lag'].get('p99_ms')}ms")
+            api = bench_api(client, app_module, args.requests)
+            for name, stats in api.items():
+                print(f"   {name}: p50 {stats['p50_ms']}ms, p99 {stats['p99_ms']}ms")
+            results.append({"services": size, "sweep": sweep, "api": api})
+    finally:
+        farm_loop.run(farm.stop())
+        stub_loop.run(stub.stop())
+        farm_loop.stop()
+        stub_loop.stop()
+        spill_dir.cleanup()
+
+    report = {
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "params": {k: v for k, v in vars(args).items() if k != "output"},
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Résultats écrits dans {args.output}")
+
+
+if __name__ == "__main__":
+    main()
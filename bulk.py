@@ -0,0 +1,160 @@
+"""Import et export des services en masse (CSV ou NDJSON), en flux
+
+L'import lit les lignes une à une, les valide et les insère par lots de
+IMPORT_CHUNK_SIZE (une requête par lot); chaque ligne reçoit son propre
+résultat. Les noms déjà pris (UNIQUE(owner_id, name)) sont ignorés par
+le stockage, pas en erreur. L'export lit les services page par page et
+écrit au fil de l'eau: l'inventaire n'est jamais entièrement en mémoire.
+"""
+import csv
+import io
+import json
+
+from config import IMPORT_CHUNK_SIZE, IMPORT_MAX_ROWS, EXPORT_PAGE_SIZE
+from probe import validate_probe_settings
+from scheduler import MIN_CHECK_INTERVAL, MAX_CHECK_INTERVAL
+from storage import StorageError
+
+FORMATS = ("csv", "ndjson")
+IMPORT_FIELDS = ["name", "url", "check_interval", "probe_mode", "accepted_status", "keyword"]
+EXPORT_FIELDS = ["id", *IMPORT_FIELDS, "status", "last_check", "created_at"]
+MAX_NAME_LENGTH = 100
+# Taille des morceaux envoyés par l'export
+EXPORT_CHUNK_BYTES = 64 * 1024
+
+
+def detect_format(filename=None, content_type=None):
+    """csv ou ndjson d'après l'extension ou le Content-Type (ndjson par défaut)"""
+    if filename and filename.lower().endswith(".csv"):
+        return "csv"
+    if content_type and "csv" in content_type:
+        return "csv"
+    return "ndjson"
+
+
+def read_rows(lines, fmt):
+    """(numéro de ligne, dict) pour chaque enregistrement, ou (numéro, ValueError)
+
+    lines est un itérable de str (fichier texte, corps de requête décodé).
+    """
+    if fmt == "csv":
+        reader = csv.DictReader(lines)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield number, ValueError(f"JSON invalide: {e}")
+            continue
+        yield number, row if isinstance(row, dict) else ValueError("objet JSON attendu")
+
+
+def parse_service(row):
+    """Colonnes d'un service à partir d'une ligne importée (ValueError si invalide)"""
+    values = {}
+    for field in IMPORT_FIELDS:
+        value = row.get(field)
+        if value is not None:
+            value = str(value).strip() or None
+        values[field] = value
+    if not values["name"]:
+        raise ValueError("name manquant")
+    if len(values["name"]) > MAX_NAME_LENGTH:
+        raise ValueError(f"name trop long (max {MAX_NAME_LENGTH})")
+    if not values["url"]:
+        raise ValueError("url manquante")
+    if values["check_interval"] is not None:
+        try:
+            values["check_interval"] = int(values["check_interval"])
+        except ValueError:
+            raise ValueError(f"check_interval invalide: {values['check_interval']}") from None
+        if not MIN_CHECK_INTERVAL <= values["check_interval"] <= MAX_CHECK_INTERVAL:
+            raise ValueError(f"check_interval doit être entre {MIN_CHECK_INTERVAL} et {MAX_CHECK_INTERVAL}s")
+    validate_probe_settings(values["probe_mode"], values["accepted_status"], values["keyword"], values["url"])
+    return values
+
+
+def import_services(storage, rows, defaults, on_created=None,
+                    chunk_size=IMPORT_CHUNK_SIZE, max_rows=IMPORT_MAX_ROWS):
+    """Importe les lignes de read_rows() et génère un résultat par ligne
+
+    defaults: colonnes communes (owner_id, guild_id...). Résultat:
+    {"line", "name", "result": created|exists|duplicate|invalid|error,
+    "id" ou "error"}. Le dernier élément est {"summary": {...}}.
+    on_created(lignes) est appelé avec les services créés de chaque lot.
+    """
+    summary = {"created": 0, "exists": 0, "duplicate": 0, "invalid": 0, "error": 0}
+    seen = set()
+    batch = []
+    for count, (line, row) in enumerate(rows, 1):
+        if count > max_rows:
+            summary["invalid"] += 1
+            yield {"line": line, "result": "invalid", "error": f"limite de {max_rows} lignes atteinte, import arrêté"}
+            break
+        try:
+            if isinstance(row, Exception):
+                raise row
+            service = parse_service(row)
+        except ValueError as e:
+            summary["invalid"] += 1
+            yield {"line": line, "name": row.get("name") if isinstance(row, dict) else None,
+                   "result": "invalid", "error": str(e)}
+            continue
+        if service["name"] in seen:
+            summary["duplicate"] += 1
+            yield {"line": line, "name": service["name"], "result": "duplicate", "error": "nom déjà présent dans le fichier"}
+            continue
+        seen.add(service["name"])
+        batch.append((line, service))
+        if len(batch) >= chunk_size:
+            yield from _insert(storage, batch, defaults, summary, on_created)
+            batch = []
+    if batch:
+        yield from _insert(storage, batch, defaults, summary, on_created)
+    yield {"summary": summary}
+
+
+def _insert(storage, batch, defaults, summary, on_created):
+    try:
+        rows = storage.add_services([{**defaults, **service} for _, service in batch])
+    except StorageError as e:
+        summary["error"] += len(batch)
+        for line, service in batch:
+            yield {"line": line, "name": service["name"], "result": "error", "error": str(e)}
+        return
+    if on_created is not None and rows:
+        on_created(rows)
+    created = {row["name"]: row for row in rows}
+    for line, service in batch:
+        row = created.get(service["name"])
+        if row is not None:
+            summary["created"] += 1
+            yield {"line": line, "name": service["name"], "result": "created", "id": row["id"]}
+        else:
+            summary["exists"] += 1
+            yield {"line": line, "name": service["name"], "result": "exists", "error": "un service porte déjà ce nom"}
+
+
+def export_services(storage, owner_id, fmt, page_size=EXPORT_PAGE_SIZE):
+    """Contenu du fichier d'export, morceau par morceau (str)"""
+    buffer = io.StringIO()
+    writer = None
+    if fmt == "csv":
+        writer = csv.DictWriter(buffer, EXPORT_FIELDS, extrasaction="ignore")
+        writer.writeheader()
+    for service in storage.iter_services(owner_id, page_size):
+        if writer is not None:
+            writer.writerow(service)
+        else:
+            buffer.write(json.dumps({field: service.get(field) for field in EXPORT_FIELDS}) + "\n")
+        if buffer.tell() >= EXPORT_CHUNK_BYTES:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
@@ -0,0 +1,91 @@
+"""Cache mémoire TTL + LRU, thread-safe, avec compteurs de hits/misses"""
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+from metrics import registry
+
+_caches = weakref.WeakSet()
+
+
+class TTLCache:
+    """Cache borné: les entrées expirent après ttl secondes et les moins
+    récemment utilisées sont évincées au-delà de maxsize"""
+
+    def __init__(self, name, ttl, maxsize=10000, clock=time.monotonic):
+        self.name = name
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.clock = clock
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        _caches.add(self)
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] <= self.clock():
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (self.clock() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_load(self, key, loader):
+        """Valeur en cache, sinon loader() (le résultat est mis en cache)"""
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            value = loader()
+            self.set(key, value)
+        return value
+
+    def invalidate(self, key):
+        with self._lock:
+            if self._data.pop(key, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self.invalidations += len(self._data)
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "name": self.name,
+                "entries": len(self._data),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+@registry.collector
+def _cache_metrics():
+    stats = [cache.stats() for cache in list(_caches)]
+    return [
+        ("downdetector_cache_hits_total", "counter", "Lectures servies par le cache", [({"cache": s["name"]}, s["hits"]) for s in stats]),
+        ("downdetector_cache_misses_total", "counter", "Lectures absentes du cache", [({"cache": s["name"]}, s["misses"]) for s in stats]),
+        ("downdetector_cache_hit_ratio", "gauge", "Part des lectures servies par le cache", [({"cache": s["name"]}, s["hit_ratio"]) for s in stats]),
+        ("downdetector_cache_entries", "gauge", "Entrées en cache", [({"cache": s["name"]}, s["entries"]) for s in stats]),
+        ("downdetector_cache_evictions_total", "counter", "Entrées évincées (LRU)", [({"cache": s["name"]}, s["evictions"]) for s in stats]),
+    ]
@@ -0,0 +1,336 @@
+"""Checker: probes, planification et écriture des résultats
+
+Utilisé par le bot Discord (mode "embedded") ou lancé seul:
+
+    python checker.py                # un worker
+    python checker.py --workers 4    # quatre processus sur cette machine
+
+En mode autonome, chaque worker ne vérifie que les shards dont il détient
+le lease (voir sharding.py); on peut en lancer sur plusieurs machines
+tant qu'elles partagent le même stockage.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import time
+import weakref
+
+from aiohttp import web
+
+from alerts import AlertDispatcher
+from config import (
+    CHECKER_WORKERS, SERVICES_REFRESH_INTERVAL, ROLLUP_FLUSH_INTERVAL, LEASE_RENEW_INTERVAL, METRICS_PORT,
+    RETENTION_INTERVAL, WRITER_SPILL_PATH,
+)
+from events import broker
+from metrics import registry, monitor_loop_lag
+from probe import ProbeEngine
+from retention import RetentionJob
+from ringbuffer import recent
+from rollups import RollupAggregator
+from scheduler import CheckScheduler
+from sharding import ShardCoordinator, default_worker_id
+from state import StateTracker
+from storage import get_storage, utcnow
+from vantage import VantagePanel, encode_votes
+from writer import ResultWriter
+
+_checkers = weakref.WeakSet()
+
+
+class Checker:
+    """Regroupe le moteur de probes, le planificateur, le writer et les rollups
+
+    Le statut d'un service n'est écrit (et alerté) que lorsqu'il change,
+    d'après le StateTracker. Avec des agents (VANTAGE_AGENTS), chaque
+    résultat est d'abord décidé au quorum des points de vue.
+    """
+
+    def __init__(self, storage=None, coordinator=None, spill_path=WRITER_SPILL_PATH):
+        self.storage = storage or get_storage()
+        self.coordinator = coordinator
+        self.probe_engine = ProbeEngine()
+        self.vantages = VantagePanel()
+        self.writer = ResultWriter(storage=self.storage, spill_path=spill_path)
+        self.scheduler = CheckScheduler()
+        self.rollups = RollupAggregator()
+        self.states = StateTracker()
+        self.alerts = AlertDispatcher()
+        self.retention = RetentionJob(self.storage)
+        self.pending_checks = set()
+        self._lag_task = None
+        self._retention_task = None
+        _checkers.add(self)
+
+    async def start(self):
+        await self.probe_engine.start()
+        await self.vantages.start()
+        await self.writer.start()
+        await self.alerts.start()
+        if self._lag_task is None:
+            self._lag_task = asyncio.create_task(monitor_loop_lag())
+
+    async def close(self):
+        if self.pending_checks:
+            await asyncio.gather(*self.pending_checks, return_exceptions=True)
+        if self._lag_task is not None:
+            self._lag_task.cancel()
+            self._lag_task = None
+        if self._retention_task is not None:
+            self.retention.stop()
+            await asyncio.gather(self._retention_task, return_exceptions=True)
+        await self.probe_engine.close()
+        await self.vantages.close()
+        await self.writer.close()
+        await self.alerts.close()
+        await self.flush_rollups()
+        if self.coordinator is not None:
+            await self.coordinator.leave()
+
+    def owns(self, service):
+        return self.coordinator is None or self.coordinator.owns(service)
+
+    async def fetch_services(self):
+        """Services à vérifier par ce checker (ses shards, ou tous)"""
+        shards = self.coordinator.shards() if self.coordinator is not None else None
+        return await asyncio.to_thread(self.storage.list_services, None, shards)
+
+    async def sync(self, services):
+        """Planifie les services de ce checker et corrige les statuts stockés périmés"""
+        services = [s for s in services if self.owns(s)]
+        self.scheduler.sync(services)
+        self.probe_engine.prune(services)
+        recent.prune({s["id"] for s in services})
+        for service_id, status in self.states.reconcile(services):
+            await self.writer.enqueue(None, service_id, status)
+
+    async def refresh(self):
+        try:
+            await self.sync(await self.fetch_services())
+        except Exception as e:
+            print(f"Erreur refresh: {e}")
+
+    async def probe(self, service):
+        """Probe locale, fusionnée avec les votes des agents s'il y en a"""
+        if not self.vantages.agents:
+            return await self.probe_engine.probe(service)
+        local, remote = await asyncio.gather(self.probe_engine.probe(service), self.vantages.collect(service))
+        return self.vantages.merge(local, remote, self.states.status(service["id"]))
+
+    async def handle_result(self, result):
+        service = result["service"]
+        if result["error"] and not result.get("skipped"):
+            print(f"Erreur check {service.get('name')}: {result['error']}")
+        phases = result["phases"]
+        created_at = utcnow()
+        self.rollups.add(service["id"], created_at, result["status"], result["latency_ms"])
+        recent.record(service["id"], created_at, result["status"], result["latency_ms"])
+        transition = self.states.observe(service, result["status"])
+        if transition:
+            self.alerts.notify(service, *transition, result["latency_ms"])
+        broker.publish(service["owner_id"], "status", {
+            "id": service["id"],
+            "status": self.states.status(service["id"]),
+            "latency_ms": result["latency_ms"],
+            "checked_at": created_at
+        })
+        await self.writer.enqueue({
+            "service_id": service["id"],
+            "owner_id": service["owner_id"],
+            "service_name": service["name"],
+            "status": result["status"],
+            "latency_ms": result["latency_ms"],
+            "dns_ms": phases.get("dns_ms"),
+            "connect_ms": phases.get("connect_ms"),
+            "tls_ms": phases.get("tls_ms"),
+            "ttfb_ms": phases.get("ttfb_ms"),
+            "vantages": encode_votes(result.get("votes")),
+            "created_at": created_at
+        }, service["id"], transition[1] if transition else None)
+
+    async def sweep(self, services):
+        """Vérifie tout de suite la liste donnée et retourne les stats du sweep"""
+        stats = await self.probe_engine.sweep(services, on_result=self.handle_result, probe=self.probe)
+        print(
+            f"⏱️ Sweep: {stats['services']} services en {stats['duration_ms']}ms "
+            f"(pic: {stats['peak_in_flight']} probes en vol, limite {stats['concurrency']}, "
+            f"{stats['skipped']} court-circuités)"
+        )
+        return stats
+
+    async def run_check(self, service):
+        try:
+            result = await self.probe(service)
+            await self.handle_result(result)
+        except Exception as e:
+            print(f"Erreur check {service.get('name')}: {e}")
+        finally:
+            self.scheduler.done(service["id"])
+
+    def run_due(self):
+        """Lance les checks arrivés à échéance sans attendre leur fin"""
+        for service in self.scheduler.pop_due():
+            if not self.owns(service):
+                # Shard perdu depuis le dernier refresh
+                self.scheduler.remove(service["id"])
+                self.scheduler.done(service["id"])
+                self.states.forget(service["id"])
+                recent.forget(service["id"])
+                continue
+            task = asyncio.create_task(self.run_check(service))
+            self.pending_checks.add(task)
+            task.add_done_callback(self.pending_checks.discard)
+
+    async def flush_rollups(self):
+        try:
+            await asyncio.to_thread(self.rollups.flush, self.storage)
+        except Exception as e:
+            print(f"⚠️ Erreur rollups: {e}")
+
+    def start_retention(self):
+        """Lance une passe de rétention en fond, sans bloquer les checks
+
+        Avec des workers shardés, seul le détenteur du shard 0 la lance.
+        """
+        if self.coordinator is not None and 0 not in self.coordinator.shards():
+            return False
+        if self._retention_task is not None and not self._retention_task.done():
+            return False
+        self._retention_task = asyncio.create_task(self._run_retention())
+        return True
+
+    async def _run_retention(self):
+        try:
+            await asyncio.to_thread(self.retention.run)
+        except Exception as e:
+            print(f"⚠️ Erreur rétention: {e}")
+
+    async def run(self):
+        """Boucle du checker autonome (sans Discord)"""
+        await self.start()
+        next_lease = next_refresh = 0
+        next_flush = time.monotonic() + ROLLUP_FLUSH_INTERVAL
+        next_retention = time.monotonic() + RETENTION_INTERVAL
+        try:
+            while True:
+                now = time.monotonic()
+                if self.coordinator is not None and now >= next_lease:
+                    next_lease = now + LEASE_RENEW_INTERVAL
+                    if await self.coordinator.tick():
+                        shards = self.coordinator.shards()
+                        print(f"🔀 {self.coordinator.worker_id}: {len(shards)} shards "
+                              f"({len(self.coordinator.workers)} workers)")
+                        next_refresh = 0
+                if now >= next_refresh:
+                    next_refresh = now + SERVICES_REFRESH_INTERVAL
+                    await self.refresh()
+                self.run_due()
+                if now >= next_flush:
+                    next_flush = now + ROLLUP_FLUSH_INTERVAL
+                    await self.flush_rollups()
+                if now >= next_retention:
+                    next_retention = now + RETENTION_INTERVAL
+                    self.start_retention()
+                await asyncio.sleep(1)
+        finally:
+            await self.close()
+
+
+@registry.collector
+def _checker_metrics():
+    checkers = list(_checkers)
+    schedules = [c.scheduler.stats() for c in checkers]
+    states = [c.states.stats() for c in checkers]
+    return [
+        ("downdetector_writer_queue_depth", "gauge", "Résultats en attente d'écriture",
+         [({}, sum(c.writer.queue.qsize() for c in checkers))]),
+        ("downdetector_writer_rows_total", "counter", "Pings écrits dans le stockage",
+         [({}, sum(c.writer.written for c in checkers))]),
+        ("downdetector_writer_spilled_total", "counter", "Pings mis de côté (stockage indisponible)",
+         [({}, sum(c.writer.spilled for c in checkers))]),
+        ("downdetector_scheduler_queue_depth", "gauge", "Services planifiés",
+         [({}, sum(s["queue_depth"] for s in schedules))]),
+        ("downdetector_scheduler_overdue", "gauge", "Checks en retard",
+         [({}, sum(s["overdue"] for s in schedules))]),
+        ("downdetector_checks_running", "gauge", "Checks en cours",
+         [({}, sum(s["running"] for s in schedules))]),
+        ("downdetector_probes_in_flight", "gauge", "Probes HTTP en vol",
+         [({}, sum(c.probe_engine.in_flight for c in checkers))]),
+        ("downdetector_breaker_open_hosts", "gauge", "Hôtes dont le disjoncteur est ouvert",
+         [({}, sum(c.probe_engine.breaker.open_hosts() for c in checkers))]),
+        ("downdetector_vantage_agents_available", "gauge", "Agents de probe joignables",
+         [({}, sum(1 for c in checkers for a in c.vantages.agents if a.available))]),
+        ("downdetector_services_down", "gauge", "Services confirmés down",
+         [({}, sum(s["down"] for s in states))]),
+        ("downdetector_status_transitions_total", "counter", "Changements de statut",
+         [({}, sum(s["transitions"] for s in states))]),
+        ("downdetector_alerts_pending", "gauge", "Alertes Discord en attente",
+         [({}, sum(c.alerts.pending() for c in checkers))]),
+        ("downdetector_alerts_sent_total", "counter", "Messages d'alerte envoyés",
+         [({}, sum(c.alerts.sent for c in checkers))]),
+        ("downdetector_alerts_dropped_total", "counter", "Alertes abandonnées (sans destination ou refusées)",
+         [({}, sum(c.alerts.dropped for c in checkers))]),
+    ]
+
+
+async def serve_metrics(port):
+    """Petit serveur /metrics pour un checker autonome"""
+    async def handle(request):
+        return web.Response(text=registry.render(), content_type="text/plain", charset="utf-8")
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    runner = web.AppRunner(app, handle_signals=False)
+    await runner.setup()
+    await web.TCPSite(runner, "0.0.0.0", port).start()
+    print(f"📈 /metrics sur le port {port}")
+    return runner
+
+
+async def run_checker(checker, metrics_port=None):
+    runner = await serve_metrics(metrics_port) if metrics_port else None
+    try:
+        await checker.run()
+    finally:
+        if runner is not None:
+            await runner.cleanup()
+
+
+def run_worker(worker_id=None, metrics_port=None, index=None):
+    """index: rang du worker sur cette machine, pour un fichier de spill propre à chacun"""
+    storage = get_storage()
+    spill_path = WRITER_SPILL_PATH if index is None else f"{WRITER_SPILL_PATH}.{index}"
+    checker = Checker(storage, ShardCoordinator(storage, worker_id), spill_path)
+    print(f"🚀 Checker {checker.coordinator.worker_id} démarré")
+    try:
+        asyncio.run(run_checker(checker, metrics_port))
+    except KeyboardInterrupt:
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Checker DownDetector autonome")
+    parser.add_argument("--workers", type=int, default=CHECKER_WORKERS, help="nombre de processus sur cette machine")
+    args = parser.parse_args()
+
+    if args.workers <= 1:
+        run_worker(metrics_port=METRICS_PORT)
+        return
+    base_id = default_worker_id()
+    processes = [
+        multiprocessing.Process(target=run_worker, args=(f"{base_id}-{i}", METRICS_PORT + i if METRICS_PORT else None, i),
+                                name=f"checker-{i}")
+        for i in range(args.workers)
+    ]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -7,10 +7,119 @@ load_dotenv()
 DISCORD_TOKEN = os.getenv("DISCORD_TOKEN")
 DISCORD_CLIENT_ID = os.getenv("DISCORD_CLIENT_ID")
 DISCORD_CLIENT_SECRET = os.getenv("DISCORD_CLIENT_SECRET")
+# Empreinte des commandes slash déjà synchronisées (supprimer le fichier force la synchro)
+COMMAND_SYNC_STATE = os.getenv("COMMAND_SYNC_STATE", ".command_sync_hash")
 
 # Supabase
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 
+# Stockage: "supabase" (API REST) ou "sqlite" (fichier local, mode WAL)
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "supabase")
+SQLITE_PATH = os.getenv("SQLITE_PATH", "downdetector.db")
+
 # Flask
 SECRET_KEY = os.getenv("SECRET_KEY", "dev-key-change-in-prod")
+CACHE_TTL = float(os.getenv("CACHE_TTL", "15"))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+EVENT_QUEUE_SIZE = int(os.getenv("EVENT_QUEUE_SIZE", "1000"))
+SSE_HEARTBEAT = float(os.getenv("SSE_HEARTBEAT", "15"))
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "20"))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "5"))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "8"))
+JOB_TTL = int(os.getenv("JOB_TTL", "300"))
+# Serveur web asynchrone (python aio_server.py): port et threads du pont vers Flask
+WEB_PORT = int(os.getenv("WEB_PORT", "5000"))
+WEB_THREADS = int(os.getenv("WEB_THREADS", "16"))
+# Import/export en masse des services
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "200"))
+IMPORT_MAX_ROWS = int(os.getenv("IMPORT_MAX_ROWS", "5000"))
+IMPORT_MAX_BYTES = int(os.getenv("IMPORT_MAX_BYTES", "2000000"))
+EXPORT_PAGE_SIZE = int(os.getenv("EXPORT_PAGE_SIZE", "1000"))
+
+# Checker
+PROBE_CONCURRENCY = int(os.getenv("PROBE_CONCURRENCY", "100"))
+PROBE_PER_HOST = int(os.getenv("PROBE_PER_HOST", "4"))
+PROBE_TIMEOUT = float(os.getenv("PROBE_TIMEOUT", "5"))
+# Octets lus au maximum pour chercher le mot-clé d'un service (mode get)
+PROBE_MAX_BYTES = int(os.getenv("PROBE_MAX_BYTES", "65536"))
+DEFAULT_CHECK_INTERVAL = int(os.getenv("DEFAULT_CHECK_INTERVAL", "300"))
+SCHEDULER_JITTER = float(os.getenv("SCHEDULER_JITTER", "0.1"))
+SERVICES_REFRESH_INTERVAL = int(os.getenv("SERVICES_REFRESH_INTERVAL", "60"))
+
+# "embedded": le bot Discord vérifie les services lui-même
+# "external": les checks tournent dans des workers séparés (python checker.py)
+CHECKER_MODE = os.getenv("CHECKER_MODE", "embedded")
+CHECKER_WORKERS = int(os.getenv("CHECKER_WORKERS", "1"))
+LEASE_TTL = int(os.getenv("LEASE_TTL", "30"))
+LEASE_RENEW_INTERVAL = int(os.getenv("LEASE_RENEW_INTERVAL", "10"))
+# Timeout adaptatif: p99 des dernières latences × multiplicateur, entre MIN et PROBE_TIMEOUT
+ADAPTIVE_TIMEOUT_MULTIPLIER = float(os.getenv("ADAPTIVE_TIMEOUT_MULTIPLIER", "3"))
+ADAPTIVE_TIMEOUT_MIN = float(os.getenv("ADAPTIVE_TIMEOUT_MIN", "1"))
+ADAPTIVE_TIMEOUT_SAMPLES = int(os.getenv("ADAPTIVE_TIMEOUT_SAMPLES", "50"))
+# Disjoncteur par hôte: ouvert après N échecs réseau, pause doublée à chaque réouverture
+BREAKER_THRESHOLD = int(os.getenv("BREAKER_THRESHOLD", "3"))
+BREAKER_BASE_DELAY = float(os.getenv("BREAKER_BASE_DELAY", "30"))
+BREAKER_MAX_DELAY = float(os.getenv("BREAKER_MAX_DELAY", "1800"))
+BREAKER_PROBE_TIMEOUT = float(os.getenv("BREAKER_PROBE_TIMEOUT", "2"))
+DNS_CACHE_TTL = int(os.getenv("DNS_CACHE_TTL", "300"))
+KEEPALIVE_TIMEOUT = float(os.getenv("KEEPALIVE_TIMEOUT", "30"))
+
+# Points de vue (python vantage.py): nom du checker local et agents distants "nom=url,nom=url"
+VANTAGE_NAME = os.getenv("VANTAGE_NAME", "local")
+VANTAGE_AGENTS = os.getenv("VANTAGE_AGENTS", "")
+# Points de vue qui doivent s'accorder pour changer un statut (0: majorité)
+VANTAGE_QUORUM = int(os.getenv("VANTAGE_QUORUM", "0"))
+# Jeton Bearer partagé entre le checker et les agents (vide: agents ouverts)
+VANTAGE_TOKEN = os.getenv("VANTAGE_TOKEN", "")
+VANTAGE_PORT = int(os.getenv("VANTAGE_PORT", "8700"))
+VANTAGE_BATCH_MS = int(os.getenv("VANTAGE_BATCH_MS", "50"))
+VANTAGE_BATCH_SIZE = int(os.getenv("VANTAGE_BATCH_SIZE", "200"))
+
+# Écriture des résultats
+WRITER_BATCH_SIZE = int(os.getenv("WRITER_BATCH_SIZE", "500"))
+WRITER_FLUSH_MS = int(os.getenv("WRITER_FLUSH_MS", "1000"))
+WRITER_MAX_QUEUE = int(os.getenv("WRITER_MAX_QUEUE", "10000"))
+WRITER_RETRIES = int(os.getenv("WRITER_RETRIES", "3"))
+WRITER_SPILL_PATH = os.getenv("WRITER_SPILL_PATH", "writer_spill.ndjson")
+
+# Historique agrégé
+ROLLUP_FLUSH_INTERVAL = int(os.getenv("ROLLUP_FLUSH_INTERVAL", "60"))
+MAX_HISTORY_POINTS = int(os.getenv("MAX_HISTORY_POINTS", "1500"))
+
+# Rétention (0: garder indéfiniment); les rollups 1d sont toujours gardés
+PING_RETENTION_DAYS = int(os.getenv("PING_RETENTION_DAYS", "7"))
+ROLLUP_1M_RETENTION_DAYS = int(os.getenv("ROLLUP_1M_RETENTION_DAYS", "30"))
+ROLLUP_1H_RETENTION_DAYS = int(os.getenv("ROLLUP_1H_RETENTION_DAYS", "400"))
+RETENTION_INTERVAL = int(os.getenv("RETENTION_INTERVAL", "3600"))
+RETENTION_BATCH_SIZE = int(os.getenv("RETENTION_BATCH_SIZE", "5000"))
+RETENTION_BATCH_PAUSE = float(os.getenv("RETENTION_BATCH_PAUSE", "0.2"))
+
+# Uptime (/api/uptime, /uptime): jours max, trou de données au-delà de N × check_interval,
+# incidents fusionnés s'ils sont séparés de moins de SLA_INCIDENT_MERGE secondes
+SLA_MAX_DAYS = int(os.getenv("SLA_MAX_DAYS", "400"))
+SLA_GAP_FACTOR = float(os.getenv("SLA_GAP_FACTOR", "2"))
+SLA_INCIDENT_MERGE = int(os.getenv("SLA_INCIDENT_MERGE", "300"))
+SLA_RECENT_INCIDENTS = int(os.getenv("SLA_RECENT_INCIDENTS", "10"))
+# Jours terminés gardés en cache (un résumé par service et par jour)
+SLA_CACHE_SIZE = int(os.getenv("SLA_CACHE_SIZE", "20000"))
+
+# Graphiques /graph
+GRAPH_CACHE_TTL = int(os.getenv("GRAPH_CACHE_TTL", "600"))
+GRAPH_CACHE_SIZE = int(os.getenv("GRAPH_CACHE_SIZE", "256"))
+# Derniers résultats gardés en mémoire par service (/api/logs, /graph)
+RECENT_RESULTS_SIZE = int(os.getenv("RECENT_RESULTS_SIZE", "100"))
+
+# Alertes Discord
+FLAP_THRESHOLD = int(os.getenv("FLAP_THRESHOLD", "3"))
+ALERT_BATCH_WINDOW = float(os.getenv("ALERT_BATCH_WINDOW", "5"))
+ALERT_CHANNEL_RATE = int(os.getenv("ALERT_CHANNEL_RATE", "5"))
+ALERT_CHANNEL_PERIOD = float(os.getenv("ALERT_CHANNEL_PERIOD", "5"))
+
+# Métriques (/metrics) et profileur
+# Jeton Bearer exigé par /metrics et le profileur (vide: /metrics ouvert, profileur désactivé)
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+# Port /metrics des checkers autonomes (0: pas de serveur), +1 par worker
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+PROFILER_INTERVAL = float(os.getenv("PROFILER_INTERVAL", "0.01"))
+PROFILER_MAX_DURATION = int(os.getenv("PROFILER_MAX_DURATION", "300"))
@@ -0,0 +1 @@
+"""Racine des tests: les modules du projet s'importent depuis tests/ (python -m pytest)"""
@@ -1,82 +1,156 @@
 import discord
 from discord.ext import commands, tasks
-import aiohttp
 import asyncio
-import requests
-from config import DISCORD_TOKEN, SUPABASE_URL, SUPABASE_KEY
-from PIL import Image, ImageDraw, ImageFont
+from config import (
+    DISCORD_TOKEN, COMMAND_SYNC_STATE, CHECKER_MODE, SERVICES_REFRESH_INTERVAL, ROLLUP_FLUSH_INTERVAL, RETENTION_INTERVAL,
+    GRAPH_CACHE_TTL, GRAPH_CACHE_SIZE, RECENT_RESULTS_SIZE, IMPORT_MAX_BYTES, SLA_MAX_DAYS,
+)
+import hashlib
 import io
-from datetime import datetime, timedelta
+import json
+from datetime import datetime, timedelta, timezone
+from checker import Checker
+from probe import PROBE_MODES, validate_probe_settings
+from scheduler import MIN_CHECK_INTERVAL, MAX_CHECK_INTERVAL
+from storage import get_storage, StorageError
+from rollups import pick_resolution, summarize
+from ringbuffer import recent
+from functools import partial
+from bulk import detect_format, read_rows, import_services as bulk_import, export_services as bulk_export
+from sla import uptime_report, maintenance_window
+from cache import TTLCache
+from name_index import NameIndex
+from metrics import registry, profiler
+
+storage = get_storage()
+checker = Checker(storage)
+name_index = NameIndex()
+graph_cache = TTLCache("graphs", GRAPH_CACHE_TTL, GRAPH_CACHE_SIZE)
+
+class DownDetectorBot(commands.Bot):
+    """Bot qui possède la session HTTP des probes et la file d'écriture"""
+
+    async def setup_hook(self):
+        await checker.start()
+
+    async def close(self):
+        await checker.close()
+        await super().close()
 
 intents = discord.Intents.default()
-bot = commands.Bot(command_prefix="!", intents=intents)
-
-# Supabase REST API headers
-SUPABASE_HEADERS = {
-    "apikey": SUPABASE_KEY,
-    "Authorization": f"Bearer {SUPABASE_KEY}",
-    "Content-Type": "application/json"
-}
-
-def query_supabase(table, query=""):
-    """Simple REST API call to Supabase"""
-    if not SUPABASE_URL or not SUPABASE_KEY:
-        return None
+bot = DownDetectorBot(command_prefix="!", intents=intents)
+
+async def fetch_services(owner_id=None):
+    """Liste des services sans bloquer la boucle d'événements (None si erreur)"""
     try:
-        url = f"{SUPABASE_URL}/rest/v1/{table}{query}"
-        resp = requests.get(url, headers=SUPABASE_HEADERS, timeout=5)
-        return resp.json() if resp.status_code == 200 else None
-    except Exception as e:
+        return await asyncio.to_thread(storage.list_services, owner_id)
+    except StorageError as e:
         print(f"Erreur query: {e}")
         return None
 
 async def autocomplete_service_name(interaction: discord.Interaction, current: str) -> list:
-    """Autocomplete pour les noms de services"""
-    services = query_supabase("services", f"?owner_id=eq.{interaction.user.id}&select=name")
-    if not services:
-        return []
-    
-    names = [s["name"] for s in services]
+    """Autocomplete pour les noms de services (index mémoire, aucun appel réseau)"""
     return [
         discord.app_commands.Choice(name=name, value=name)
-        for name in names
-        if current.lower() in name.lower()
-    ][:25]
+        for name in name_index.search(interaction.user.id, current, limit=25)
+    ]
+
+async def is_bot_owner(interaction: discord.Interaction):
+    app_info = await bot.application_info()
+    if interaction.user.id != app_info.owner.id:
+        await interaction.response.send_message("❌ Seul le propriétaire du bot peut utiliser cette commande!", ephemeral=True)
+        return False
+    return True
+
+def command_tree_hash():
+    """Empreinte des commandes telles qu'envoyées à Discord (noms, options, descriptions)"""
+    commands_payload = sorted((command.to_dict() for command in bot.tree.get_commands()), key=lambda c: c["name"])
+    return hashlib.sha256(json.dumps(commands_payload, sort_keys=True).encode()).hexdigest()
+
+async def sync_command_tree():
+    """Synchronise les commandes slash seulement si elles ont changé depuis la dernière fois
+
+    tree.sync() est limité en débit par Discord: inutile de le refaire à
+    chaque redémarrage quand les commandes n'ont pas bougé.
+    """
+    digest = f"{bot.application_id}:{command_tree_hash()}"
+    try:
+        with open(COMMAND_SYNC_STATE) as f:
+            previous = f.read().strip()
+    except OSError:
+        previous = None
+    if previous == digest:
+        print("✅ Commandes inchangées, synchro ignorée")
+        return
+    synced = await bot.tree.sync()
+    print(f"✅ {len(synced)} commandes synchronisées")
+    try:
+        with open(COMMAND_SYNC_STATE, "w") as f:
+            f.write(digest)
+    except OSError as e:
+        print(f"⚠️ Empreinte des commandes non enregistrée: {e}")
 
 @bot.event
 async def on_ready():
     print(f"✅ Bot Discord connecté: {bot.user}")
     try:
-        synced = await bot.tree.sync()
-        print(f"✅ {len(synced)} commandes synchronisées")
+        await sync_command_tree()
     except Exception as e:
         print(f"❌ Erreur sync: {e}")
     
-    if not check_services.is_running():
-        check_services.start()
+    if not refresh_schedule.is_running():
+        refresh_schedule.start()
+    # En mode "external", les checks planifiés tournent dans checker.py
+    if CHECKER_MODE == "embedded" and not run_due_checks.is_running():
+        run_due_checks.start()
+    if CHECKER_MODE == "embedded" and not rollup_flush_loop.is_running():
+        rollup_flush_loop.start()
+    if CHECKER_MODE == "embedded" and not retention_loop.is_running():
+        retention_loop.start()
+
+INTERVAL_ERROR = f"❌ L'intervalle doit être entre {MIN_CHECK_INTERVAL} et {MAX_CHECK_INTERVAL} secondes"
+PROBE_MODE_CHOICES = [discord.app_commands.Choice(name=mode, value=mode) for mode in PROBE_MODES]
 
 @bot.tree.command(name="add_service", description="Ajoute un service à monitorer")
-async def add_service(interaction: discord.Interaction, url: str, name: str):
-    """Ajoute un service"""
+@discord.app_commands.describe(
+    mode="get (défaut), head, tcp ou tls",
+    accepted_status="Statuts HTTP acceptés, ex: 200-299,301 (défaut 200-399)",
+    keyword="Mot attendu dans le début de la page (mode get)"
+)
+@discord.app_commands.choices(mode=PROBE_MODE_CHOICES)
+async def add_service(interaction: discord.Interaction, url: str, name: str, interval: int = None,
+                      mode: str = None, accepted_status: str = None, keyword: str = None):
+    """Ajoute un service (intervalle optionnel en secondes)"""
     try:
+        if interval is not None and (interval < MIN_CHECK_INTERVAL or interval > MAX_CHECK_INTERVAL):
+            await interaction.response.send_message(INTERVAL_ERROR)
+            return
+        try:
+            validate_probe_settings(mode, accepted_status, keyword, url)
+        except ValueError as e:
+            await interaction.response.send_message(f"❌ {e}")
+            return
         data = {
             "url": url,
             "name": name,
             "status": "online",
             "owner_id": str(interaction.user.id),
-            "guild_id": interaction.guild_id or 0
+            "guild_id": interaction.guild_id or 0,
+            "alert_channel_id": interaction.channel_id,
+            "check_interval": interval,
+            "probe_mode": mode,
+            "accepted_status": accepted_status,
+            "keyword": keyword
         }
-        resp = requests.post(
-            f"{SUPABASE_URL}/rest/v1/services",
-            json=data,
-            headers=SUPABASE_HEADERS,
-            timeout=5
-        )
-        print(f"Add service response: {resp.status_code} - {resp.text}")
-        if resp.status_code in [200, 201]:
-            await interaction.response.send_message(f"✅ Service '{name}' ajouté!")
-        else:
-            await interaction.response.send_message(f"❌ Erreur: {resp.status_code} - {resp.text}")
+        try:
+            service = await asyncio.to_thread(storage.add_service, data)
+        except StorageError as e:
+            print(f"Add service error: {e}")
+            await interaction.response.send_message(f"❌ Erreur: {e}")
+            return
+        checker.scheduler.sync_one(service)
+        name_index.add(service["owner_id"], service["name"])
+        await interaction.response.send_message(f"✅ Service '{name}' ajouté!")
     except Exception as e:
         await interaction.response.send_message(f"❌ Erreur: {str(e)}")
 
@@ -84,7 +158,7 @@ async def add_service(interaction: discord.Interaction, url: str, name: str):
 async def list_services(interaction: discord.Interaction):
     """Liste les services"""
     try:
-        services = query_supabase("services", f"?owner_id=eq.{interaction.user.id}&select=*")
+        services = await fetch_services(interaction.user.id)
         
         if not services:
             await interaction.response.send_message("❌ Aucun service configuré")
@@ -107,15 +181,17 @@ async def list_services(interaction: discord.Interaction):
 async def remove_service(interaction: discord.Interaction, name: str):
     """Supprime un service"""
     try:
-        resp = requests.delete(
-            f"{SUPABASE_URL}/rest/v1/services?owner_id=eq.{interaction.user.id}&name=eq.{name}",
-            headers=SUPABASE_HEADERS,
-            timeout=5
-        )
-        if resp.status_code in [200, 204]:
-            await interaction.response.send_message(f"✅ Service '{name}' supprimé")
-        else:
+        try:
+            deleted = await asyncio.to_thread(storage.delete_service, owner_id=str(interaction.user.id), name=name)
+        except StorageError:
             await interaction.response.send_message(f"❌ Erreur")
+            return
+        for service in deleted:
+            checker.scheduler.remove(service["id"])
+            checker.states.forget(service["id"])
+            recent.forget(service["id"])
+            name_index.remove(service["owner_id"], service["name"])
+        await interaction.response.send_message(f"✅ Service '{name}' supprimé")
     except Exception as e:
         await interaction.response.send_message(f"❌ Erreur: {str(e)}")
 
@@ -124,33 +200,262 @@ async def remove_autocomplete(interaction: discord.Interaction, current: str) ->
     return await autocomplete_service_name(interaction, current)
 
 
+@bot.tree.command(name="alert_channel", description="Envoie les alertes de tes services dans ce salon")
+async def alert_channel(interaction: discord.Interaction, name: str = None):
+    """Salon des alertes pour un service (ou tous tes services si pas de nom)"""
+    try:
+        updated = await asyncio.to_thread(
+            storage.update_service, {"alert_channel_id": interaction.channel_id},
+            owner_id=str(interaction.user.id), name=name
+        )
+        if updated:
+            await interaction.response.send_message(f"✅ Alertes de {len(updated)} service(s) envoyées dans ce salon")
+        else:
+            await interaction.response.send_message("❌ Aucun service trouvé")
+    except Exception as e:
+        await interaction.response.send_message(f"❌ Erreur: {str(e)}")
+
+@alert_channel.autocomplete("name")
+async def alert_channel_autocomplete(interaction: discord.Interaction, current: str) -> list:
+    return await autocomplete_service_name(interaction, current)
+
+
+@bot.tree.command(name="import_services", description="Importe des services depuis un fichier CSV ou NDJSON")
+@discord.app_commands.describe(file="Colonnes: name, url, check_interval, probe_mode, accepted_status, keyword")
+async def import_services(interaction: discord.Interaction, file: discord.Attachment):
+    """Import en masse: un lot inséré par requête, un résultat par ligne"""
+    if file.size > IMPORT_MAX_BYTES:
+        await interaction.response.send_message(f"❌ Fichier trop gros (max {IMPORT_MAX_BYTES // 1000} Ko)")
+        return
+    await interaction.response.defer()
+    try:
+        lines = io.StringIO((await file.read()).decode("utf-8-sig"), newline="")
+        defaults = {
+            "owner_id": str(interaction.user.id),
+            "guild_id": interaction.guild_id or 0,
+            "alert_channel_id": interaction.channel_id,
+            "status": "online"
+        }
+        created = []
+        results = await asyncio.to_thread(
+            lambda: list(bulk_import(storage, read_rows(lines, detect_format(file.filename)), defaults, created.extend))
+        )
+        for service in created:
+            checker.scheduler.sync_one(service)
+            name_index.add(service["owner_id"], service["name"])
+        summary = results.pop()["summary"]
+        message = (f"✅ {summary['created']} service(s) créé(s), {summary['exists']} déjà existant(s), "
+                   f"{summary['duplicate']} doublon(s), {summary['invalid']} invalide(s)")
+        if summary["error"]:
+            message += f", {summary['error']} en erreur"
+        rejected = [r for r in results if r["result"] != "created"]
+        if rejected:
+            # Détail des lignes refusées en pièce jointe
+            report = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in rejected)
+            await interaction.followup.send(message, file=discord.File(io.BytesIO(report.encode()), filename="import_errors.ndjson"))
+        else:
+            await interaction.followup.send(message)
+    except UnicodeDecodeError:
+        await interaction.followup.send("❌ Le fichier doit être encodé en UTF-8")
+    except Exception as e:
+        await interaction.followup.send(f"❌ Erreur: {str(e)}")
+
+@bot.tree.command(name="export_services", description="Exporte tes services (CSV ou NDJSON)")
+@discord.app_commands.choices(format=[
+    discord.app_commands.Choice(name="csv", value="csv"),
+    discord.app_commands.Choice(name="ndjson", value="ndjson"),
+])
+async def export_services(interaction: discord.Interaction, format: str = "csv"):
+    """Fichier réimportable avec /import_services"""
+    await interaction.response.defer(ephemeral=True)
+    try:
+        content = await asyncio.to_thread(lambda: "".join(bulk_export(storage, str(interaction.user.id), format)))
+        await interaction.followup.send(file=discord.File(io.BytesIO(content.encode()), filename=f"services.{format}"),
+                                        ephemeral=True)
+    except Exception as e:
+        await interaction.followup.send(f"❌ Erreur: {str(e)}", ephemeral=True)
+
+
 @bot.tree.command(name="ping_now", description="Force un ping immédiat pour tous les services")
 async def ping_now(interaction: discord.Interaction):
     """Force un ping immédiat"""
+    if CHECKER_MODE != "embedded":
+        # Les workers vérifient déjà chaque service: un sweep ici doublerait probes et alertes
+        await interaction.response.send_message(
+            "❌ Les checks tournent dans les workers (CHECKER_MODE=external): "
+            "ils vérifient chaque service à son intervalle, /ping_now est désactivé")
+        return
     await interaction.response.defer()
     try:
         await check_services()
-        await interaction.followup.send("✅ Ping lancé! Les données devraient être disponibles maintenant.")
+        stats = checker.probe_engine.last_sweep
+        if stats:
+            await interaction.followup.send(
+                f"✅ Ping lancé! {stats['services']} services vérifiés en {stats['duration_ms']}ms "
+                f"(pic: {stats['peak_in_flight']} en parallèle)"
+            )
+        else:
+            await interaction.followup.send("✅ Ping lancé! Les données devraient être disponibles maintenant.")
     except Exception as e:
         await interaction.followup.send(f"❌ Erreur: {str(e)}")
 
 @bot.tree.command(name="config_ping", description="Configure l'intervalle de ping (owner only)")
 async def config_ping(interaction: discord.Interaction, interval: int):
     """Configure l'intervalle de ping en secondes (owner only)"""
-    app_info = await bot.application_info()
-    if interaction.user.id != app_info.owner.id:
-        await interaction.response.send_message("❌ Seul le propriétaire du bot peut utiliser cette commande!", ephemeral=True)
+    if not await is_bot_owner(interaction):
+        return
+    
+    if CHECKER_MODE != "embedded":
+        await interaction.response.send_message(
+            "❌ Les checks tournent dans les workers (CHECKER_MODE=external): "
+            "règle DEFAULT_CHECK_INTERVAL dans leur configuration")
         return
     
-    if interval < 10 or interval > 3600:
-        await interaction.response.send_message("❌ L'intervalle doit être entre 10 secondes et 1 heure (3600s)")
+    if interval < MIN_CHECK_INTERVAL or interval > MAX_CHECK_INTERVAL:
+        await interaction.response.send_message(INTERVAL_ERROR)
         return
     
-    check_services.change_interval(minutes=interval/60)
-    await interaction.response.send_message(f"✅ Intervalle de ping configuré à **{interval} secondes**")
+    checker.scheduler.set_default_interval(interval)
+    await interaction.response.send_message(f"✅ Intervalle de ping par défaut configuré à **{interval} secondes**")
+
+@bot.tree.command(name="set_interval", description="Configure l'intervalle de ping d'un de tes services")
+async def set_interval(interaction: discord.Interaction, name: str, interval: int):
+    """Configure l'intervalle de ping d'un service en secondes"""
+    if interval < MIN_CHECK_INTERVAL or interval > MAX_CHECK_INTERVAL:
+        await interaction.response.send_message(INTERVAL_ERROR)
+        return
+    try:
+        updated = await asyncio.to_thread(
+            storage.update_service, {"check_interval": interval},
+            owner_id=str(interaction.user.id), name=name
+        )
+        if updated:
+            checker.scheduler.sync_one(updated[0])
+            await interaction.response.send_message(f"✅ '{name}' sera vérifié toutes les **{interval} secondes**")
+        else:
+            await interaction.response.send_message(f"❌ Service '{name}' non trouvé")
+    except Exception as e:
+        await interaction.response.send_message(f"❌ Erreur: {str(e)}")
+
+@set_interval.autocomplete("name")
+async def set_interval_autocomplete(interaction: discord.Interaction, current: str) -> list:
+    return await autocomplete_service_name(interaction, current)
+
+@bot.tree.command(name="set_probe", description="Configure la façon de vérifier un de tes services")
+@discord.app_commands.describe(
+    mode="get, head, tcp ou tls",
+    accepted_status="Statuts HTTP acceptés, ex: 200-299,301 (vide: 200-399)",
+    keyword="Mot attendu dans le début de la page (mode get, vide: aucun)"
+)
+@discord.app_commands.choices(mode=PROBE_MODE_CHOICES)
+async def set_probe(interaction: discord.Interaction, name: str, mode: str,
+                    accepted_status: str = None, keyword: str = None):
+    """Mode de probe, statuts acceptés et mot-clé d'un service"""
+    services = await fetch_services(interaction.user.id)
+    if services is None:
+        await interaction.response.send_message("❌ Erreur lors de la lecture des services")
+        return
+    service = next((s for s in services if s["name"] == name), None)
+    if not service:
+        await interaction.response.send_message(f"❌ Service '{name}' non trouvé")
+        return
+    try:
+        # L'url stockée doit avoir un hôte pour les modes tcp/tls
+        validate_probe_settings(mode, accepted_status, keyword, service["url"])
+    except ValueError as e:
+        await interaction.response.send_message(f"❌ {e}")
+        return
+    try:
+        updated = await asyncio.to_thread(
+            storage.update_service,
+            {"probe_mode": mode, "accepted_status": accepted_status or None, "keyword": keyword or None},
+            owner_id=str(interaction.user.id), name=name
+        )
+        if updated:
+            checker.scheduler.sync_one(updated[0])
+            details = f" (statuts {accepted_status})" if accepted_status else ""
+            details += f", mot-clé '{keyword}'" if keyword else ""
+            await interaction.response.send_message(f"✅ '{name}' sera vérifié en **{mode}**{details}")
+        else:
+            await interaction.response.send_message(f"❌ Service '{name}' non trouvé")
+    except Exception as e:
+        await interaction.response.send_message(f"❌ Erreur: {str(e)}")
 
-def create_graph_image(service_name, logs):
-    """Crée une image du graphique avec Pillow"""
+@set_probe.autocomplete("name")
+async def set_probe_autocomplete(interaction: discord.Interaction, current: str) -> list:
+    return await autocomplete_service_name(interaction, current)
+
+@bot.tree.command(name="checker_stats", description="Affiche l'état du planificateur de checks")
+async def checker_stats(interaction: discord.Interaction):
+    """Profondeur de la file et retard du planificateur"""
+    stats = checker.scheduler.stats()
+    embed = discord.Embed(title="⏱️ Planificateur", color=discord.Color.blue())
+    embed.add_field(name="Services planifiés", value=str(stats["queue_depth"]))
+    embed.add_field(name="En retard", value=str(stats["overdue"]))
+    embed.add_field(name="En cours", value=str(stats["running"]))
+    embed.add_field(name="Retard dernier check", value=f"{stats['last_lag_ms']}ms")
+    embed.add_field(name="Retard max", value=f"{stats['max_lag_ms']}ms")
+    embed.add_field(name="Checks fusionnés", value=str(stats["coalesced"]))
+    embed.add_field(name="Intervalle par défaut", value=f"{stats['default_interval']}s")
+    states = checker.states.stats()
+    embed.add_field(name="Services down", value=f"{states['down']} ({states['failing']} en échec)")
+    embed.add_field(name="Changements de statut", value=str(states["transitions"]))
+    embed.add_field(name="Hôtes coupés (disjoncteur)", value=str(checker.probe_engine.breaker.open_hosts()))
+    embed.add_field(name="Alertes", value=f"{checker.alerts.sent} envoyées, {checker.alerts.pending()} en attente, "
+                                                 f"{checker.alerts.dropped} abandonnées")
+    if checker.vantages.agents:
+        embed.add_field(
+            name=f"Points de vue (quorum {checker.vantages.quorum}/{checker.vantages.size})",
+            value="\n".join(f"{'🟢' if a['available'] else '🔴'} {a['name']}: {a['requests']} lots, {a['errors']} erreurs"
+                            for a in checker.vantages.stats()),
+            inline=False
+        )
+    report = checker.retention.last_report
+    if report:
+        embed.add_field(name="Dernière rétention",
+                        value=f"{report['pings_deleted']} pings, {report['rollups_deleted']} rollups supprimés")
+    await interaction.response.send_message(embed=embed)
+
+@bot.tree.command(name="metrics", description="Métriques du bot au format Prometheus (owner only)")
+async def metrics_command(interaction: discord.Interaction):
+    """Même contenu que /metrics côté web, en pièce jointe"""
+    if not await is_bot_owner(interaction):
+        return
+    text = await asyncio.to_thread(registry.render)
+    await interaction.response.send_message(
+        file=discord.File(io.BytesIO(text.encode()), filename="metrics.txt"), ephemeral=True
+    )
+
+@bot.tree.command(name="profiler", description="Profileur par échantillonnage (owner only)")
+@discord.app_commands.choices(action=[
+    discord.app_commands.Choice(name="start", value="start"),
+    discord.app_commands.Choice(name="stop", value="stop"),
+])
+async def profiler_command(interaction: discord.Interaction, action: str, duration: int = None):
+    """start: démarre une capture; stop: l'arrête et envoie les piles"""
+    if not await is_bot_owner(interaction):
+        return
+    if action == "start":
+        if profiler.start(duration):
+            await interaction.response.send_message(f"🔬 Profileur démarré (max {duration or profiler.max_duration}s)", ephemeral=True)
+        else:
+            await interaction.response.send_message("❌ Profileur déjà actif", ephemeral=True)
+        return
+    await asyncio.to_thread(profiler.stop)
+    stats = profiler.stats()
+    top = "\n".join(f"{percent}% {name}" for name, _, percent in profiler.top(10)) or "Aucun échantillon"
+    await interaction.response.send_message(
+        f"🔬 {stats['samples']} échantillons sur {stats['duration']}s\n```\n{top[:1800]}\n```",
+        file=discord.File(io.BytesIO(profiler.collapsed().encode()), filename="profile.collapsed"),
+        ephemeral=True
+    )
+
+def create_graph_image(service_name, logs, stats=None):
+    """Crée une image du graphique avec Pillow
+
+    stats (moyenne/min/max déjà calculés, cf. ringbuffer) évite de les
+    recalculer sur les logs.
+    """
     if not logs:
         logs = []
     
@@ -160,6 +465,9 @@ def create_graph_image(service_name, logs):
     graph_width = width - 2 * padding
     graph_height = height - 2 * padding
     
+    # Pillow n'est chargé qu'au premier /graph
+    from PIL import Image, ImageDraw
+
     # Créer l'image
     img = Image.new('RGB', (width, height), color=(36, 37, 38))
     draw = ImageDraw.Draw(img)
@@ -184,41 +492,45 @@ def create_graph_image(service_name, logs):
     
     max_latency = max(latencies) * 1.2  # Ajouter 20% de marge
     
-    # Tracer la ligne
-    points = []
-    for i, latency in enumerate(latencies):
-        x = padding + (i / (len(latencies) - 1)) * graph_width if len(latencies) > 1 else padding + graph_width / 2
-        y = padding + graph_height - (latency / max_latency) * graph_height
-        points.append((x, y))
-    
-    # Dessiner les points et lignes
-    for i in range(len(points) - 1):
-        draw.line([points[i], points[i + 1]], fill=(87, 242, 135), width=2)
-    
-    for point in points:
-        draw.ellipse([point[0] - 3, point[1] - 3, point[0] + 3, point[1] + 3], fill=(87, 242, 135))
+    # Tracer la courbe: coordonnées calculées d'un coup, une seule polyligne
+    x_step = graph_width / (len(latencies) - 1)
+    y_scale = graph_height / max_latency
+    bottom = padding + graph_height
+    points = [(padding + i * x_step, bottom - latency * y_scale) for i, latency in enumerate(latencies)]
+    draw.line(points, fill=(87, 242, 135), width=2, joint="curve")
     
     # Labels
     draw.text((padding - 30, padding - 20), "Latence (ms)", fill=(200, 200, 200))
     draw.text((padding + graph_width - 50, padding + graph_height + 10), "Temps", fill=(200, 200, 200))
     
     # Stats
-    avg_latency = sum(latencies) / len(latencies)
-    min_latency = min(latencies)
-    max_latency_actual = max(latencies)
+    if stats is not None and stats["latency_avg"] is not None:
+        avg_latency, min_latency, max_latency_actual = stats["latency_avg"], stats["latency_min"], stats["latency_max"]
+    else:
+        avg_latency = sum(latencies) / len(latencies)
+        min_latency = min(latencies)
+        max_latency_actual = max(latencies)
     
     stats_text = f"Moyenne: {avg_latency:.0f}ms | Min: {min_latency}ms | Max: {max_latency_actual}ms"
+    if stats is not None and stats["uptime"] is not None:
+        stats_text += f" | Uptime: {stats['uptime']}%"
     draw.text((padding, height - 25), stats_text, fill=(200, 200, 200))
     
     return img
 
+def render_graph_png(service_name, logs, stats=None):
+    """Rendu PNG complet (appelé dans un thread, hors de la boucle d'événements)"""
+    img_bytes = io.BytesIO()
+    create_graph_image(service_name, logs, stats).save(img_bytes, format='PNG')
+    return img_bytes.getvalue()
+
 @bot.tree.command(name="graph", description="Affiche le graphique de latence d'un service")
-async def graph(interaction: discord.Interaction, name: str = None):
-    """Affiche le graphique de latence"""
+async def graph(interaction: discord.Interaction, name: str = None, hours: int = None):
+    """Affiche le graphique de latence (100 derniers pings, ou les N dernières heures)"""
     await interaction.response.defer()
     try:
         # Récupérer les services de l'utilisateur
-        services = query_supabase("services", f"?owner_id=eq.{interaction.user.id}")
+        services = await fetch_services(interaction.user.id)
         
         if not services:
             await interaction.followup.send("❌ Tu n'as pas de services")
@@ -236,21 +548,38 @@ async def graph(interaction: discord.Interaction, name: str = None):
             return
         
         # Récupérer les logs
-        logs = query_supabase("pings", f"?service_id=eq.{service['id']}&order=created_at.asc&limit=100")
+        stats = None
+        if hours:
+            # Historique long: buckets agrégés plutôt que les pings bruts
+            resolution = pick_resolution(hours * 3600)
+            since = datetime.now(timezone.utc) - timedelta(hours=hours)
+            buckets = await asyncio.to_thread(storage.get_rollups, service["id"], resolution, since)
+            logs = [
+                {"latency_ms": b["latency_avg"], "created_at": b["bucket_start"], "count": b["count"]}
+                for b in map(summarize, buckets)
+            ]
+        else:
+            # Derniers résultats du checker en mémoire, sinon le stockage
+            load = partial(storage.get_pings, service["id"], limit=RECENT_RESULTS_SIZE, newest=True)
+            snapshot = await asyncio.to_thread(recent.snapshot, service["id"], load, 100)
+            if snapshot is not None:
+                logs, stats = snapshot
+            else:
+                logs = await asyncio.to_thread(storage.get_pings, service["id"], limit=100, newest=True)
         
         if not logs:
             await interaction.followup.send(f"❌ Pas de données pour '{service['name']}'")
             return
         
-        # Créer l'image
-        img = create_graph_image(service['name'], logs)
+        # Même service, même dernier ping: l'image en cache est identique
+        last = logs[-1]
+        cache_key = (service["id"], service["name"], hours, len(logs), last.get("created_at"), last.get("count"))
+        png = graph_cache.get(cache_key)
+        if png is None:
+            png = await asyncio.to_thread(render_graph_png, service['name'], logs, stats)
+            graph_cache.set(cache_key, png)
         
-        # Envoyer l'image
-        img_bytes = io.BytesIO()
-        img.save(img_bytes, format='PNG')
-        img_bytes.seek(0)
-        
-        file = discord.File(img_bytes, filename="graph.png")
+        file = discord.File(io.BytesIO(png), filename="graph.png")
         await interaction.followup.send(file=file)
         
     except Exception as e:
@@ -260,60 +589,128 @@ async def graph(interaction: discord.Interaction, name: str = None):
 async def graph_autocomplete(interaction: discord.Interaction, current: str) -> list:
     return await autocomplete_service_name(interaction, current)
 
-@tasks.loop(minutes=5)
+def format_duration(seconds):
+    """3725 -> 1h 02m, 59 -> 59s"""
+    seconds = int(seconds)
+    if seconds < 60:
+        return f"{seconds}s"
+    hours, minutes = divmod(seconds // 60, 60)
+    if hours >= 24:
+        return f"{hours // 24}j {hours % 24:02d}h"
+    return f"{hours}h {minutes:02d}m" if hours else f"{minutes}m"
+
+@bot.tree.command(name="uptime", description="Uptime d'un service sur les N derniers jours")
+async def uptime(interaction: discord.Interaction, name: str, days: int = 30):
+    """Uptime, incidents et couverture sur les N derniers jours (30 par défaut)"""
+    if not 1 <= days <= SLA_MAX_DAYS:
+        await interaction.response.send_message(f"❌ Le nombre de jours doit être entre 1 et {SLA_MAX_DAYS}")
+        return
+    await interaction.response.defer()
+    try:
+        services = await fetch_services(interaction.user.id)
+        if services is None:
+            await interaction.followup.send("❌ Erreur lors de la lecture des services")
+            return
+        service = next((s for s in services if s["name"].lower() == name.lower()), None)
+        if not service:
+            await interaction.followup.send(f"❌ Service '{name}' non trouvé")
+            return
+        report = await asyncio.to_thread(uptime_report, storage, service, days)
+        if report["uptime"] is None:
+            await interaction.followup.send(f"❌ Pas de données pour '{service['name']}' sur {days} jours")
+            return
+        color = discord.Color.green() if report["uptime"] >= 99.9 else (
+            discord.Color.orange() if report["uptime"] >= 99 else discord.Color.red())
+        embed = discord.Embed(title=f"📈 {service['name']}: {report['uptime']}% sur {days} jours", color=color)
+        embed.add_field(name="Temps down", value=format_duration(report["down_s"]))
+        embed.add_field(name="Incidents", value=str(report["incidents"]["count"]))
+        if report["incidents"]["count"]:
+            embed.add_field(name="Plus long", value=format_duration(report["incidents"]["longest_s"]))
+            embed.add_field(name="Durée moyenne", value=format_duration(report["incidents"]["mttr_s"]))
+        embed.add_field(name="Couverture", value=f"{report['coverage']}%")
+        if report["maintenance_s"]:
+            embed.add_field(name="Maintenance (exclue)", value=format_duration(report["maintenance_s"]))
+        lines = [
+            f"{'🔴' if i['ongoing'] else '🟠'} <t:{int(datetime.fromisoformat(i['start']).timestamp())}:f> "
+            f"({format_duration(i['duration_s'])})"
+            for i in report["incidents"]["recent"][:5]
+        ]
+        if lines:
+            embed.add_field(name="Derniers incidents", value="\n".join(lines), inline=False)
+        await interaction.followup.send(embed=embed)
+    except Exception as e:
+        await interaction.followup.send(f"❌ Erreur: {str(e)}")
+
+@uptime.autocomplete("name")
+async def uptime_autocomplete(interaction: discord.Interaction, current: str) -> list:
+    return await autocomplete_service_name(interaction, current)
+
+@bot.tree.command(name="maintenance", description="Déclare une maintenance: exclue du calcul d'uptime")
+@discord.app_commands.describe(minutes="Durée à partir de maintenant (max 7 jours)", reason="Raison (optionnelle)")
+async def maintenance(interaction: discord.Interaction, name: str, minutes: int, reason: str = None):
+    """Fenêtre de maintenance qui commence maintenant"""
+    if not 1 <= minutes <= 7 * 24 * 60:
+        await interaction.response.send_message("❌ La durée doit être entre 1 minute et 7 jours (10080)")
+        return
+    try:
+        services = await fetch_services(interaction.user.id)
+        if services is None:
+            await interaction.response.send_message("❌ Erreur lors de la lecture des services")
+            return
+        service = next((s for s in services if s["name"].lower() == name.lower()), None)
+        if not service:
+            await interaction.response.send_message(f"❌ Service '{name}' non trouvé")
+            return
+        window = await asyncio.to_thread(
+            storage.add_maintenance, maintenance_window(service["id"], minutes, reason=reason))
+        ends_at = int(datetime.fromisoformat(window["ends_at"]).timestamp())
+        await interaction.response.send_message(
+            f"🛠️ Maintenance de '{service['name']}' jusqu'à <t:{ends_at}:t>, exclue de l'uptime")
+    except Exception as e:
+        await interaction.response.send_message(f"❌ Erreur: {str(e)}")
+
+@maintenance.autocomplete("name")
+async def maintenance_autocomplete(interaction: discord.Interaction, current: str) -> list:
+    return await autocomplete_service_name(interaction, current)
+
 async def check_services():
-    """Vérifie le statut des services"""
+    """Vérifie tout de suite le statut de tous les services"""
     try:
-        services = query_supabase("services", "?select=*")
+        services = await fetch_services()
         if not services:
             return
-        
-        for service in services:
-            try:
-                import time
-                start_time = time.time()
-                async with aiohttp.ClientSession() as session:
-                    async with session.get(service["url"], timeout=aiohttp.ClientTimeout(total=5)) as resp:
-                        latency_ms = int((time.time() - start_time) * 1000)
-                        new_status = "online" if resp.status == 200 else "down"
-                        
-                        # Enregistre le log via REST API (table pings)
-                        try:
-                            log_resp = requests.post(
-                                f"{SUPABASE_URL}/rest/v1/pings",
-                                json={
-                                    "service_id": service["id"],
-                                    "owner_id": service["owner_id"],
-                                    "service_name": service["name"],
-                                    "status": new_status,
-                                    "latency_ms": latency_ms
-                                },
-                                headers=SUPABASE_HEADERS,
-                                timeout=5
-                            )
-                            if log_resp.status_code in [200, 201]:
-                                print(f"✅ Log enregistré: {service['name']} ({latency_ms}ms)")
-                            else:
-                                print(f"⚠️ Log error: {log_resp.status_code}")
-                        except Exception as e:
-                            print(f"⚠️ Erreur log: {e}")
-                        
-                        # Update service status
-                        try:
-                            requests.patch(
-                                f"{SUPABASE_URL}/rest/v1/services?id=eq.{service['id']}",
-                                json={"status": new_status},
-                                headers=SUPABASE_HEADERS,
-                                timeout=5
-                            )
-                        except Exception as e:
-                            print(f"⚠️ Erreur update: {e}")
-            except Exception as e:
-                print(f"Erreur check {service.get('name')}: {e}")
+        await checker.sync(services)
+        name_index.load(services)
+        await checker.sweep(services)
     except Exception as e:
         print(f"Erreur check_services: {e}")
 
-@check_services.before_loop
+@tasks.loop(seconds=SERVICES_REFRESH_INTERVAL)
+async def refresh_schedule():
+    """Recharge la liste des services (planning et index des noms)"""
+    services = await fetch_services()
+    if services is None:
+        return
+    if CHECKER_MODE == "embedded":
+        await checker.sync(services)
+    name_index.load(services)
+
+@tasks.loop(seconds=1)
+async def run_due_checks():
+    checker.run_due()
+
+@tasks.loop(seconds=ROLLUP_FLUSH_INTERVAL)
+async def rollup_flush_loop():
+    await checker.flush_rollups()
+
+@tasks.loop(seconds=RETENTION_INTERVAL)
+async def retention_loop():
+    checker.start_retention()
+
+@refresh_schedule.before_loop
+@run_due_checks.before_loop
+@rollup_flush_loop.before_loop
+@retention_loop.before_loop
 async def before_check():
     await bot.wait_until_ready()
 
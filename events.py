@@ -0,0 +1,102 @@
+"""Diffusion en mémoire des changements de statut vers les clients SSE"""
+import asyncio
+import queue
+import threading
+
+from config import EVENT_QUEUE_SIZE
+from metrics import registry
+
+
+class AsyncSubscription:
+    """Abonné côté asyncio: publish() peut être appelé depuis n'importe quel thread"""
+
+    def __init__(self, broker, loop, maxsize):
+        self.broker = broker
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize)
+
+    def put_nowait(self, item):
+        try:
+            self.loop.call_soon_threadsafe(self._put, item)
+        except RuntimeError:
+            # Boucle fermée: le client est parti
+            pass
+
+    def _put(self, item):
+        try:
+            self.queue.put_nowait(item)
+        except asyncio.QueueFull:
+            # Même règle que les files des threads: on vide et le client resynchronise
+            self.broker.dropped += 1
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(("resync", {}))
+
+    async def get(self, timeout):
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+
+class EventBroker:
+    """Publie des événements par utilisateur, thread-safe
+
+    Chaque abonné a sa propre file bornée. Si un client ne lit pas assez
+    vite, ses plus vieux événements sont jetés et il reçoit un événement
+    "resync" pour recharger la liste complète.
+    """
+
+    def __init__(self, max_queue=EVENT_QUEUE_SIZE):
+        self.max_queue = max_queue
+        self._subscribers = {}
+        self._lock = threading.Lock()
+        self.published = 0
+        self.dropped = 0
+
+    def subscribe(self, owner_id):
+        q = queue.Queue(maxsize=self.max_queue)
+        with self._lock:
+            self._subscribers[q] = str(owner_id)
+        return q
+
+    def subscribe_async(self, owner_id):
+        """Abonnement lu depuis la boucle asyncio courante (serveur aiohttp)"""
+        subscription = AsyncSubscription(self, asyncio.get_running_loop(), self.max_queue)
+        with self._lock:
+            self._subscribers[subscription] = str(owner_id)
+        return subscription
+
+    def unsubscribe(self, q):
+        with self._lock:
+            self._subscribers.pop(q, None)
+
+    def subscribers(self):
+        return len(self._subscribers)
+
+    def publish(self, owner_id, event_type, data):
+        owner_id = str(owner_id)
+        with self._lock:
+            targets = [q for q, owner in self._subscribers.items() if owner == owner_id]
+        for q in targets:
+            self.published += 1
+            try:
+                q.put_nowait((event_type, data))
+            except queue.Full:
+                self.dropped += 1
+                try:
+                    # Le client est en retard: on vide sa file et il resynchronise
+                    while True:
+                        q.get_nowait()
+                except queue.Empty:
+                    pass
+                q.put_nowait(("resync", {}))
+
+
+broker = EventBroker()
+
+
+@registry.collector
+def _event_metrics():
+    return [
+        ("downdetector_sse_subscribers", "gauge", "Clients SSE connectés", [({}, broker.subscribers())]),
+        ("downdetector_events_published_total", "counter", "Événements envoyés aux clients SSE", [({}, broker.published)]),
+        ("downdetector_events_dropped_total", "counter", "Événements jetés (client en retard)", [({}, broker.dropped)]),
+    ]
@@ -0,0 +1,17 @@
+"""Configuration gunicorn (chargée automatiquement par gunicorn app:app)
+
+Un seul worker: les jobs de ping manuel (jobs.py) vivent dans la mémoire
+du processus, un second worker répondrait 404 au poll d'un job lancé par
+le premier. Le parallélisme vient des threads.
+"""
+from config import WEB_THREADS
+
+workers = 1
+worker_class = "gthread"
+threads = WEB_THREADS
+
+
+def on_starting(server):
+    if server.cfg.workers != 1:
+        raise RuntimeError(f"gunicorn doit tourner avec un seul worker (--workers {server.cfg.workers}): "
+                           "les jobs de ping sont gardés en mémoire par processus")
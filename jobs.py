@@ -0,0 +1,67 @@
+"""Jobs de fond pour le web: le thread de requête rend la main tout de suite"""
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from cache import TTLCache
+from config import HTTP_POOL_SIZE, JOB_WORKERS, JOB_TTL
+
+
+def make_http_session(pool_size=HTTP_POOL_SIZE):
+    """Session requests partagée: connexions keep-alive réutilisées entre appels"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+http = make_http_session()
+
+
+class JobRunner:
+    """Exécute des fonctions dans un pool de threads et garde leur résultat
+    pendant JOB_TTL secondes pour que le client puisse le récupérer
+
+    Les jobs sont en mémoire: le serveur web doit tourner en un seul
+    processus (threads, voir gunicorn.conf.py), sinon le poll d'un job
+    peut tomber sur un worker qui ne le connaît pas.
+    """
+
+    def __init__(self, workers=JOB_WORKERS, ttl=JOB_TTL):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self.jobs = TTLCache("jobs", ttl)
+
+    def submit(self, owner_id, fn, *args):
+        job_id = self.create(owner_id)
+        self.executor.submit(self._run, job_id, owner_id, fn, args)
+        return job_id
+
+    def create(self, owner_id):
+        """Job en attente exécuté ailleurs (boucle asyncio...), terminé par finish()"""
+        job_id = uuid.uuid4().hex
+        self.jobs.set(job_id, {"id": job_id, "owner_id": str(owner_id), "state": "pending"})
+        return job_id
+
+    def finish(self, job_id, owner_id, result=None, error=None):
+        job = {"state": "error", "error": error} if error is not None else {"state": "done", "result": result}
+        self.jobs.set(job_id, {"id": job_id, "owner_id": str(owner_id), **job})
+
+    def _run(self, job_id, owner_id, fn, args):
+        try:
+            result = fn(job_id, *args)
+        except Exception as e:
+            self.finish(job_id, owner_id, error=str(e))
+            return
+        self.finish(job_id, owner_id, result)
+
+    def get(self, job_id, owner_id):
+        job = self.jobs.get(job_id)
+        if job is None or job["owner_id"] != str(owner_id):
+            return None
+        return job
+
+
+jobs = JobRunner()
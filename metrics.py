@@ -0,0 +1,317 @@
+"""Métriques au format Prometheus et profileur par échantillonnage
+
+Un seul registre par processus (registry): le bot, l'API Flask et les
+checkers y écrivent, /metrics le publie. Les valeurs qui existent déjà
+ailleurs (profondeur des files, stats des caches...) sont lues au moment
+du rendu par des collecteurs, sans compteur en double.
+"""
+import asyncio
+import bisect
+import collections
+import os
+import sys
+import threading
+import time
+
+from config import PROFILER_INTERVAL, PROFILER_MAX_DURATION
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labels):
+            raise ValueError(f"{self.name}: labels attendus {self.labels}, reçus {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield self.name, dict(zip(self.labels, key)), value
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Comptes par bucket (non cumulés) + un bucket +Inf, somme
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][i] += 1
+            state[1] += value
+
+    def samples(self):
+        with self._lock:
+            items = [(key, list(counts), total) for key, (counts, total) in self._values.items()]
+        for key, counts, total in items:
+            labels = dict(zip(self.labels, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                yield f"{self.name}_bucket", {**labels, "le": _format_value(float(bound))}, cumulative
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, cumulative
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"{name} existe déjà ({metric.kind})")
+            return metric
+
+    def counter(self, name, help, labels=()):
+        return self._get_or_create(Counter, name, help, labels)
+
+    def gauge(self, name, help, labels=()):
+        return self._get_or_create(Gauge, name, help, labels)
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._get_or_create(Histogram, name, help, labels, buckets)
+
+    def collector(self, fn):
+        """Enregistre fn, appelée à chaque rendu; elle retourne
+        [(nom, type, aide, [(labels, valeur), ...]), ...]"""
+        with self._lock:
+            self._collectors.append(fn)
+        return fn
+
+    def collect(self):
+        """(nom, type, aide, [(nom de série, labels, valeur)]) pour chaque métrique"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+        for metric in metrics:
+            yield metric.name, metric.kind, metric.help, list(metric.samples())
+        families = {}
+        for fn in collectors:
+            try:
+                for name, kind, help, samples in fn():
+                    family = families.setdefault(name, (kind, help, []))
+                    family[2].extend((name, labels, value) for labels, value in samples)
+            except Exception as e:
+                print(f"⚠️ Erreur collecteur {getattr(fn, '__name__', fn)}: {e}")
+        for name, (kind, help, samples) in families.items():
+            yield name, kind, help, samples
+
+    def render(self):
+        """Format texte d'exposition Prometheus (version 0.0.4)"""
+        lines = []
+        for name, kind, help, samples in self.collect():
+            lines.append(f"# HELP {name} {_escape(help)}")
+            lines.append(f"# TYPE {name} {kind}")
+            for sample_name, labels, value in samples:
+                if value is None:
+                    continue
+                lines.append(f"{sample_name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+PROBE_PHASE_SECONDS = registry.histogram(
+    "downdetector_probe_phase_seconds", "Durée des phases des probes (dns, connect, ttfb, total)", ["phase"])
+PROBE_RESULTS = registry.counter(
+    "downdetector_probe_results_total", "Résultats des probes par statut", ["status"])
+SWEEP_SECONDS = registry.histogram(
+    "downdetector_sweep_duration_seconds", "Durée des sweeps complets",
+    buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300))
+STORAGE_SECONDS = registry.histogram(
+    "downdetector_storage_request_seconds", "Durée des appels au stockage par table et verbe",
+    ["backend", "table", "verb"])
+STORAGE_ERRORS = registry.counter(
+    "downdetector_storage_errors_total", "Appels au stockage en erreur", ["backend", "table", "verb"])
+LOOP_LAG_SECONDS = registry.histogram(
+    "downdetector_event_loop_lag_seconds", "Retard de réveil de la boucle asyncio",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5))
+
+
+class timed:
+    """with timed(histogram, **labels): observe la durée du bloc"""
+
+    def __init__(self, histogram, **labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+async def monitor_loop_lag(interval=1.0):
+    """Tâche de fond: mesure le retard de la boucle d'événements courante"""
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        LOOP_LAG_SECONDS.observe(max(0.0, loop.time() - start - interval))
+
+
+class SamplingProfiler:
+    """Profileur par échantillonnage, activable à chaud
+
+    Un thread relève la pile de tous les threads toutes les interval
+    secondes (sys._current_frames) et compte les piles identiques. Rien
+    n'est instrumenté: arrêté, il ne coûte rien; actif, le coût dépend de
+    interval. Il s'arrête seul après max_duration secondes. Le rapport
+    est au format "collapsed" (une pile par ligne, frames séparées par
+    ';', puis le nombre d'échantillons), lu par flamegraph.pl ou speedscope.
+    """
+
+    def __init__(self, interval=PROFILER_INTERVAL, max_duration=PROFILER_MAX_DURATION, max_depth=64):
+        self.interval = interval
+        self.max_duration = max_duration
+        self.max_depth = max_depth
+        self._stacks = collections.Counter()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.samples = 0
+        self.started_at = None
+        self.stopped_at = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, duration=None):
+        """Démarre une nouvelle capture (les échantillons précédents sont effacés)"""
+        if self.running:
+            return False
+        with self._lock:
+            self._stacks.clear()
+            self.samples = 0
+        duration = min(duration or self.max_duration, self.max_duration)
+        self._stop.clear()
+        self.started_at = time.time()
+        self.stopped_at = None
+        self._thread = threading.Thread(target=self._run, args=(duration,), name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        if not self.running:
+            return False
+        self._stop.set()
+        self._thread.join()
+        return True
+
+    def _run(self, duration):
+        own_id = threading.get_ident()
+        deadline = time.monotonic() + duration
+        while not self._stop.wait(self.interval) and time.monotonic() < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            stacks = []
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                frames = []
+                while frame is not None and len(frames) < self.max_depth:
+                    code = frame.f_code
+                    frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                frames.append(names.get(thread_id, str(thread_id)))
+                stacks.append(";".join(reversed(frames)))
+            with self._lock:
+                self._stacks.update(stacks)
+                self.samples += 1
+        self.stopped_at = time.time()
+
+    def collapsed(self):
+        with self._lock:
+            return "".join(f"{stack} {count}\n" for stack, count in self._stacks.most_common())
+
+    def top(self, limit=10):
+        """Fonctions où les threads passent le plus de temps (frame du haut de pile)"""
+        leaves = collections.Counter()
+        with self._lock:
+            for stack, count in self._stacks.items():
+                leaves[stack.rsplit(";", 1)[-1]] += count
+            total = sum(self._stacks.values())
+        return [(leaf, count, round(count / total * 100, 1)) for leaf, count in leaves.most_common(limit)] if total else []
+
+    def stats(self):
+        end = self.stopped_at or time.time()
+        return {
+            "running": self.running,
+            "samples": self.samples,
+            "interval": self.interval,
+            "duration": round(end - self.started_at, 1) if self.started_at else 0,
+        }
+
+
+profiler = SamplingProfiler()
@@ -0,0 +1,97 @@
+"""Index mémoire des noms de services pour l'autocomplete des slash commands"""
+import bisect
+
+
+class _UserNames:
+    """Noms d'un utilisateur: liste triée (préfixes) + trigrammes (sous-chaînes)"""
+
+    def __init__(self):
+        self.sorted = []
+        self.trigrams = {}
+
+    @staticmethod
+    def _grams(key):
+        return {key[i:i + 3] for i in range(len(key) - 2)}
+
+    def add(self, name):
+        entry = (name.lower(), name)
+        i = bisect.bisect_left(self.sorted, entry)
+        if i < len(self.sorted) and self.sorted[i] == entry:
+            return
+        self.sorted.insert(i, entry)
+        for gram in self._grams(entry[0]):
+            self.trigrams.setdefault(gram, set()).add(name)
+
+    def remove(self, name):
+        entry = (name.lower(), name)
+        i = bisect.bisect_left(self.sorted, entry)
+        if i < len(self.sorted) and self.sorted[i] == entry:
+            del self.sorted[i]
+        for gram in self._grams(entry[0]):
+            names = self.trigrams.get(gram)
+            if names is not None:
+                names.discard(name)
+                if not names:
+                    del self.trigrams[gram]
+
+    def search(self, current, limit):
+        key = current.lower()
+        # D'abord les noms qui commencent par la saisie (bisect sur la liste triée)
+        results = []
+        i = bisect.bisect_left(self.sorted, (key,))
+        while i < len(self.sorted) and self.sorted[i][0].startswith(key) and len(results) < limit:
+            results.append(self.sorted[i][1])
+            i += 1
+        if len(results) >= limit:
+            return results
+        # Puis ceux qui la contiennent ailleurs
+        if len(key) >= 3:
+            candidates = None
+            for gram in self._grams(key):
+                names = self.trigrams.get(gram, set())
+                candidates = names if candidates is None else candidates & names
+                if not candidates:
+                    return results
+            others = sorted(n for n in candidates if key in n.lower())
+        else:
+            others = [name for lower, name in self.sorted if key in lower]
+        seen = set(results)
+        for name in others:
+            if len(results) >= limit:
+                break
+            if name not in seen and not name.lower().startswith(key):
+                results.append(name)
+        return results
+
+
+class NameIndex:
+    """Noms de services par propriétaire, maintenu à jour par le bot
+
+    Chargé en bloc à partir de la liste complète des services, puis mis à
+    jour à chaque ajout/suppression: une recherche ne fait aucun appel réseau.
+    """
+
+    def __init__(self):
+        self._users = {}
+        self.loaded = False
+
+    def load(self, services):
+        users = {}
+        for service in services:
+            users.setdefault(str(service["owner_id"]), _UserNames()).add(service["name"])
+        self._users = users
+        self.loaded = True
+
+    def add(self, owner_id, name):
+        self._users.setdefault(str(owner_id), _UserNames()).add(name)
+
+    def remove(self, owner_id, name):
+        names = self._users.get(str(owner_id))
+        if names is not None:
+            names.remove(name)
+
+    def search(self, owner_id, current, limit=25):
+        names = self._users.get(str(owner_id))
+        if names is None:
+            return []
+        return names.search(current, limit)
@@ -0,0 +1,521 @@
+"""Moteur de probes concurrent utilisé par check_services"""
+import asyncio
+import functools
+import math
+import socket
+import ssl
+import time
+from collections import deque
+from urllib.parse import urlsplit
+
+import requests
+
+from config import (
+    PROBE_CONCURRENCY, PROBE_PER_HOST, PROBE_TIMEOUT, DNS_CACHE_TTL, KEEPALIVE_TIMEOUT,
+    ADAPTIVE_TIMEOUT_MULTIPLIER, ADAPTIVE_TIMEOUT_MIN, ADAPTIVE_TIMEOUT_SAMPLES,
+    BREAKER_THRESHOLD, BREAKER_BASE_DELAY, BREAKER_MAX_DELAY, BREAKER_PROBE_TIMEOUT, PROBE_MAX_BYTES,
+)
+from metrics import PROBE_PHASE_SECONDS, PROBE_RESULTS, SWEEP_SECONDS
+
+# Importé au premier ProbeEngine: les workers web (probe_once) n'en ont pas besoin
+aiohttp = None
+
+
+def _load_aiohttp():
+    global aiohttp
+    if aiohttp is None:
+        import aiohttp as module
+        aiohttp = module
+    return aiohttp
+
+
+def _phase_trace_config():
+    """Hooks aiohttp qui chronomètrent chaque phase d'une requête"""
+    trace_config = _load_aiohttp().TraceConfig()
+
+    def mark(name):
+        async def hook(session, ctx, params):
+            timings = ctx.trace_request_ctx
+            if timings is not None:
+                timings.setdefault(name, time.perf_counter())
+        return hook
+
+    async def reused(session, ctx, params):
+        if ctx.trace_request_ctx is not None:
+            ctx.trace_request_ctx["reused"] = True
+
+    trace_config.on_dns_resolvehost_start.append(mark("dns_start"))
+    trace_config.on_dns_resolvehost_end.append(mark("dns_end"))
+    trace_config.on_connection_create_start.append(mark("connect_start"))
+    trace_config.on_connection_create_end.append(mark("connect_end"))
+    trace_config.on_connection_reuseconn.append(reused)
+    trace_config.on_request_headers_sent.append(mark("headers_sent"))
+    trace_config.on_request_end.append(mark("response_start"))
+    return trace_config
+
+
+def _phases(timings, start_time, end_time):
+    """Convertit les marqueurs de temps en durées (ms) par phase"""
+    def span(begin, end):
+        if begin in timings and end in timings:
+            return int((timings[end] - timings[begin]) * 1000)
+        return None
+
+    dns_ms = span("dns_start", "dns_end")
+    connect_ms = span("connect_start", "connect_end")
+    if connect_ms is not None and dns_ms is not None:
+        # La résolution DNS a lieu pendant la création de la connexion
+        connect_ms -= dns_ms
+    return {
+        "dns_ms": dns_ms,
+        # aiohttp n'expose pas de hook séparé pour le handshake TLS: il est
+        # inclus dans connect_ms pour les URLs https. Seul le mode "tls" le mesure.
+        "tls_ms": span("connect_end", "tls_end"),
+        "connect_ms": connect_ms,
+        "ttfb_ms": span("headers_sent", "response_start"),
+        "total_ms": int((end_time - start_time) * 1000),
+        "reused": timings.get("reused", False),
+    }
+
+
+def _record(phases, status):
+    for phase in ("dns_ms", "connect_ms", "ttfb_ms", "total_ms"):
+        if phases.get(phase) is not None:
+            PROBE_PHASE_SECONDS.observe(phases[phase] / 1000, phase=phase[:-3])
+    PROBE_RESULTS.inc(status=status)
+
+
+# get: GET sans lire le corps (ou jusqu'à PROBE_MAX_BYTES pour chercher le mot-clé)
+# head: HEAD; tcp: simple connexion TCP; tls: connexion TCP + handshake TLS
+PROBE_MODES = ("get", "head", "tcp", "tls")
+DEFAULT_ACCEPTED_STATUS = "200-399"
+
+
+def _split(url):
+    """URL d'un service, "host:port" accepté pour les modes tcp/tls"""
+    return urlsplit(url if "://" in url else f"tcp://{url}")
+
+
+def _host(url):
+    return (_split(url).hostname or "").lower()
+
+
+@functools.lru_cache(maxsize=1024)
+def parse_status_spec(spec):
+    """"200-299,301" -> ((200, 299), (301, 301)); ValueError si invalide"""
+    ranges = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        low, _, high = part.partition("-")
+        try:
+            low = int(low)
+            high = int(high) if high else low
+        except ValueError:
+            raise ValueError(f"statut invalide: {part}") from None
+        if not 100 <= low <= high <= 599:
+            raise ValueError(f"plage de statuts invalide: {part}")
+        ranges.append((low, high))
+    if not ranges:
+        raise ValueError("aucun statut accepté")
+    return tuple(ranges)
+
+
+def status_accepted(code, spec=None):
+    try:
+        ranges = parse_status_spec(spec or DEFAULT_ACCEPTED_STATUS)
+    except ValueError:
+        ranges = parse_status_spec(DEFAULT_ACCEPTED_STATUS)
+    return any(low <= code <= high for low, high in ranges)
+
+
+def _endpoint(service):
+    """(hôte, port) d'un service tcp/tls; ValueError sans hôte"""
+    parts = _split(service["url"])
+    if not parts.hostname:
+        # getaddrinfo(None) résoudrait localhost: le service serait vu en ligne
+        raise ValueError(f"hôte manquant dans l'url: {service['url']}")
+    return parts.hostname, _default_port(service, parts)
+
+
+def validate_probe_settings(probe_mode=None, accepted_status=None, keyword=None, url=None):
+    """Vérifie les réglages de probe d'un service (ValueError si invalides)
+
+    url: vérifiée seulement si fournie (les modes tcp/tls exigent un hôte)
+    """
+    if probe_mode is not None and probe_mode not in PROBE_MODES:
+        raise ValueError(f"mode inconnu: {probe_mode} ({', '.join(PROBE_MODES)})")
+    if url is not None and probe_mode in ("tcp", "tls"):
+        _endpoint({"url": url, "probe_mode": probe_mode})
+    if accepted_status:
+        parse_status_spec(accepted_status)
+    if keyword and (probe_mode or "get") != "get":
+        raise ValueError("le mot-clé n'est vérifié qu'en mode get")
+
+
+class _KeywordScanner:
+    """Cherche un mot-clé dans un corps lu par morceaux"""
+
+    def __init__(self, keyword):
+        self.needle = keyword.encode()
+        self.tail = b""
+
+    def feed(self, chunk):
+        # On garde la fin du morceau précédent pour un mot coupé en deux
+        window = self.tail + chunk
+        if self.needle in window:
+            return True
+        self.tail = window[-(len(self.needle) - 1):] if len(self.needle) > 1 else b""
+        return False
+
+
+async def _find_keyword(resp, keyword, max_bytes):
+    """Lit le corps jusqu'à trouver keyword, sans dépasser max_bytes"""
+    scanner = _KeywordScanner(keyword)
+    read = 0
+    while read < max_bytes:
+        chunk = await resp.content.read(min(8192, max_bytes - read))
+        if not chunk:
+            return False
+        read += len(chunk)
+        if scanner.feed(chunk):
+            return True
+    return False
+
+
+def _default_port(service, parts):
+    return parts.port or (443 if parts.scheme in ("https", "tls") or service.get("probe_mode") == "tls" else 80)
+
+
+def probe_once(service, http, timeout):
+    """Probe synchrone (requests), mêmes règles que ProbeEngine; retourne (status, latency_ms)
+
+    Utilisée par les pings manuels de l'API web.
+    """
+    mode = service.get("probe_mode") or "get"
+    start_time = time.perf_counter()
+    try:
+        if mode in ("tcp", "tls"):
+            host, port = _endpoint(service)
+            with socket.create_connection((host, port), timeout=timeout) as sock:
+                if mode == "tls":
+                    ssl.create_default_context().wrap_socket(sock, server_hostname=host).close()
+            status = "online"
+        else:
+            request = http.head if mode == "head" else http.get
+            with request(service["url"], timeout=timeout, allow_redirects=False, stream=True) as resp:
+                online = status_accepted(resp.status_code, service.get("accepted_status"))
+                if online and mode == "get" and service.get("keyword"):
+                    scanner = _KeywordScanner(service["keyword"])
+                    online, read = False, 0
+                    for chunk in resp.iter_content(8192):
+                        read += len(chunk)
+                        if scanner.feed(chunk):
+                            online = True
+                            break
+                        if read >= PROBE_MAX_BYTES:
+                            break
+            status = "online" if online else "down"
+    except (requests.RequestException, OSError, ValueError):
+        status = "down"
+    return status, int((time.perf_counter() - start_time) * 1000)
+
+
+class AdaptiveTimeouts:
+    """Timeout propre à chaque service, tiré de ses latences récentes
+
+    timeout = p99 des samples dernières durées × multiplier, borné entre
+    minimum et maximum. Sans historique suffisant, ou juste après un
+    timeout, le service reprend le timeout maximal: un service qui ralentit
+    n'est pas déclaré down à cause d'un timeout trop serré.
+    """
+
+    def __init__(self, maximum=PROBE_TIMEOUT, minimum=ADAPTIVE_TIMEOUT_MIN,
+                 multiplier=ADAPTIVE_TIMEOUT_MULTIPLIER, samples=ADAPTIVE_TIMEOUT_SAMPLES, min_samples=5):
+        self.maximum = maximum
+        self.minimum = min(minimum, maximum)
+        self.multiplier = multiplier
+        self.samples = samples
+        self.min_samples = min_samples
+        self._latencies = {}
+        self._escalated = set()
+
+    def timeout_for(self, service_id):
+        latencies = self._latencies.get(service_id)
+        if service_id in self._escalated or latencies is None or len(latencies) < self.min_samples:
+            return self.maximum
+        ordered = sorted(latencies)
+        p99 = ordered[math.ceil(0.99 * len(ordered)) - 1]
+        return min(self.maximum, max(self.minimum, p99 * self.multiplier))
+
+    def record(self, service_id, seconds):
+        latencies = self._latencies.get(service_id)
+        if latencies is None:
+            latencies = self._latencies[service_id] = deque(maxlen=self.samples)
+        latencies.append(seconds)
+        self._escalated.discard(service_id)
+
+    def timed_out(self, service_id):
+        self._escalated.add(service_id)
+
+    def prune(self, service_ids):
+        """Oublie les services qui ne sont plus vérifiés"""
+        for service_id in [s for s in self._latencies if s not in service_ids]:
+            del self._latencies[service_id]
+        self._escalated &= set(service_ids)
+
+
+class CircuitBreaker:
+    """Disjoncteur par hôte pour les cibles injoignables
+
+    Après threshold échecs réseau consécutifs (timeout, connexion refusée,
+    DNS), l'hôte est "ouvert": ses probes sont court-circuitées, sans
+    réseau, pendant base_delay secondes, doublées à chaque réouverture
+    (jusqu'à max_delay). Ensuite une seule probe "half-open", avec un
+    timeout court, décide: succès, l'hôte est refermé; échec, il repart
+    pour une pause plus longue. Une réponse HTTP, même en erreur, prouve
+    que l'hôte répond et compte comme un succès.
+    """
+
+    def __init__(self, threshold=BREAKER_THRESHOLD, base_delay=BREAKER_BASE_DELAY, max_delay=BREAKER_MAX_DELAY,
+                 probe_timeout=BREAKER_PROBE_TIMEOUT, clock=time.monotonic):
+        self.threshold = max(1, threshold)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.probe_timeout = probe_timeout
+        self.clock = clock
+        self._hosts = {}
+        self.short_circuited = 0
+
+    def is_open(self, host):
+        """True si les probes de l'hôte doivent être court-circuitées (sans rien changer)"""
+        state = self._hosts.get(host)
+        return state is not None and state["until"] is not None and (state["probing"] or self.clock() < state["until"])
+
+    def allow(self, host):
+        """"closed" (probe normale), "half_open" (essai unique) ou None (court-circuit)"""
+        state = self._hosts.get(host)
+        if state is None or state["until"] is None:
+            return "closed"
+        if state["probing"] or self.clock() < state["until"]:
+            self.short_circuited += 1
+            return None
+        state["probing"] = True
+        return "half_open"
+
+    def success(self, host):
+        self._hosts.pop(host, None)
+
+    def failure(self, host):
+        state = self._hosts.get(host)
+        if state is None:
+            state = self._hosts[host] = {"failures": 0, "opens": 0, "until": None, "probing": False}
+        state["failures"] += 1
+        if state["probing"] or (state["until"] is None and state["failures"] >= self.threshold):
+            state["opens"] += 1
+            state["until"] = self.clock() + min(self.max_delay, self.base_delay * 2 ** (state["opens"] - 1))
+            state["probing"] = False
+
+    def release(self, host):
+        """Fin d'une probe half-open sans verdict: le prochain check réessaie"""
+        state = self._hosts.get(host)
+        if state is not None:
+            state["probing"] = False
+
+    def open_hosts(self):
+        return sum(1 for state in self._hosts.values() if state["until"] is not None)
+
+    def prune(self, hosts):
+        """Oublie les hôtes qu'aucun service vérifié ne vise plus"""
+        for host in [h for h in self._hosts if h not in hosts]:
+            del self._hosts[host]
+
+
+class ProbeEngine:
+    """Lance les probes en parallèle avec une limite globale et une limite par hôte"""
+
+    def __init__(self, concurrency=PROBE_CONCURRENCY, per_host=PROBE_PER_HOST, timeout=PROBE_TIMEOUT):
+        _load_aiohttp()
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.timeout = timeout
+        self.timeouts = AdaptiveTimeouts(maximum=timeout)
+        self.breaker = CircuitBreaker()
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._host_semaphores = {}
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.last_sweep = None
+        self.session = None
+
+    async def start(self):
+        """Ouvre la session partagée (une seule par processus)"""
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.concurrency,
+                limit_per_host=self.per_host,
+                ttl_dns_cache=DNS_CACHE_TTL,
+                keepalive_timeout=KEEPALIVE_TIMEOUT,
+                enable_cleanup_closed=True,
+            )
+            self.session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                trace_configs=[_phase_trace_config()],
+            )
+        return self.session
+
+    async def close(self):
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+        self.session = None
+
+    def prune(self, services):
+        """Oublie les services qui ne sont plus vérifiés et les hôtes qu'aucun ne vise"""
+        self.timeouts.prune({s["id"] for s in services})
+        hosts = {_host(s["url"]) for s in services}
+        self.breaker.prune(hosts)
+        # Une probe en cours garde sa référence au sémaphore: seul le dictionnaire l'oublie
+        for host in [h for h in self._host_semaphores if h not in hosts]:
+            del self._host_semaphores[host]
+
+    def _host_semaphore(self, host):
+        sem = self._host_semaphores.get(host)
+        if sem is None:
+            sem = self._host_semaphores[host] = asyncio.Semaphore(self.per_host)
+        return sem
+
+    @staticmethod
+    def _skipped(service):
+        PROBE_RESULTS.inc(status="skipped")
+        return {"service": service, "status": "down", "latency_ms": None, "phases": {},
+                "error": "hôte injoignable (disjoncteur ouvert)", "skipped": True}
+
+    async def probe(self, service):
+        """Vérifie un service et retourne le résultat (status, latency_ms, phases, error)
+
+        latency_ms est le temps jusqu'au premier octet de la réponse: le DNS
+        et l'ouverture de connexion sont comptés à part dans phases. Si le
+        disjoncteur de l'hôte est ouvert, aucune requête n'est faite et le
+        résultat est "down" avec skipped=True.
+        """
+        session = await self.start()
+        host = _host(service["url"])
+        if self.breaker.is_open(host):
+            self.breaker.short_circuited += 1
+            return self._skipped(service)
+        # Le slot par hôte est pris avant le slot global: un hôte lent
+        # ne bloque que ses propres probes, pas celles des autres.
+        async with self._host_semaphore(host):
+            async with self._semaphore:
+                # Le disjoncteur a pu s'ouvrir pendant l'attente du slot
+                breaker_state = self.breaker.allow(host)
+                if breaker_state is None:
+                    return self._skipped(service)
+                timeout = self.timeouts.timeout_for(service["id"])
+                if breaker_state == "half_open":
+                    timeout = min(timeout, self.breaker.probe_timeout)
+                self.in_flight += 1
+                self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+                timings = {}
+                start_time = time.perf_counter()
+                try:
+                    if (service.get("probe_mode") or "get") in ("tcp", "tls"):
+                        await asyncio.wait_for(self._connect(service, timings), timeout)
+                        status = "online"
+                    else:
+                        status = await self._http(session, service, timings, timeout)
+                    phases = _phases(timings, start_time, time.perf_counter())
+                    latency_ms = phases["ttfb_ms"] if phases["ttfb_ms"] is not None else phases["total_ms"]
+                    self.breaker.success(host)
+                    self.timeouts.record(service["id"], phases["total_ms"] / 1000)
+                    _record(phases, status)
+                    return {"service": service, "status": status, "latency_ms": latency_ms, "phases": phases, "error": None}
+                except Exception as e:
+                    phases = _phases(timings, start_time, time.perf_counter())
+                    if isinstance(e, asyncio.TimeoutError):
+                        self.timeouts.timed_out(service["id"])
+                        self.breaker.failure(host)
+                    elif isinstance(e, (aiohttp.ClientSSLError, ssl.SSLError)):
+                        # Certificat invalide: l'hôte répond, le service est down
+                        self.breaker.success(host)
+                    elif isinstance(e, (aiohttp.ClientConnectionError, OSError)):
+                        self.breaker.failure(host)
+                    _record(phases, "down")
+                    return {"service": service, "status": "down", "latency_ms": phases["total_ms"], "phases": phases,
+                            "error": str(e) or type(e).__name__}
+                finally:
+                    self.in_flight -= 1
+                    # Probe half-open sans verdict (erreur inattendue, annulation):
+                    # sans release, l'hôte resterait court-circuité pour toujours
+                    if breaker_state == "half_open":
+                        self.breaker.release(host)
+
+    async def _http(self, session, service, timings, timeout):
+        """Probe HEAD ou GET; les redirections ne sont pas suivies"""
+        mode = service.get("probe_mode") or "get"
+        keyword = service.get("keyword") if mode == "get" else None
+        request = session.head if mode == "head" else session.get
+        async with request(service["url"], trace_request_ctx=timings, allow_redirects=False,
+                           timeout=aiohttp.ClientTimeout(total=timeout)) as resp:
+            online = status_accepted(resp.status, service.get("accepted_status"))
+            if online and keyword:
+                online = await _find_keyword(resp, keyword, PROBE_MAX_BYTES)
+            # Sans mot-clé, le corps n'est jamais lu: la connexion est fermée à la sortie
+            return "online" if online else "down"
+
+    @staticmethod
+    async def _connect(service, timings):
+        """Probe tcp (connexion seule) ou tls (connexion + handshake)"""
+        host, port = _endpoint(service)
+        loop = asyncio.get_running_loop()
+        # Même découpage que les hooks aiohttp: le DNS est compté dans la connexion
+        timings["connect_start"] = timings["dns_start"] = time.perf_counter()
+        infos = await loop.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        timings["dns_end"] = time.perf_counter()
+        address = infos[0][4]
+        reader, writer = await asyncio.open_connection(address[0], address[1])
+        timings["connect_end"] = time.perf_counter()
+        try:
+            if service.get("probe_mode") == "tls":
+                await writer.start_tls(ssl.create_default_context(), server_hostname=host)
+                timings["tls_end"] = time.perf_counter()
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+
+    async def sweep(self, services, on_result=None, probe=None):
+        """Vérifie tous les services en parallèle et retourne les stats du sweep
+
+        probe: coroutine à utiliser à la place de self.probe (quorum des points de vue)
+        """
+        self.peak_in_flight = self.in_flight
+        probe = probe or self.probe
+
+        async def run(service):
+            result = await probe(service)
+            if on_result is not None:
+                try:
+                    await on_result(result)
+                except Exception as e:
+                    print(f"⚠️ Erreur résultat {service.get('name')}: {e}")
+            return result
+
+        start_time = time.perf_counter()
+        results = await asyncio.gather(*(run(s) for s in services))
+        SWEEP_SECONDS.observe(time.perf_counter() - start_time)
+        self.last_sweep = {
+            "services": len(services),
+            "online": sum(1 for r in results if r["status"] == "online"),
+            "down": sum(1 for r in results if r["status"] == "down"),
+            "skipped": sum(1 for r in results if r.get("skipped")),
+            "duration_ms": int((time.perf_counter() - start_time) * 1000),
+            "peak_in_flight": self.peak_in_flight,
+            "concurrency": self.concurrency,
+            "per_host": self.per_host,
+        }
+        return self.last_sweep
@@ -0,0 +1,151 @@
+"""Rétention: résumé des vieux pings en rollups, puis suppression par lots
+
+Les pings bruts sont gardés PING_RETENTION_DAYS jours. Les checkers
+alimentent déjà les rollups en continu; un ping plus ancien dont la
+minute n'a aucun rollup 1m (pings d'avant les rollups, pings manuels du
+dashboard) y est d'abord agrégé, puis supprimé. Les rollups 1m et 1h ont
+leur propre durée de vie, les rollups 1d sont gardés.
+
+Chaque lot tient en une requête courte (RETENTION_BATCH_SIZE lignes) et
+est suivi d'une pause: les écritures des checkers passent entre deux
+lots, aucun verrou n'est gardé longtemps.
+
+    python retention.py    # une passe, affiche le rapport
+"""
+import json
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from config import (
+    PING_RETENTION_DAYS, ROLLUP_1M_RETENTION_DAYS, ROLLUP_1H_RETENTION_DAYS,
+    RETENTION_BATCH_SIZE, RETENTION_BATCH_PAUSE,
+)
+from metrics import registry
+from rollups import RollupAggregator, bucket_start
+from storage import get_storage
+
+# En-tête d'une ligne PostgreSQL (tuple + pointeur de ligne), pour l'estimation
+ROW_OVERHEAD = 28
+# Un passage horaire supprime environ 60 rollups 1m par service
+ROLLUPS_PER_SERVICE = 60
+
+RETENTION_ROWS = registry.counter(
+    "downdetector_retention_deleted_total", "Lignes supprimées par la rétention", ["table"])
+RETENTION_SUMMARIZED = registry.counter(
+    "downdetector_retention_summarized_total", "Pings agrégés en rollups avant suppression")
+
+
+def row_bytes(row):
+    """Taille approximative d'une ligne: en-tête + valeurs"""
+    size = ROW_OVERHEAD
+    for value in row.values():
+        if value is None:
+            continue
+        size += 8 if isinstance(value, (int, float)) else len(str(value).encode())
+    return size
+
+
+class RetentionJob:
+    """Une passe de rétention à la fois; stop() l'interrompt entre deux lots"""
+
+    def __init__(self, storage=None, ping_days=PING_RETENTION_DAYS, batch_size=RETENTION_BATCH_SIZE,
+                 pause=RETENTION_BATCH_PAUSE, rollup_days=None):
+        self.storage = storage or get_storage()
+        self.ping_days = ping_days
+        self.batch_size = batch_size
+        self.pause = pause
+        rollup_days = rollup_days or {"1m": ROLLUP_1M_RETENTION_DAYS, "1h": ROLLUP_1H_RETENTION_DAYS}
+        if ping_days:
+            # Les rollups 1m servent à savoir si un ping est déjà agrégé:
+            # ils doivent vivre au moins aussi longtemps que les pings
+            rollup_days = {r: days and max(days, ping_days) for r, days in rollup_days.items()}
+        self.rollup_days = rollup_days
+        self._stop = threading.Event()
+        self.last_report = None
+
+    def stop(self):
+        self._stop.set()
+
+    def run(self, now=None):
+        """Passe complète (bloquante); retourne le rapport"""
+        self._stop.clear()
+        now = now or datetime.now(timezone.utc)
+        started = time.monotonic()
+        report = {"pings_deleted": 0, "pings_summarized": 0, "rollups_deleted": 0,
+                  "bytes_estimated": 0, "bytes_freed": None, "batches": 0}
+        size_before = self.storage.storage_bytes()
+        if self.ping_days:
+            self._prune_pings(now - timedelta(days=self.ping_days), report)
+        self._prune_rollups(now, report)
+        size_after = self.storage.storage_bytes()
+        if size_before is not None and size_after is not None:
+            report["bytes_freed"] = max(size_before - size_after, 0)
+        report["duration_s"] = round(time.monotonic() - started, 2)
+        report["interrupted"] = self._stop.is_set()
+        self.last_report = report
+        freed = report["bytes_freed"] if report["bytes_freed"] is not None else report["bytes_estimated"]
+        print(
+            f"🧹 Rétention: {report['pings_deleted']} pings supprimés ({report['pings_summarized']} agrégés), "
+            f"{report['rollups_deleted']} rollups, ~{freed / 1e6:.1f} Mo libérés en {report['duration_s']}s"
+        )
+        return report
+
+    def _wait(self):
+        """Pause entre deux lots; True si la passe doit s'arrêter"""
+        return self._stop.wait(self.pause)
+
+    def _prune_pings(self, cutoff, report):
+        while not self._stop.is_set():
+            rows = self.storage.old_pings(cutoff, self.batch_size)
+            if not rows:
+                return
+            summarized = self._summarize(rows)
+            deleted = self.storage.delete_pings(rows[-1]["id"], cutoff)
+            report["pings_summarized"] += summarized
+            report["pings_deleted"] += deleted
+            report["bytes_estimated"] += sum(row_bytes(row) for row in rows)
+            report["batches"] += 1
+            RETENTION_SUMMARIZED.inc(summarized)
+            RETENTION_ROWS.inc(deleted, table="pings")
+            if len(rows) < self.batch_size or self._wait():
+                return
+
+    def _summarize(self, rows):
+        """Agrège les pings dont la minute n'a pas encore de rollup 1m"""
+        keyed = [((row["service_id"], bucket_start(row["created_at"], "1m")), row)
+                 for row in rows if row["service_id"] is not None]
+        if not keyed:
+            return 0
+        minutes = [minute for (_, minute), _ in keyed]
+        covered = self.storage.rollup_buckets({key[0] for key, _ in keyed}, "1m", min(minutes), max(minutes))
+        aggregator = RollupAggregator()
+        summarized = 0
+        for key, row in keyed:
+            if key not in covered:
+                aggregator.add(row["service_id"], row["created_at"], row["status"], row["latency_ms"])
+                summarized += 1
+        # Avant la suppression: si elle échoue, la minute est couverte au prochain passage
+        aggregator.flush(self.storage)
+        return summarized
+
+    def _prune_rollups(self, now, report):
+        service_ids = [service["id"] for service in self.storage.list_services()]
+        per_batch = max(1, self.batch_size // ROLLUPS_PER_SERVICE)
+        for resolution, days in self.rollup_days.items():
+            if not days:
+                continue
+            cutoff = now - timedelta(days=days)
+            for i in range(0, len(service_ids), per_batch):
+                if self._stop.is_set():
+                    return
+                deleted = self.storage.delete_rollups(service_ids[i:i + per_batch], resolution, cutoff)
+                report["rollups_deleted"] += deleted
+                report["batches"] += 1
+                RETENTION_ROWS.inc(deleted, table="ping_rollups")
+                if deleted and self._wait():
+                    return
+
+
+if __name__ == "__main__":
+    print(json.dumps(RetentionJob().run(), indent=2))
@@ -0,0 +1,206 @@
+"""Derniers résultats de chaque service, en mémoire, dans des tableaux compacts
+
+Le checker y écrit chaque résultat; /api/logs et /graph les lisent sans
+passer par le stockage quand le checker tourne dans le même processus.
+Un service occupe un peu plus de 1 Ko pour 100 résultats: horodatages en
+array('d'), latences en array('I'), statuts dans un bitset.
+"""
+import threading
+from array import array
+from datetime import datetime, timezone
+
+from config import RECENT_RESULTS_SIZE
+from metrics import registry
+
+# Latence inconnue (échec sans mesure)
+NO_LATENCY = 0xFFFFFFFF
+
+
+def _epoch(created_at):
+    if isinstance(created_at, (int, float)):
+        return float(created_at)
+    value = datetime.fromisoformat(created_at.replace("Z", "+00:00"))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+class RingBuffer:
+    """Les capacity derniers résultats d'un service, avec stats glissantes
+
+    Moyenne et uptime sont tenus à jour à chaque ajout. Min et max aussi,
+    sauf quand la valeur qui sort du buffer était l'extrême: ils sont alors
+    recalculés à la prochaine lecture. Comme pour les rollups, les stats
+    de latence ne portent que sur les checks réussis.
+    """
+
+    __slots__ = ("capacity", "timestamps", "latencies", "online", "start", "size",
+                 "up", "latency_sum", "latency_min", "latency_max", "_dirty", "seeded")
+
+    def __init__(self, capacity=RECENT_RESULTS_SIZE):
+        self.capacity = capacity
+        # Tableaux alloués une fois pour toutes: la mémoire ne grandit pas
+        self.timestamps = array("d", [0.0]) * capacity
+        self.latencies = array("I", [0]) * capacity
+        self.online = bytearray((capacity + 7) // 8)
+        self.start = 0
+        self.size = 0
+        self.up = 0
+        self.latency_sum = 0
+        self.latency_min = None
+        self.latency_max = None
+        self._dirty = False
+        self.seeded = False
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def nbytes(self):
+        return (self.timestamps.itemsize + self.latencies.itemsize) * self.capacity + len(self.online)
+
+    def _is_online(self, i):
+        return bool(self.online[i >> 3] & (1 << (i & 7)))
+
+    def _set_online(self, i, value):
+        if value:
+            self.online[i >> 3] |= 1 << (i & 7)
+        else:
+            self.online[i >> 3] &= ~(1 << (i & 7)) & 0xFF
+
+    def append(self, timestamp, online, latency_ms):
+        if self.size == self.capacity:
+            i = self.start
+            self.start = (self.start + 1) % self.capacity
+            if self._is_online(i):
+                old = self.latencies[i]
+                self.up -= 1
+                self.latency_sum -= old
+                if old == self.latency_min or old == self.latency_max:
+                    self._dirty = True
+        else:
+            i = (self.start + self.size) % self.capacity
+            self.size += 1
+        latency = NO_LATENCY if latency_ms is None else min(max(int(latency_ms), 0), NO_LATENCY - 1)
+        self.timestamps[i] = _epoch(timestamp)
+        self.latencies[i] = latency
+        self._set_online(i, online)
+        if online:
+            self.up += 1
+            self.latency_sum += latency
+            if not self._dirty:
+                self.latency_min = latency if self.latency_min is None else min(self.latency_min, latency)
+                self.latency_max = latency if self.latency_max is None else max(self.latency_max, latency)
+
+    def _indexes(self):
+        return ((self.start + n) % self.capacity for n in range(self.size))
+
+    def entries(self):
+        """(horodatage, en ligne, latence) du plus ancien au plus récent"""
+        return [(self.timestamps[i], self._is_online(i),
+                 None if self.latencies[i] == NO_LATENCY else self.latencies[i]) for i in self._indexes()]
+
+    def rows(self, limit=None):
+        """Même forme que storage.get_pings(newest=True), colonnes utiles seulement"""
+        entries = self.entries()
+        if limit is not None:
+            entries = entries[-limit:]
+        return [{
+            "created_at": datetime.fromtimestamp(ts, timezone.utc).isoformat(timespec="microseconds"),
+            "status": "online" if online else "down",
+            "latency_ms": latency,
+        } for ts, online, latency in entries]
+
+    def seed(self, rows):
+        """Complète le début du buffer avec des pings plus anciens (lus dans le stockage)"""
+        entries = self.entries()
+        oldest = entries[0][0] if entries else float("inf")
+        older = [(_epoch(r["created_at"]), r["status"] == "online", r.get("latency_ms")) for r in rows]
+        entries = [e for e in older if e[0] < oldest] + entries
+        self.__init__(self.capacity)
+        for entry in entries[-self.capacity:]:
+            self.append(*entry)
+        self.seeded = True
+
+    def stats(self):
+        if self._dirty:
+            latencies = [self.latencies[i] for i in self._indexes() if self._is_online(i)]
+            self.latency_min = min(latencies, default=None)
+            self.latency_max = max(latencies, default=None)
+            self._dirty = False
+        return {
+            "count": self.size,
+            "uptime": round(self.up / self.size * 100, 2) if self.size else None,
+            "latency_avg": round(self.latency_sum / self.up) if self.up else None,
+            "latency_min": self.latency_min,
+            "latency_max": self.latency_max,
+        }
+
+
+class RecentResults:
+    """Un RingBuffer par service, partagé entre threads (bot, Flask)
+
+    Seul le checker crée des buffers: un service sans buffer n'est pas
+    vérifié dans ce processus et se lit dans le stockage.
+    """
+
+    def __init__(self, capacity=RECENT_RESULTS_SIZE):
+        self.capacity = capacity
+        self._buffers = {}
+        self._lock = threading.Lock()
+
+    def record(self, service_id, created_at, status, latency_ms, create=True):
+        with self._lock:
+            buffer = self._buffers.get(service_id)
+            if buffer is None:
+                if not create:
+                    return
+                buffer = self._buffers[service_id] = RingBuffer(self.capacity)
+            buffer.append(created_at, status == "online", latency_ms)
+
+    def snapshot(self, service_id, loader=None, limit=None):
+        """(rows, stats) du buffer, ou None si le service n'en a pas
+
+        Un buffer pas encore plein est d'abord complété une fois avec
+        loader() (pings du stockage, du plus ancien au plus récent).
+        """
+        with self._lock:
+            buffer = self._buffers.get(service_id)
+            if buffer is None:
+                return None
+            needs_seed = loader is not None and not buffer.seeded and len(buffer) < self.capacity
+        if needs_seed:
+            rows = loader()
+            with self._lock:
+                if self._buffers.get(service_id) is buffer and not buffer.seeded:
+                    buffer.seed(rows)
+        with self._lock:
+            return buffer.rows(limit), buffer.stats()
+
+    def forget(self, service_id):
+        with self._lock:
+            self._buffers.pop(service_id, None)
+
+    def prune(self, service_ids):
+        """Oublie les services qui ne sont plus vérifiés ici"""
+        with self._lock:
+            for service_id in [s for s in self._buffers if s not in service_ids]:
+                del self._buffers[service_id]
+
+    def stats(self):
+        with self._lock:
+            return {"services": len(self._buffers), "bytes": sum(b.nbytes for b in self._buffers.values())}
+
+
+recent = RecentResults()
+
+
+@registry.collector
+def _recent_metrics():
+    stats = recent.stats()
+    return [
+        ("downdetector_recent_buffers", "gauge", "Services avec un buffer de résultats en mémoire",
+         [({}, stats["services"])]),
+        ("downdetector_recent_buffer_bytes", "gauge", "Mémoire des buffers de résultats (tableaux)",
+         [({}, stats["bytes"])]),
+    ]
@@ -0,0 +1,177 @@
+"""Agrégats de pings par service: buckets 1 minute, 1 heure et 1 jour"""
+import math
+import threading
+from datetime import datetime, timezone
+
+from config import MAX_HISTORY_POINTS
+
+# Résolution -> taille du bucket en secondes, de la plus fine à la plus grossière
+RESOLUTIONS = {"1m": 60, "1h": 3600, "1d": 86400}
+
+SKETCH_ACCURACY = 0.02
+_GAMMA = (1 + SKETCH_ACCURACY) / (1 - SKETCH_ACCURACY)
+_LOG_GAMMA = math.log(_GAMMA)
+
+
+class LatencySketch:
+    """Histogramme logarithmique fusionnable (même principe que DDSketch)
+
+    Chaque latence tombe dans le bucket ceil(log_gamma(ms + 1)): les
+    quantiles sont exacts à SKETCH_ACCURACY près (en relatif), et deux
+    sketches se fusionnent en additionnant leurs compteurs.
+    """
+
+    def __init__(self, counts=None):
+        if isinstance(counts, LatencySketch):
+            counts = counts.counts
+        self.counts = {int(k): v for k, v in (counts or {}).items()}
+
+    def add(self, latency_ms, count=1):
+        index = math.ceil(math.log(max(latency_ms, 0) + 1) / _LOG_GAMMA)
+        self.counts[index] = self.counts.get(index, 0) + count
+
+    def merge(self, other):
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        return self
+
+    def quantile(self, q):
+        total = sum(self.counts.values())
+        if not total:
+            return None
+        rank = q * (total - 1)
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen > rank:
+                # Milieu (relatif) du bucket, ramené en millisecondes
+                return max(round(2 * _GAMMA ** index / (_GAMMA + 1) - 1), 0)
+        return None
+
+    def to_dict(self):
+        return {str(k): v for k, v in self.counts.items()}
+
+
+def bucket_start(timestamp, resolution):
+    """Début du bucket (ISO 8601 UTC) qui contient timestamp"""
+    if isinstance(timestamp, str):
+        timestamp = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    size = RESOLUTIONS[resolution]
+    epoch = int(timestamp.timestamp()) // size * size
+    return datetime.fromtimestamp(epoch, timezone.utc).isoformat(timespec="microseconds")
+
+
+def empty_rollup(service_id, resolution, start):
+    return {
+        "service_id": service_id,
+        "resolution": resolution,
+        "bucket_start": start,
+        "count": 0,
+        "failures": 0,
+        "latency_min": None,
+        "latency_max": None,
+        "latency_sum": 0,
+        "sketch": {},
+    }
+
+
+def merge_rollup(into, other):
+    """Fusionne other dans into (mêmes service/résolution/bucket)"""
+    into["count"] += other["count"]
+    into["failures"] += other["failures"]
+    into["latency_sum"] += other["latency_sum"]
+    for key, pick in (("latency_min", min), ("latency_max", max)):
+        values = [v for v in (into[key], other[key]) if v is not None]
+        into[key] = pick(values) if values else None
+    into["sketch"] = LatencySketch(into["sketch"]).merge(LatencySketch(other["sketch"])).to_dict()
+    return into
+
+
+def summarize(rollup):
+    """Ajoute moyenne, uptime et percentiles à une ligne de rollup"""
+    sketch = LatencySketch(rollup["sketch"])
+    successes = rollup["count"] - rollup["failures"]
+    return {
+        "bucket_start": rollup["bucket_start"],
+        "resolution": rollup["resolution"],
+        "count": rollup["count"],
+        "failures": rollup["failures"],
+        "uptime": round(successes / rollup["count"] * 100, 2) if rollup["count"] else None,
+        "latency_min": rollup["latency_min"],
+        "latency_max": rollup["latency_max"],
+        "latency_avg": round(rollup["latency_sum"] / successes) if successes else None,
+        "p50": sketch.quantile(0.50),
+        "p95": sketch.quantile(0.95),
+        "p99": sketch.quantile(0.99),
+    }
+
+
+def pick_resolution(window_seconds, max_points=MAX_HISTORY_POINTS):
+    """Résolution la plus fine dont le nombre de buckets tient dans max_points
+
+    30 jours -> 1h (720 lignes), 24h -> 1m (1440 lignes), 1 an -> 1d.
+    """
+    for resolution, size in RESOLUTIONS.items():
+        if window_seconds / size <= max_points:
+            return resolution
+    return "1d"
+
+
+class RollupAggregator:
+    """Accumule les résultats en mémoire et pousse des deltas vers le stockage
+
+    Chaque flush envoie ce qui a été accumulé depuis le flush précédent;
+    le stockage fusionne ces deltas avec les buckets existants, donc un
+    bucket peut être flushé plusieurs fois avant d'être complet.
+    """
+
+    def __init__(self):
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def add(self, service_id, timestamp, status, latency_ms):
+        with self._lock:
+            for resolution in RESOLUTIONS:
+                start = bucket_start(timestamp, resolution)
+                key = (service_id, resolution, start)
+                rollup = self._pending.get(key)
+                if rollup is None:
+                    rollup = self._pending[key] = empty_rollup(service_id, resolution, start)
+                    rollup["sketch"] = LatencySketch()
+                rollup["count"] += 1
+                if status != "online":
+                    # Les latences des échecs (timeouts...) ne sont pas comptées
+                    rollup["failures"] += 1
+                    continue
+                latency = latency_ms or 0
+                rollup["latency_sum"] += latency
+                rollup["latency_min"] = latency if rollup["latency_min"] is None else min(rollup["latency_min"], latency)
+                rollup["latency_max"] = latency if rollup["latency_max"] is None else max(rollup["latency_max"], latency)
+                rollup["sketch"].add(latency)
+
+    def pending(self):
+        return len(self._pending)
+
+    def flush(self, storage):
+        """Envoie les deltas accumulés; en cas d'erreur ils sont remis en attente"""
+        with self._lock:
+            rows, self._pending = list(self._pending.values()), {}
+        if not rows:
+            return 0
+        for row in rows:
+            row["sketch"] = row["sketch"].to_dict()
+        try:
+            storage.merge_rollups(rows)
+        except Exception:
+            with self._lock:
+                for row in rows:
+                    key = (row["service_id"], row["resolution"], row["bucket_start"])
+                    if key in self._pending:
+                        merge_rollup(self._pending[key], row)
+                    else:
+                        self._pending[key] = row
+                    self._pending[key]["sketch"] = LatencySketch(self._pending[key]["sketch"])
+            raise
+        return len(rows)
@@ -0,0 +1,125 @@
+"""Planificateur des checks: un intervalle par service, avec jitter"""
+import heapq
+import random
+import time
+
+from config import DEFAULT_CHECK_INTERVAL, SCHEDULER_JITTER
+
+MIN_CHECK_INTERVAL = 10
+MAX_CHECK_INTERVAL = 3600
+
+
+class CheckScheduler:
+    """Tas de (prochaine échéance, service_id)
+
+    Chaque service n'a qu'une échéance valide à la fois: les entrées
+    périmées du tas sont ignorées au moment du pop. Un service en retard
+    de plusieurs intervalles n'est vérifié qu'une fois (coalescing), puis
+    replanifié à partir de maintenant.
+    """
+
+    def __init__(self, default_interval=DEFAULT_CHECK_INTERVAL, jitter=SCHEDULER_JITTER, clock=time.monotonic):
+        self.default_interval = default_interval
+        self.jitter = jitter
+        self.clock = clock
+        self._heap = []
+        self._due = {}
+        self._services = {}
+        self._running = set()
+        self.coalesced = 0
+        self.last_lag_ms = 0
+        self.max_lag_ms = 0
+
+    def interval_for(self, service):
+        interval = service.get("check_interval") or self.default_interval
+        return min(max(int(interval), MIN_CHECK_INTERVAL), MAX_CHECK_INTERVAL)
+
+    def _push(self, service_id, due):
+        self._due[service_id] = due
+        heapq.heappush(self._heap, (due, service_id))
+        if len(self._heap) > 2 * len(self._due) + 64:
+            # Trop d'entrées périmées: on reconstruit le tas
+            self._heap = [(d, s) for s, d in self._due.items()]
+            heapq.heapify(self._heap)
+
+    def _jittered(self, interval):
+        return interval * (1 + random.uniform(-self.jitter, self.jitter))
+
+    def sync(self, services):
+        """Aligne le planning sur la liste des services en base"""
+        seen = set()
+        for service in services:
+            seen.add(service["id"])
+            self.sync_one(service)
+        for service_id in list(self._services):
+            if service_id not in seen:
+                self.remove(service_id)
+
+    def sync_one(self, service):
+        """Ajoute ou met à jour un seul service"""
+        old = self._services.get(service["id"])
+        self._services[service["id"]] = service
+        if old is None or self.interval_for(old) != self.interval_for(service):
+            # Première échéance répartie sur tout l'intervalle pour
+            # éviter que tous les services partent à la même seconde.
+            self._push(service["id"], self.clock() + random.uniform(0, self.interval_for(service)))
+
+    def remove(self, service_id):
+        self._services.pop(service_id, None)
+        self._due.pop(service_id, None)
+
+    def set_default_interval(self, interval):
+        """Change l'intervalle des services sans check_interval propre"""
+        now = self.clock()
+        self.default_interval = interval
+        for service_id, service in self._services.items():
+            if not service.get("check_interval"):
+                self._push(service_id, now + random.uniform(0, self.interval_for(service)))
+
+    def pop_due(self, limit=None):
+        """Retourne les services arrivés à échéance et planifie leur prochain check"""
+        now = self.clock()
+        due_services = []
+        while self._heap and self._heap[0][0] <= now:
+            if limit is not None and len(due_services) >= limit:
+                break
+            due, service_id = heapq.heappop(self._heap)
+            if self._due.get(service_id) != due:
+                continue  # entrée périmée (replanifiée ou supprimée)
+            service = self._services[service_id]
+            interval = self.interval_for(service)
+            lag = now - due
+            self.last_lag_ms = int(lag * 1000)
+            self.max_lag_ms = max(self.max_lag_ms, self.last_lag_ms)
+
+            next_due = due + self._jittered(interval)
+            if next_due <= now:
+                # En retard d'un intervalle ou plus: un seul check, pas de rattrapage
+                self.coalesced += 1
+                next_due = now + self._jittered(interval)
+            self._push(service_id, next_due)
+
+            if service_id in self._running:
+                # Le check précédent n'est pas fini: on ne l'empile pas
+                self.coalesced += 1
+                continue
+            self._running.add(service_id)
+            due_services.append(service)
+        return due_services
+
+    def done(self, service_id):
+        self._running.discard(service_id)
+
+    def stats(self):
+        now = self.clock()
+        overdue = sum(1 for service_id, due in self._due.items() if due <= now)
+        return {
+            "services": len(self._services),
+            "queue_depth": len(self._due),
+            "overdue": overdue,
+            "running": len(self._running),
+            "coalesced": self.coalesced,
+            "last_lag_ms": self.last_lag_ms,
+            "max_lag_ms": self.max_lag_ms,
+            "default_interval": self.default_interval,
+        }
@@ -20,6 +20,154 @@ CREATE TABLE IF NOT EXISTS services (
 
 CREATE INDEX idx_owner_id ON services(owner_id);
 CREATE INDEX idx_guild_id ON services(guild_id);
+
+-- Intervalle de check propre au service, en secondes (NULL = intervalle par défaut)
+ALTER TABLE services ADD COLUMN IF NOT EXISTS check_interval INT;
+
+-- Salon Discord des alertes (NULL = salon système du serveur)
+ALTER TABLE services ADD COLUMN IF NOT EXISTS alert_channel_id BIGINT;
+
+-- Mode de probe (get, head, tcp, tls), statuts HTTP acceptés ("200-399" par défaut)
+-- et mot-clé attendu dans le début de la page (mode get)
+ALTER TABLE services ADD COLUMN IF NOT EXISTS probe_mode TEXT;
+ALTER TABLE services ADD COLUMN IF NOT EXISTS accepted_status TEXT;
+ALTER TABLE services ADD COLUMN IF NOT EXISTS keyword TEXT;
+
+-- Nombre de services par statut, tenu à jour par trigger (SupabaseStorage.count_by_status):
+-- /api/status lit quelques lignes au lieu de compter la table services
+CREATE TABLE IF NOT EXISTS service_status_counts (
+    status TEXT PRIMARY KEY,
+    n BIGINT NOT NULL DEFAULT 0
+);
+
+CREATE OR REPLACE FUNCTION count_service_status() RETURNS TRIGGER AS $$
+BEGIN
+    -- set_status réécrit aussi les services dont le statut ne change pas
+    IF TG_OP = 'UPDATE' AND OLD.status IS NOT DISTINCT FROM NEW.status THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE service_status_counts SET n = n - 1 WHERE status = COALESCE(OLD.status, '');
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO service_status_counts AS c (status, n) VALUES (COALESCE(NEW.status, ''), 1)
+        ON CONFLICT (status) DO UPDATE SET n = c.n + 1;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS services_status_counts ON services;
+CREATE TRIGGER services_status_counts
+    AFTER INSERT OR DELETE OR UPDATE OF status ON services
+    FOR EACH ROW EXECUTE FUNCTION count_service_status();
+
+-- Compteurs recalculés depuis la table (installation ou réparation)
+INSERT INTO service_status_counts (status, n)
+SELECT COALESCE(status, ''), COUNT(*) FROM services GROUP BY COALESCE(status, '')
+ON CONFLICT (status) DO UPDATE SET n = EXCLUDED.n;
+UPDATE service_status_counts SET n = 0
+WHERE status NOT IN (SELECT DISTINCT COALESCE(status, '') FROM services);
+
+CREATE TABLE IF NOT EXISTS pings (
+    id BIGSERIAL PRIMARY KEY,
+    service_id BIGINT REFERENCES services(id) ON DELETE CASCADE,
+    owner_id TEXT,
+    service_name TEXT,
+    status TEXT,
+    latency_ms INT,
+    created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Anciennes tables: pings.created_at était un TIMESTAMP sans fuseau (valeurs en UTC),
+-- comparé aux TIMESTAMPTZ des rollups et des maintenances
+DO $$
+BEGIN
+    IF (SELECT data_type FROM information_schema.columns
+        WHERE table_name = 'pings' AND column_name = 'created_at') = 'timestamp without time zone' THEN
+        ALTER TABLE pings ALTER COLUMN created_at TYPE TIMESTAMPTZ USING created_at AT TIME ZONE 'UTC';
+    END IF;
+END $$;
+
+-- Détail des phases de chaque probe (latency_ms = temps jusqu'au premier octet)
+ALTER TABLE pings ADD COLUMN IF NOT EXISTS dns_ms INT;
+ALTER TABLE pings ADD COLUMN IF NOT EXISTS connect_ms INT;
+ALTER TABLE pings ADD COLUMN IF NOT EXISTS tls_ms INT;
+ALTER TABLE pings ADD COLUMN IF NOT EXISTS ttfb_ms INT;
+
+-- Votes des points de vue (vantage.py), ex. "local:42,eu:57,us:x"
+ALTER TABLE pings ADD COLUMN IF NOT EXISTS vantages TEXT;
+
+CREATE INDEX IF NOT EXISTS idx_pings_service_created ON pings(service_id, created_at);
+
+-- Shard de chaque service pour les checkers (256 = SHARD_COUNT dans storage.py)
+ALTER TABLE services ADD COLUMN IF NOT EXISTS shard INT GENERATED ALWAYS AS (id % 256) STORED;
+CREATE INDEX IF NOT EXISTS idx_services_shard ON services(shard);
+
+CREATE TABLE IF NOT EXISTS checker_workers (
+    worker_id TEXT PRIMARY KEY,
+    expires_at TIMESTAMPTZ NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS shard_leases (
+    shard INT PRIMARY KEY,
+    owner TEXT NOT NULL DEFAULT '',
+    expires_at TIMESTAMPTZ NOT NULL
+);
+
+-- Agrégats 1m / 1h / 1d par service (voir rollups.py)
+CREATE TABLE IF NOT EXISTS ping_rollups (
+    service_id BIGINT NOT NULL REFERENCES services(id) ON DELETE CASCADE,
+    resolution TEXT NOT NULL,
+    bucket_start TIMESTAMPTZ NOT NULL,
+    count INT NOT NULL DEFAULT 0,
+    failures INT NOT NULL DEFAULT 0,
+    latency_min INT,
+    latency_max INT,
+    latency_sum BIGINT NOT NULL DEFAULT 0,
+    sketch JSONB,
+    PRIMARY KEY (service_id, resolution, bucket_start)
+);
+
+-- Fusion atomique des deltas de rollups (SupabaseStorage.merge_rollups, POST /rpc/merge_rollups):
+-- compteurs, sommes et sketch additionnés côté serveur, min/max conservés
+CREATE OR REPLACE FUNCTION merge_rollups(deltas JSONB) RETURNS VOID AS $$
+    INSERT INTO ping_rollups AS r (service_id, resolution, bucket_start, count, failures,
+                                   latency_min, latency_max, latency_sum, sketch)
+    SELECT service_id, resolution, bucket_start, count, failures,
+           latency_min, latency_max, latency_sum, COALESCE(sketch, '{}')
+    FROM jsonb_to_recordset(deltas) AS x(service_id BIGINT, resolution TEXT, bucket_start TIMESTAMPTZ,
+                                       count INT, failures INT, latency_min INT, latency_max INT,
+                                       latency_sum BIGINT, sketch JSONB)
+    ON CONFLICT (service_id, resolution, bucket_start) DO UPDATE SET
+        count = r.count + EXCLUDED.count,
+        failures = r.failures + EXCLUDED.failures,
+        -- LEAST / GREATEST ignorent les NULL
+        latency_min = LEAST(r.latency_min, EXCLUDED.latency_min),
+        latency_max = GREATEST(r.latency_max, EXCLUDED.latency_max),
+        latency_sum = r.latency_sum + EXCLUDED.latency_sum,
+        sketch = COALESCE((
+            SELECT jsonb_object_agg(key, total)
+            FROM (
+                SELECT key, SUM(value::BIGINT) AS total
+                FROM (SELECT * FROM jsonb_each_text(COALESCE(r.sketch, '{}'))
+                      UNION ALL
+                      SELECT * FROM jsonb_each_text(EXCLUDED.sketch)) AS counts
+                GROUP BY key
+            ) AS sums
+        ), '{}');
+$$ LANGUAGE sql;
+
+-- Maintenances prévues: exclues du calcul d'uptime (voir sla.py)
+CREATE TABLE IF NOT EXISTS maintenance_windows (
+    id BIGSERIAL PRIMARY KEY,
+    service_id BIGINT NOT NULL REFERENCES services(id) ON DELETE CASCADE,
+    starts_at TIMESTAMPTZ NOT NULL,
+    ends_at TIMESTAMPTZ NOT NULL,
+    reason TEXT,
+    created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_maintenance_service ON maintenance_windows(service_id, starts_at);
 """
 
 print("📋 SQL à exécuter dans Supabase:")
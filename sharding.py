@@ -0,0 +1,109 @@
+"""Répartition des services entre plusieurs checkers (shards + leases)"""
+import asyncio
+import bisect
+import hashlib
+import os
+import socket
+import time
+from datetime import datetime, timedelta, timezone
+
+from config import LEASE_TTL
+from storage import SHARD_COUNT
+
+
+def shard_of(service_id):
+    """Shard fixe d'un service (même calcul que la colonne services.shard)"""
+    return int(service_id) % SHARD_COUNT
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def _hash(value):
+    return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], "big")
+
+
+class HashRing:
+    """Anneau de hachage cohérent avec nœuds virtuels
+
+    Quand un worker arrive ou part, seuls les shards de ses voisins sur
+    l'anneau changent de propriétaire (~1/N des shards).
+    """
+
+    def __init__(self, nodes, vnodes=64):
+        self._ring = sorted((_hash(f"{node}#{i}"), node) for node in nodes for i in range(vnodes))
+        self._keys = [h for h, _ in self._ring]
+
+    def node_for(self, key):
+        if not self._ring:
+            return None
+        i = bisect.bisect(self._keys, _hash(key)) % len(self._ring)
+        return self._ring[i][1]
+
+
+class ShardCoordinator:
+    """Décide quels shards ce worker vérifie
+
+    À chaque tick: heartbeat du worker, calcul de l'anneau à partir des
+    workers vivants, libération des shards qui partent ailleurs, puis
+    prise (ou renouvellement) des leases des shards visés. Un lease encore
+    valide d'un autre worker n'est jamais volé: le shard change de main
+    quand l'ancien propriétaire le libère ou quand son lease expire, donc
+    un service n'est jamais vérifié par deux workers à la fois.
+    """
+
+    def __init__(self, storage, worker_id=None, lease_ttl=LEASE_TTL):
+        self.storage = storage
+        self.worker_id = worker_id or default_worker_id()
+        self.lease_ttl = lease_ttl
+        self._owned = {}
+        self.workers = []
+
+    def _expires_at(self):
+        return (datetime.now(timezone.utc) + timedelta(seconds=self.lease_ttl)).isoformat(timespec="microseconds")
+
+    async def tick(self):
+        """Renouvelle les leases; retourne True si les shards possédés ont changé"""
+        before = set(self.shards())
+        # Marge de sécurité: on arrête de vérifier un shard avant l'expiration
+        # réelle de son lease, au cas où le renouvellement échoue.
+        deadline = time.monotonic() + self.lease_ttl * 0.8
+        expires_at = self._expires_at()
+        try:
+            await asyncio.to_thread(self.storage.heartbeat_worker, self.worker_id, expires_at)
+            workers = await asyncio.to_thread(self.storage.live_workers)
+            self.workers = sorted(set(workers) | {self.worker_id})
+            ring = HashRing(self.workers)
+            desired = {s for s in range(SHARD_COUNT) if ring.node_for(f"shard-{s}") == self.worker_id}
+
+            dropped = [s for s in self._owned if s not in desired]
+            for shard in dropped:
+                # On arrête de vérifier le shard avant de libérer son lease
+                del self._owned[shard]
+            if dropped:
+                await asyncio.to_thread(self.storage.release_shards, dropped, self.worker_id)
+
+            claimed = await asyncio.to_thread(self.storage.claim_shards, sorted(desired), self.worker_id, expires_at)
+            self._owned = {shard: deadline for shard in claimed}
+        except Exception as e:
+            print(f"⚠️ Erreur leases ({self.worker_id}): {e}")
+        return set(self.shards()) != before
+
+    def shards(self):
+        now = time.monotonic()
+        return sorted(shard for shard, deadline in self._owned.items() if deadline > now)
+
+    def owns(self, service):
+        deadline = self._owned.get(shard_of(service["id"]))
+        return deadline is not None and deadline > time.monotonic()
+
+    async def leave(self):
+        """Libère tous les shards pour que les autres workers les reprennent tout de suite"""
+        shards, self._owned = list(self._owned), {}
+        try:
+            if shards:
+                await asyncio.to_thread(self.storage.release_shards, shards, self.worker_id)
+            await asyncio.to_thread(self.storage.remove_worker, self.worker_id)
+        except Exception as e:
+            print(f"⚠️ Erreur départ ({self.worker_id}): {e}")
@@ -0,0 +1,289 @@
+"""Uptime (SLA) d'un service sur les N derniers jours, calculé depuis les rollups
+
+Un seul parcours des buckets, jour après jour, en mémoire bornée: seul le
+jour en cours de lecture est gardé. Chaque bucket compte pour le temps qui
+le sépare du suivant, au plus SLA_GAP_FACTOR × check_interval: au-delà,
+le temps est compté comme "sans données" (checker arrêté), ni en ligne ni
+down. Le temps passé dans une fenêtre de maintenance est exclu. Les
+incidents (buckets en échec) séparés de moins de SLA_INCIDENT_MERGE
+secondes sont fusionnés, y compris d'un jour sur l'autre.
+
+Les jours terminés sont mis en cache (un résumé de quelques centaines
+d'octets par jour): seul le jour courant est recalculé à chaque appel.
+"""
+from collections import deque
+from datetime import datetime, timedelta, timezone
+
+from cache import TTLCache
+from config import (
+    DEFAULT_CHECK_INTERVAL, ROLLUP_FLUSH_INTERVAL, ROLLUP_1M_RETENTION_DAYS,
+    SLA_GAP_FACTOR, SLA_INCIDENT_MERGE, SLA_RECENT_INCIDENTS, SLA_CACHE_SIZE,
+)
+from rollups import RESOLUTIONS
+
+DAY = 86400
+# Un jour terminé ne change plus: le cache ne sert qu'à borner la mémoire
+DAY_CACHE_TTL = 7 * DAY
+
+day_cache = TTLCache("sla_days", DAY_CACHE_TTL, SLA_CACHE_SIZE)
+
+
+def _epoch(value):
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+def _iso(epoch):
+    return datetime.fromtimestamp(epoch, timezone.utc).isoformat(timespec="seconds")
+
+
+def _overlap(start, end, windows):
+    """Secondes de [start, end) couvertes par les fenêtres (triées, disjointes)"""
+    total = 0.0
+    for window_start, window_end in windows:
+        if window_start >= end:
+            break
+        total += max(0.0, min(end, window_end) - max(start, window_start))
+    return total
+
+
+def merge_windows(rows):
+    """Fenêtres de maintenance -> [(début, fin)] en epoch, triées et fusionnées"""
+    windows = []
+    for start, end in sorted((_epoch(r["starts_at"]), _epoch(r["ends_at"])) for r in rows):
+        if end <= start:
+            continue
+        if windows and start <= windows[-1][1]:
+            windows[-1] = (windows[-1][0], max(windows[-1][1], end))
+        else:
+            windows.append((start, end))
+    return windows
+
+
+class DayAccumulator:
+    """Statistiques d'un jour, alimentées bucket par bucket dans l'ordre"""
+
+    __slots__ = ("start", "end", "gap_limit", "merge_gap", "windows", "checks", "failures",
+                 "monitored_s", "down_s", "maintenance_s", "incidents", "_previous")
+
+    def __init__(self, start, end, gap_limit, windows=(), merge_gap=SLA_INCIDENT_MERGE):
+        self.start = start
+        self.end = end
+        self.gap_limit = gap_limit
+        self.merge_gap = merge_gap
+        self.windows = windows
+        self.checks = 0
+        self.failures = 0
+        self.monitored_s = 0.0
+        self.down_s = 0.0
+        self.maintenance_s = 0.0
+        # [début, fin, secondes down]
+        self.incidents = []
+        self._previous = None
+
+    def add(self, start, count, failures):
+        if self._previous is not None:
+            self._account(*self._previous, start)
+        self._previous = (start, count, failures)
+
+    def _account(self, start, count, failures, next_start):
+        end = min(next_start, start + self.gap_limit, self.end)
+        self.checks += count
+        self.failures += failures
+        if end <= start:
+            return
+        maintenance = _overlap(start, end, self.windows)
+        covered = end - start - maintenance
+        self.maintenance_s += maintenance
+        self.monitored_s += covered
+        if not failures or covered <= 0:
+            return
+        down = covered * failures / count
+        self.down_s += down
+        if self.incidents and start - self.incidents[-1][1] <= self.merge_gap:
+            self.incidents[-1][1] = end
+            self.incidents[-1][2] += down
+        else:
+            self.incidents.append([start, end, down])
+
+    def finish(self):
+        if self._previous is not None:
+            self._account(*self._previous, self.end)
+            self._previous = None
+        return {
+            "day": datetime.fromtimestamp(self.start, timezone.utc).date().isoformat(),
+            "start": self.start,
+            "end": self.end,
+            "checks": self.checks,
+            "failures": self.failures,
+            "monitored_s": round(self.monitored_s, 3),
+            "down_s": round(self.down_s, 3),
+            "maintenance_s": round(self.maintenance_s, 3),
+            "incidents": self.incidents,
+        }
+
+
+def _resolution(day_start, now):
+    """1m tant que les rollups 1m du jour sont tous gardés, 1h sinon"""
+    if not ROLLUP_1M_RETENTION_DAYS:
+        return "1m"
+    return "1m" if day_start >= now - (ROLLUP_1M_RETENTION_DAYS - 1) * DAY else "1h"
+
+
+def _stream_days(storage, service_id, days, resolution, gap_limit, windows):
+    """Résumé de chaque jour de days (consécutifs) en un seul parcours des rollups"""
+    rollups = storage.iter_rollups(service_id, resolution, _iso(days[0][0]), _iso(days[-1][1]))
+    index = 0
+    day = DayAccumulator(*days[0], gap_limit, windows)
+    for bucket in rollups:
+        start = _epoch(bucket["bucket_start"])
+        while start >= day.end and index + 1 < len(days):
+            yield day.finish()
+            index += 1
+            day = DayAccumulator(*days[index], gap_limit, windows)
+        if bucket["count"] and start >= day.start:
+            day.add(start, bucket["count"], bucket["failures"])
+    yield day.finish()
+    for start, end in days[index + 1:]:
+        yield DayAccumulator(start, end, gap_limit, windows).finish()
+
+
+def daily_stats(storage, service, days, now=None):
+    """Résumés par jour (UTC) des days derniers jours, jour courant compris
+
+    Les jours terminés viennent du cache s'ils y sont; les autres sont
+    calculés par séries de jours consécutifs, un parcours par série.
+    """
+    now = _epoch(now or datetime.now(timezone.utc))
+    today = now // DAY * DAY
+    created = _epoch(service["created_at"]) if service.get("created_at") else 0.0
+    interval = service.get("check_interval") or DEFAULT_CHECK_INTERVAL
+    spans = []
+    for n in range(days - 1, -1, -1):
+        day_start = today - n * DAY
+        start, end = max(day_start, created), min(day_start + DAY, now)
+        if start < end:
+            spans.append((day_start, start, end))
+    if not spans:
+        return []
+    windows = merge_windows(storage.get_maintenance(service["id"], _iso(spans[0][1]), _iso(now)))
+    results = {}
+    pending = []
+
+    def compute():
+        if not pending:
+            return
+        groups = {}
+        for span in pending:
+            groups.setdefault(_resolution(span[0], now), []).append(span)
+        for resolution, group in groups.items():
+            gap_limit = max(RESOLUTIONS[resolution], SLA_GAP_FACTOR * interval)
+            for span, stats in zip(group, _stream_days(storage, service["id"], [(s, e) for _, s, e in group],
+                                                       resolution, gap_limit, windows)):
+                results[span[0]] = stats
+                # Jour terminé (et rollups flushés): il ne changera plus
+                if span[2] == span[0] + DAY and span[2] + 2 * ROLLUP_FLUSH_INTERVAL <= now:
+                    day_cache.set(_cache_key(service, span, interval, windows), stats)
+        pending.clear()
+
+    for span in spans:
+        stats = day_cache.get(_cache_key(service, span, interval, windows))
+        if stats is None:
+            pending.append(span)
+            continue
+        # La série en attente s'arrête ici: un parcours par série consécutive
+        compute()
+        results[span[0]] = stats
+    compute()
+    return [results[span[0]] for span in spans]
+
+
+def _cache_key(service, span, interval, windows):
+    _, start, end = span
+    return (service["id"], start, end, interval, tuple(w for w in windows if w[0] < end and w[1] > start))
+
+
+def uptime_report(storage, service, days=30, now=None):
+    """Uptime, temps down, couverture et incidents des days derniers jours"""
+    now = _epoch(now or datetime.now(timezone.utc))
+    daily = daily_stats(storage, service, days, now)
+    totals = {"checks": 0, "failures": 0, "monitored_s": 0.0, "down_s": 0.0, "maintenance_s": 0.0}
+    expected = 0.0
+    recent = deque(maxlen=SLA_RECENT_INCIDENTS)
+    count = 0
+    longest = 0.0
+    total_duration = 0.0
+    current = None
+
+    def close(incident):
+        nonlocal count, longest, total_duration
+        duration = incident[1] - incident[0]
+        count += 1
+        longest = max(longest, duration)
+        total_duration += duration
+        recent.append(incident)
+
+    for day in daily:
+        expected += day["end"] - day["start"]
+        for key in totals:
+            totals[key] += day[key]
+        for start, end, down in day["incidents"]:
+            if current is not None and start - current[1] <= SLA_INCIDENT_MERGE:
+                current = [current[0], max(current[1], end), current[2] + down]
+                continue
+            if current is not None:
+                close(current)
+            current = [start, end, down]
+    if current is not None:
+        close(current)
+    monitored = totals["monitored_s"]
+    return {
+        "service_id": service["id"],
+        "days": days,
+        "since": _iso(daily[0]["start"]) if daily else None,
+        "until": _iso(now),
+        "uptime": round((monitored - totals["down_s"]) / monitored * 100, 3) if monitored else None,
+        "checks": totals["checks"],
+        "failures": totals["failures"],
+        "monitored_s": round(monitored),
+        "down_s": round(totals["down_s"]),
+        "maintenance_s": round(totals["maintenance_s"]),
+        "no_data_s": round(max(expected - monitored - totals["maintenance_s"], 0)),
+        "coverage": round(monitored / (expected - totals["maintenance_s"]) * 100, 2)
+        if expected > totals["maintenance_s"] else None,
+        "incidents": {
+            "count": count,
+            "longest_s": round(longest),
+            "mttr_s": round(total_duration / count) if count else None,
+            "recent": [{
+                "start": _iso(start),
+                "end": _iso(end),
+                "duration_s": round(end - start),
+                "down_s": round(down),
+                # Le dernier bucket en échec court encore
+                "ongoing": end >= now - 1,
+            } for start, end, down in reversed(recent)],
+        },
+        "daily": [{
+            "day": day["day"],
+            "uptime": round((day["monitored_s"] - day["down_s"]) / day["monitored_s"] * 100, 3)
+            if day["monitored_s"] else None,
+            "down_s": round(day["down_s"]),
+        } for day in daily],
+    }
+
+
+def maintenance_window(service_id, minutes, starts_at=None, reason=None):
+    """Ligne de maintenance_windows pour minutes minutes à partir de starts_at (maintenant par défaut)"""
+    starts_at = starts_at or datetime.now(timezone.utc)
+    return {
+        "service_id": service_id,
+        "starts_at": starts_at.isoformat(timespec="microseconds"),
+        "ends_at": (starts_at + timedelta(minutes=minutes)).isoformat(timespec="microseconds"),
+        "reason": reason,
+    }
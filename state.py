@@ -0,0 +1,74 @@
+"""Dernier état connu des services et détection des changements"""
+from config import FLAP_THRESHOLD
+
+
+class StateTracker:
+    """Table en mémoire du statut confirmé de chaque service
+
+    Un service ne passe "down" qu'après threshold échecs consécutifs
+    (anti-flapping); un seul succès le remet "online". Seules les
+    transitions sont retournées, pour n'écrire et n'alerter que sur un
+    vrai changement.
+    """
+
+    def __init__(self, threshold=FLAP_THRESHOLD):
+        self.threshold = max(1, threshold)
+        self._status = {}
+        self._failures = {}
+        self.transitions = 0
+
+    def status(self, service_id):
+        return self._status.get(service_id)
+
+    def observe(self, service, status):
+        """Enregistre le résultat d'un check; retourne (ancien, nouveau) si le statut change"""
+        service_id = service["id"]
+        previous = self._status.get(service_id)
+        if previous is None:
+            # Premier check depuis le démarrage: on part du statut stocké
+            previous = service.get("status") or "online"
+            self._status[service_id] = previous
+
+        if status == "online":
+            self._failures[service_id] = 0
+            new = "online"
+        else:
+            failures = self._failures.get(service_id, 0) + 1
+            self._failures[service_id] = failures
+            new = status if failures >= self.threshold else previous
+
+        if new == previous:
+            return None
+        self._status[service_id] = new
+        self.transitions += 1
+        return previous, new
+
+    def reconcile(self, services):
+        """Aligne la table sur la liste des services à vérifier
+
+        Oublie les services disparus et retourne [(id, statut)] pour ceux
+        dont le statut stocké ne correspond plus au statut confirmé (écrit
+        ailleurs, ou écriture perdue).
+        """
+        ids = {service["id"] for service in services}
+        for service_id in [s for s in self._status if s not in ids]:
+            self._status.pop(service_id, None)
+            self._failures.pop(service_id, None)
+        return [
+            (service["id"], self._status[service["id"]])
+            for service in services
+            if service["id"] in self._status and service.get("status") != self._status[service["id"]]
+        ]
+
+    def forget(self, service_id):
+        self._status.pop(service_id, None)
+        self._failures.pop(service_id, None)
+
+    def stats(self):
+        return {
+            "tracked": len(self._status),
+            "down": sum(1 for status in self._status.values() if status != "online"),
+            "failing": sum(1 for failures in self._failures.values() if failures),
+            "transitions": self.transitions,
+            "threshold": self.threshold
+        }
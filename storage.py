@@ -0,0 +1,840 @@
+"""Accès aux données: une interface, un backend Supabase et un backend SQLite"""
+import json
+import re
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta, timezone
+
+import requests
+
+from config import STORAGE_BACKEND, SQLITE_PATH, SUPABASE_URL, SUPABASE_KEY
+from metrics import STORAGE_SECONDS, STORAGE_ERRORS, timed
+from rollups import RESOLUTIONS, empty_rollup, merge_rollup
+
+# Nombre de shards des checkers: figé car repris dans la colonne services.shard
+SHARD_COUNT = 256
+LEASE_EPOCH = "1970-01-01T00:00:00.000000+00:00"
+# Identifiants max par filtre in.(...): l'URL reste sous la limite des proxys (~8 Ko)
+IN_FILTER_CHUNK = 500
+
+SERVICE_COLUMNS = ["id", "owner_id", "guild_id", "name", "url", "status", "check_interval", "alert_channel_id",
+                   "probe_mode", "accepted_status", "keyword", "last_check", "created_at"]
+PING_COLUMNS = ["id", "service_id", "owner_id", "service_name", "status", "latency_ms",
+                "dns_ms", "connect_ms", "tls_ms", "ttfb_ms", "vantages", "created_at"]
+ROLLUP_COLUMNS = ["service_id", "resolution", "bucket_start", "count", "failures",
+                  "latency_min", "latency_max", "latency_sum", "sketch"]
+
+
+class StorageError(Exception):
+    """Erreur renvoyée par un backend (requête refusée, contrainte violée...)"""
+
+
+def utcnow():
+    """Horodatage ISO 8601 UTC, toujours au même format (triable comme texte)"""
+    return datetime.now(timezone.utc).isoformat(timespec="microseconds")
+
+
+def _chunks(items, size=IN_FILTER_CHUNK):
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _timestamp(value):
+    """Normalise un datetime ou une chaîne ISO au format de utcnow()"""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc).isoformat(timespec="microseconds")
+
+
+class Storage(ABC):
+    """Interface commune des backends
+
+    Les lignes sont des dicts avec les colonnes des tables services et pings.
+    Les pings sont toujours retournés du plus ancien au plus récent.
+    """
+
+    @abstractmethod
+    def list_services(self, owner_id=None, shards=None):
+        """Services d'un propriétaire, ou de certains shards, ou tous"""
+
+    @abstractmethod
+    def get_service(self, service_id):
+        """Un service par id, ou None"""
+
+    @abstractmethod
+    def add_service(self, service):
+        """Crée un service et retourne la ligne créée"""
+
+    @abstractmethod
+    def add_services(self, services):
+        """Crée plusieurs services d'un coup et retourne les lignes créées
+
+        Un service dont le nom existe déjà pour son propriétaire est ignoré
+        (contrainte UNIQUE(owner_id, name)), sans erreur.
+        """
+
+    @abstractmethod
+    def list_services_page(self, owner_id, after_id=0, limit=1000):
+        """Services d'un propriétaire d'id > after_id, par id croissant"""
+
+    def iter_services(self, owner_id, page_size=1000):
+        """Tous les services d'un propriétaire, page par page (pagination par id)"""
+        after_id = 0
+        while True:
+            page = self.list_services_page(owner_id, after_id, page_size)
+            yield from page
+            if len(page) < page_size:
+                return
+            after_id = page[-1]["id"]
+
+    @abstractmethod
+    def update_service(self, fields, service_id=None, owner_id=None, name=None):
+        """Met à jour les services filtrés et retourne les lignes modifiées"""
+
+    @abstractmethod
+    def delete_service(self, service_id=None, owner_id=None, name=None):
+        """Supprime les services filtrés et retourne les lignes supprimées"""
+
+    @abstractmethod
+    def set_status(self, service_ids, status, last_check=None):
+        """Même statut pour plusieurs services en une seule requête"""
+
+    @abstractmethod
+    def count_by_status(self):
+        """Nombre de services par statut: {"online": n, "down": m, "total": t}"""
+
+    @abstractmethod
+    def insert_pings(self, pings):
+        """Ajoute des pings (liste de dicts)"""
+
+    @abstractmethod
+    def get_pings(self, service_id, since=None, until=None, limit=100, newest=False):
+        """Pings d'un service; avec newest=True ce sont les limit plus récents"""
+
+    @abstractmethod
+    def merge_rollups(self, rollups):
+        """Fusionne des deltas de rollups avec les buckets existants"""
+
+    @abstractmethod
+    def get_rollups(self, service_id, resolution, since=None, until=None, limit=None):
+        """Buckets d'un service entre since (inclus) et until (exclu), du plus ancien au plus récent"""
+
+    def iter_rollups(self, service_id, resolution, since, until, page_size=1000):
+        """Mêmes buckets que get_rollups, page par page (pagination par bucket_start)"""
+        while True:
+            page = self.get_rollups(service_id, resolution, since, until, limit=page_size)
+            yield from page
+            if len(page) < page_size:
+                return
+            # Buckets alignés: le suivant commence au plus tôt une taille de bucket plus loin
+            last = datetime.fromisoformat(_timestamp(page[-1]["bucket_start"]))
+            since = last + timedelta(seconds=RESOLUTIONS[resolution])
+
+    @abstractmethod
+    def add_maintenance(self, window):
+        """Crée une fenêtre de maintenance (service_id, starts_at, ends_at, reason) et la retourne"""
+
+    @abstractmethod
+    def get_maintenance(self, service_id, since, until):
+        """Fenêtres de maintenance d'un service qui chevauchent [since, until), par début croissant"""
+
+    @abstractmethod
+    def old_pings(self, before, limit):
+        """Les limit pings les plus anciens (par id) créés avant before"""
+
+    @abstractmethod
+    def delete_pings(self, max_id, before):
+        """Supprime les pings d'id <= max_id créés avant before; retourne le nombre supprimé"""
+
+    @abstractmethod
+    def rollup_buckets(self, service_ids, resolution, since, until):
+        """(service_id, bucket_start) des rollups existants entre since et until inclus"""
+
+    @abstractmethod
+    def delete_rollups(self, service_ids, resolution, before):
+        """Supprime les rollups d'une résolution antérieurs à before; retourne le nombre supprimé"""
+
+    def storage_bytes(self):
+        """Octets occupés par les données, ou None si le backend ne le mesure pas"""
+        return None
+
+    @abstractmethod
+    def heartbeat_worker(self, worker_id, expires_at):
+        """Enregistre (ou prolonge) un worker vivant jusqu'à expires_at"""
+
+    @abstractmethod
+    def live_workers(self):
+        """Identifiants des workers dont le heartbeat n'a pas expiré"""
+
+    @abstractmethod
+    def remove_worker(self, worker_id):
+        """Retire un worker de la liste des vivants"""
+
+    @abstractmethod
+    def claim_shards(self, shards, worker_id, expires_at):
+        """Prend ou renouvelle les leases libres, expirés ou déjà à nous
+
+        Retourne la liste des shards effectivement possédés.
+        """
+
+    @abstractmethod
+    def release_shards(self, shards, worker_id):
+        """Libère les leases des shards tenus par worker_id"""
+
+
+class SupabaseStorage(Storage):
+    """Backend Supabase via l'API REST (PostgREST)"""
+
+    def __init__(self, url=SUPABASE_URL, key=SUPABASE_KEY, timeout=5):
+        self.url = f"{url}/rest/v1"
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers.update({
+            "apikey": key,
+            "Authorization": f"Bearer {key}",
+            "Content-Type": "application/json"
+        })
+
+    def _request(self, method, table, params=None, json=None, prefer=None):
+        headers = {"Prefer": prefer} if prefer else None
+        try:
+            with timed(STORAGE_SECONDS, backend="supabase", table=table, verb=method):
+                resp = self.session.request(method, f"{self.url}/{table}", params=params, json=json,
+                                            headers=headers, timeout=self.timeout)
+        except requests.RequestException as e:
+            STORAGE_ERRORS.inc(backend="supabase", table=table, verb=method)
+            raise StorageError(str(e)) from e
+        if resp.status_code >= 400:
+            STORAGE_ERRORS.inc(backend="supabase", table=table, verb=method)
+            raise StorageError(f"{table} {resp.status_code}: {resp.text}")
+        if resp.status_code == 204 or not resp.content:
+            return []
+        return resp.json()
+
+    @staticmethod
+    def _filters(service_id=None, owner_id=None, name=None):
+        params = {}
+        if service_id is not None:
+            params["id"] = f"eq.{service_id}"
+        if owner_id is not None:
+            params["owner_id"] = f"eq.{owner_id}"
+        if name is not None:
+            params["name"] = f"eq.{name}"
+        if not params:
+            raise StorageError("filtre obligatoire")
+        return params
+
+    def list_services(self, owner_id=None, shards=None):
+        params = {"select": "*", "order": "id.asc"}
+        if owner_id is not None:
+            params["owner_id"] = f"eq.{owner_id}"
+        if shards is not None:
+            if not shards:
+                return []
+            params["shard"] = f"in.({','.join(str(s) for s in shards)})"
+        return self._request("GET", "services", params)
+
+    def list_services_page(self, owner_id, after_id=0, limit=1000):
+        params = {"owner_id": f"eq.{owner_id}", "id": f"gt.{after_id}", "order": "id.asc", "limit": str(limit)}
+        return self._request("GET", "services", params)
+
+    def get_service(self, service_id):
+        rows = self._request("GET", "services", {"id": f"eq.{service_id}"})
+        return rows[0] if rows else None
+
+    def add_service(self, service):
+        rows = self._request("POST", "services", json=service, prefer="return=representation")
+        return rows[0] if rows else {}
+
+    def add_services(self, services):
+        if not services:
+            return []
+        # PostgREST exige les mêmes clés pour toutes les lignes d'un insert groupé
+        columns = [c for c in SERVICE_COLUMNS if c != "id" and any(c in s for s in services)]
+        rows = [{c: s.get(c) for c in columns} for s in services]
+        return self._request("POST", "services", {"on_conflict": "owner_id,name"}, json=rows,
+                             prefer="resolution=ignore-duplicates,return=representation")
+
+    def update_service(self, fields, service_id=None, owner_id=None, name=None):
+        return self._request("PATCH", "services", self._filters(service_id, owner_id, name),
+                             json=fields, prefer="return=representation")
+
+    def delete_service(self, service_id=None, owner_id=None, name=None):
+        return self._request("DELETE", "services", self._filters(service_id, owner_id, name),
+                             prefer="return=representation")
+
+    def set_status(self, service_ids, status, last_check=None):
+        last_check = last_check or utcnow()
+        for chunk in _chunks(service_ids):
+            self._request("PATCH", "services", {"id": f"in.({','.join(str(i) for i in chunk)})"},
+                          json={"status": status, "last_check": last_check}, prefer="return=minimal")
+
+    def count_by_status(self):
+        # Compteurs tenus à jour par trigger (setup_db.py): une ligne par statut, aucun COUNT
+        counts = {"online": 0, "down": 0, "total": 0}
+        for row in self._request("GET", "service_status_counts", {"select": "status,n"}):
+            if row["status"] in counts:
+                counts[row["status"]] = row["n"]
+            counts["total"] += row["n"]
+        return counts
+
+    def insert_pings(self, pings):
+        if pings:
+            self._request("POST", "pings", json=pings, prefer="return=minimal")
+
+    def get_pings(self, service_id, since=None, until=None, limit=100, newest=False):
+        params = [("service_id", f"eq.{service_id}"), ("order", "created_at.desc" if newest else "created_at.asc")]
+        if since is not None:
+            params.append(("created_at", f"gte.{_timestamp(since)}"))
+        if until is not None:
+            params.append(("created_at", f"lt.{_timestamp(until)}"))
+        if limit is not None:
+            params.append(("limit", str(limit)))
+        rows = self._request("GET", "pings", params)
+        return rows[::-1] if newest else rows
+
+    def merge_rollups(self, rollups):
+        if not rollups:
+            return
+        # Addition côté serveur (fonction merge_rollups de setup_db.py): un seul
+        # INSERT ... ON CONFLICT, atomique même si deux checkers écrivent le même
+        # bucket. Un bucket ne peut y apparaître qu'une fois: doublons fusionnés ici.
+        merged = {}
+        for rollup in rollups:
+            key = (rollup["service_id"], rollup["resolution"], rollup["bucket_start"])
+            if key in merged:
+                merge_rollup(merged[key], rollup)
+            else:
+                merged[key] = {c: rollup[c] for c in ROLLUP_COLUMNS}
+        self._request("POST", "rpc/merge_rollups", json={"deltas": list(merged.values())}, prefer="return=minimal")
+
+    def get_rollups(self, service_id, resolution, since=None, until=None, limit=None):
+        params = [("service_id", f"eq.{service_id}"), ("resolution", f"eq.{resolution}"),
+                  ("order", "bucket_start.asc")]
+        if since is not None:
+            params.append(("bucket_start", f"gte.{_timestamp(since)}"))
+        if until is not None:
+            params.append(("bucket_start", f"lt.{_timestamp(until)}"))
+        if limit is not None:
+            params.append(("limit", str(limit)))
+        return self._request("GET", "ping_rollups", params)
+
+    def add_maintenance(self, window):
+        rows = self._request("POST", "maintenance_windows", json=window, prefer="return=representation")
+        return rows[0] if rows else {}
+
+    def get_maintenance(self, service_id, since, until):
+        params = [("service_id", f"eq.{service_id}"), ("starts_at", f"lt.{_timestamp(until)}"),
+                  ("ends_at", f"gt.{_timestamp(since)}"), ("order", "starts_at.asc")]
+        return self._request("GET", "maintenance_windows", params)
+
+    def old_pings(self, before, limit):
+        params = [("created_at", f"lt.{_timestamp(before)}"), ("order", "id.asc"), ("limit", str(limit))]
+        return self._request("GET", "pings", params)
+
+    def delete_pings(self, max_id, before):
+        params = [("id", f"lte.{max_id}"), ("created_at", f"lt.{_timestamp(before)}"), ("select", "id")]
+        return len(self._request("DELETE", "pings", params, prefer="return=representation"))
+
+    def rollup_buckets(self, service_ids, resolution, since, until):
+        buckets = set()
+        for chunk in _chunks(sorted(set(service_ids))):
+            params = [
+                ("select", "service_id,bucket_start"),
+                ("service_id", f"in.({','.join(str(i) for i in chunk)})"),
+                ("resolution", f"eq.{resolution}"),
+                ("bucket_start", f"gte.{_timestamp(since)}"),
+                ("bucket_start", f"lte.{_timestamp(until)}"),
+            ]
+            buckets.update((r["service_id"], _timestamp(r["bucket_start"]))
+                           for r in self._request("GET", "ping_rollups", params))
+        return buckets
+
+    def delete_rollups(self, service_ids, resolution, before):
+        deleted = 0
+        for chunk in _chunks(sorted(set(service_ids))):
+            params = [
+                ("service_id", f"in.({','.join(str(i) for i in chunk)})"),
+                ("resolution", f"eq.{resolution}"),
+                ("bucket_start", f"lt.{_timestamp(before)}"),
+                ("select", "service_id"),
+            ]
+            deleted += len(self._request("DELETE", "ping_rollups", params, prefer="return=representation"))
+        return deleted
+
+    def heartbeat_worker(self, worker_id, expires_at):
+        self._request("POST", "checker_workers", {"on_conflict": "worker_id"},
+                      json={"worker_id": worker_id, "expires_at": expires_at},
+                      prefer="resolution=merge-duplicates,return=minimal")
+
+    def live_workers(self):
+        rows = self._request("GET", "checker_workers", {"select": "worker_id", "expires_at": f"gt.{utcnow()}"})
+        return [row["worker_id"] for row in rows]
+
+    def remove_worker(self, worker_id):
+        self._request("DELETE", "checker_workers", {"worker_id": f"eq.{worker_id}"}, prefer="return=minimal")
+
+    def claim_shards(self, shards, worker_id, expires_at):
+        if not shards:
+            return []
+        shard_list = ",".join(str(s) for s in shards)
+        # Crée les leases manquants (libres), puis un PATCH conditionnel:
+        # PostgreSQL ne met à jour que les lignes libres, expirées ou à nous.
+        self._request("POST", "shard_leases", {"on_conflict": "shard"},
+                      json=[{"shard": s, "owner": "", "expires_at": LEASE_EPOCH} for s in shards],
+                      prefer="resolution=ignore-duplicates,return=minimal")
+        rows = self._request(
+            "PATCH", "shard_leases",
+            {"shard": f"in.({shard_list})", "or": f'(owner.eq."{worker_id}",expires_at.lt."{utcnow()}")'},
+            json={"owner": worker_id, "expires_at": expires_at}, prefer="return=representation"
+        )
+        return sorted(row["shard"] for row in rows)
+
+    def release_shards(self, shards, worker_id):
+        if not shards:
+            return
+        self._request("PATCH", "shard_leases",
+                      {"shard": f"in.({','.join(str(s) for s in shards)})", "owner": f"eq.{worker_id}"},
+                      json={"owner": "", "expires_at": LEASE_EPOCH}, prefer="return=minimal")
+
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS services (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    owner_id TEXT NOT NULL,
+    guild_id INTEGER,
+    name TEXT NOT NULL,
+    url TEXT NOT NULL,
+    status TEXT DEFAULT 'online',
+    check_interval INTEGER,
+    alert_channel_id INTEGER,
+    probe_mode TEXT,
+    accepted_status TEXT,
+    keyword TEXT,
+    last_check TEXT,
+    created_at TEXT,
+    UNIQUE(owner_id, name)
+);
+CREATE INDEX IF NOT EXISTS idx_owner_id ON services(owner_id);
+CREATE INDEX IF NOT EXISTS idx_guild_id ON services(guild_id);
+
+CREATE TABLE IF NOT EXISTS pings (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    service_id INTEGER REFERENCES services(id) ON DELETE CASCADE,
+    owner_id TEXT,
+    service_name TEXT,
+    status TEXT,
+    latency_ms INTEGER,
+    dns_ms INTEGER,
+    connect_ms INTEGER,
+    tls_ms INTEGER,
+    ttfb_ms INTEGER,
+    vantages TEXT,
+    created_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_pings_service_created ON pings(service_id, created_at);
+
+CREATE TABLE IF NOT EXISTS ping_rollups (
+    service_id INTEGER NOT NULL REFERENCES services(id) ON DELETE CASCADE,
+    resolution TEXT NOT NULL,
+    bucket_start TEXT NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    failures INTEGER NOT NULL DEFAULT 0,
+    latency_min INTEGER,
+    latency_max INTEGER,
+    latency_sum INTEGER NOT NULL DEFAULT 0,
+    sketch TEXT,
+    PRIMARY KEY (service_id, resolution, bucket_start)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS maintenance_windows (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    service_id INTEGER NOT NULL REFERENCES services(id) ON DELETE CASCADE,
+    starts_at TEXT NOT NULL,
+    ends_at TEXT NOT NULL,
+    reason TEXT,
+    created_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_maintenance_service ON maintenance_windows(service_id, starts_at);
+
+CREATE TABLE IF NOT EXISTS checker_workers (
+    worker_id TEXT PRIMARY KEY,
+    expires_at TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS shard_leases (
+    shard INTEGER PRIMARY KEY,
+    owner TEXT NOT NULL DEFAULT '',
+    expires_at TEXT NOT NULL
+);
+"""
+
+
+_SQL_TABLE = re.compile(r"\b(?:FROM|INTO|UPDATE)\s+(\w+)", re.IGNORECASE)
+
+SQLITE_ADDED_COLUMNS = [
+    ("services", "alert_channel_id", "INTEGER"),
+    ("services", "probe_mode", "TEXT"),
+    ("services", "accepted_status", "TEXT"),
+    ("services", "keyword", "TEXT"),
+    ("pings", "vantages", "TEXT"),
+]
+
+
+class SQLiteStorage(Storage):
+    """Backend SQLite local en mode WAL (lectures concurrentes, une écriture à la fois)"""
+
+    def __init__(self, path=SQLITE_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        with self._write_lock:
+            conn = self._conn()
+            conn.executescript(SQLITE_SCHEMA)
+            # Colonnes ajoutées après coup sur des bases existantes
+            for table, column, ddl in SQLITE_ADDED_COLUMNS:
+                if column not in {row["name"] for row in conn.execute(f"PRAGMA table_info({table})")}:
+                    conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}")
+
+    def _conn(self):
+        # Une connexion par thread: sqlite3 ne partage pas une connexion entre threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _labels(sql):
+        """Table et verbe d'une requête, pour les métriques"""
+        match = _SQL_TABLE.search(sql)
+        return {"backend": "sqlite", "table": match.group(1) if match else "?", "verb": sql.split(None, 1)[0].upper()}
+
+    def _read(self, sql, args=()):
+        labels = self._labels(sql)
+        try:
+            with timed(STORAGE_SECONDS, **labels):
+                return [dict(row) for row in self._conn().execute(sql, args)]
+        except sqlite3.Error as e:
+            STORAGE_ERRORS.inc(**labels)
+            raise StorageError(str(e)) from e
+
+    def _write(self, sql, args=(), many=False):
+        labels = self._labels(sql)
+        try:
+            with self._write_lock, timed(STORAGE_SECONDS, **labels):
+                conn = self._conn()
+                if many:
+                    conn.execute("BEGIN")
+                    try:
+                        conn.executemany(sql, args)
+                        conn.execute("COMMIT")
+                    except Exception:
+                        conn.execute("ROLLBACK")
+                        raise
+                    return []
+                return [dict(row) for row in conn.execute(sql, args)]
+        except sqlite3.Error as e:
+            STORAGE_ERRORS.inc(**labels)
+            raise StorageError(str(e)) from e
+
+    @staticmethod
+    def _where(service_id=None, owner_id=None, name=None):
+        clauses, args = [], []
+        for column, value in (("id", service_id), ("owner_id", owner_id), ("name", name)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                args.append(str(value) if column == "owner_id" else value)
+        if not clauses:
+            raise StorageError("filtre obligatoire")
+        return " AND ".join(clauses), args
+
+    def list_services(self, owner_id=None, shards=None):
+        clauses, args = [], []
+        if owner_id is not None:
+            clauses.append("owner_id = ?")
+            args.append(str(owner_id))
+        if shards is not None:
+            if not shards:
+                return []
+            clauses.append(f"id % {SHARD_COUNT} IN ({', '.join('?' for _ in shards)})")
+            args.extend(shards)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        return self._read(f"SELECT * FROM services{where} ORDER BY id", args)
+
+    def get_service(self, service_id):
+        rows = self._read("SELECT * FROM services WHERE id = ?", (service_id,))
+        return rows[0] if rows else None
+
+    def add_service(self, service):
+        row = {"status": "online", "created_at": utcnow(), **service}
+        columns = [c for c in SERVICE_COLUMNS if c in row and c != "id"]
+        if "owner_id" in row:
+            row["owner_id"] = str(row["owner_id"])
+        placeholders = ", ".join("?" for _ in columns)
+        rows = self._write(
+            f"INSERT INTO services ({', '.join(columns)}) VALUES ({placeholders}) RETURNING *",
+            [row[c] for c in columns]
+        )
+        return rows[0]
+
+    def add_services(self, services):
+        if not services:
+            return []
+        now = utcnow()
+        labels = {"backend": "sqlite", "table": "services", "verb": "INSERT"}
+        created = []
+        try:
+            with self._write_lock, timed(STORAGE_SECONDS, **labels):
+                conn = self._conn()
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    for service in services:
+                        row = {"status": "online", "created_at": now, **service}
+                        row["owner_id"] = str(row["owner_id"])
+                        columns = [c for c in SERVICE_COLUMNS if c in row and c != "id"]
+                        created.extend(dict(r) for r in conn.execute(
+                            f"INSERT INTO services ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)}) "
+                            "ON CONFLICT(owner_id, name) DO NOTHING RETURNING *",
+                            [row[c] for c in columns]
+                        ))
+                    conn.execute("COMMIT")
+                except Exception:
+                    conn.execute("ROLLBACK")
+                    raise
+        except sqlite3.Error as e:
+            STORAGE_ERRORS.inc(**labels)
+            raise StorageError(str(e)) from e
+        return created
+
+    def list_services_page(self, owner_id, after_id=0, limit=1000):
+        return self._read("SELECT * FROM services WHERE owner_id = ? AND id > ? ORDER BY id LIMIT ?",
+                          (str(owner_id), after_id, limit))
+
+    def update_service(self, fields, service_id=None, owner_id=None, name=None):
+        where, args = self._where(service_id, owner_id, name)
+        columns = [c for c in fields if c in SERVICE_COLUMNS and c != "id"]
+        if not columns:
+            return []
+        assignments = ", ".join(f"{c} = ?" for c in columns)
+        return self._write(f"UPDATE services SET {assignments} WHERE {where} RETURNING *",
+                           [fields[c] for c in columns] + args)
+
+    def delete_service(self, service_id=None, owner_id=None, name=None):
+        where, args = self._where(service_id, owner_id, name)
+        return self._write(f"DELETE FROM services WHERE {where} RETURNING *", args)
+
+    def set_status(self, service_ids, status, last_check=None):
+        last_check = last_check or utcnow()
+        for chunk in _chunks(service_ids):
+            placeholders = ", ".join("?" for _ in chunk)
+            self._write(f"UPDATE services SET status = ?, last_check = ? WHERE id IN ({placeholders})",
+                        [status, last_check, *chunk])
+
+    def count_by_status(self):
+        counts = {"online": 0, "down": 0, "total": 0}
+        for row in self._read("SELECT status, COUNT(*) AS n FROM services GROUP BY status"):
+            if row["status"] in counts:
+                counts[row["status"]] = row["n"]
+            counts["total"] += row["n"]
+        return counts
+
+    def insert_pings(self, pings):
+        if not pings:
+            return
+        columns = [c for c in PING_COLUMNS if c != "id"]
+        now = utcnow()
+        self._write(
+            f"INSERT INTO pings ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})",
+            [[_timestamp(p.get(c)) or now if c == "created_at" else p.get(c) for c in columns] for p in pings],
+            many=True
+        )
+
+    def get_pings(self, service_id, since=None, until=None, limit=100, newest=False):
+        sql, args = "SELECT * FROM pings WHERE service_id = ?", [service_id]
+        if since is not None:
+            sql += " AND created_at >= ?"
+            args.append(_timestamp(since))
+        if until is not None:
+            sql += " AND created_at < ?"
+            args.append(_timestamp(until))
+        sql += " ORDER BY created_at DESC" if newest else " ORDER BY created_at"
+        if limit is not None:
+            sql += " LIMIT ?"
+            args.append(limit)
+        rows = self._read(sql, args)
+        return rows[::-1] if newest else rows
+
+    def merge_rollups(self, rollups):
+        if not rollups:
+            return
+        try:
+            with self._write_lock:
+                conn = self._conn()
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    for rollup in rollups:
+                        key = (rollup["service_id"], rollup["resolution"], rollup["bucket_start"])
+                        row = conn.execute(
+                            "SELECT * FROM ping_rollups WHERE service_id = ? AND resolution = ? AND bucket_start = ?", key
+                        ).fetchone()
+                        if row is None:
+                            row = empty_rollup(*key)
+                        else:
+                            row = dict(row)
+                            row["sketch"] = json.loads(row["sketch"] or "{}")
+                        merge_rollup(row, rollup)
+                        conn.execute(
+                            f"INSERT OR REPLACE INTO ping_rollups ({', '.join(ROLLUP_COLUMNS)}) "
+                            f"VALUES ({', '.join('?' for _ in ROLLUP_COLUMNS)})",
+                            [json.dumps(row[c]) if c == "sketch" else row[c] for c in ROLLUP_COLUMNS]
+                        )
+                    conn.execute("COMMIT")
+                except Exception:
+                    conn.execute("ROLLBACK")
+                    raise
+        except sqlite3.Error as e:
+            raise StorageError(str(e)) from e
+
+    def get_rollups(self, service_id, resolution, since=None, until=None, limit=None):
+        sql, args = "SELECT * FROM ping_rollups WHERE service_id = ? AND resolution = ?", [service_id, resolution]
+        if since is not None:
+            sql += " AND bucket_start >= ?"
+            args.append(_timestamp(since))
+        if until is not None:
+            sql += " AND bucket_start < ?"
+            args.append(_timestamp(until))
+        sql += " ORDER BY bucket_start"
+        if limit is not None:
+            sql += " LIMIT ?"
+            args.append(limit)
+        rows = self._read(sql, args)
+        for row in rows:
+            row["sketch"] = json.loads(row["sketch"] or "{}")
+        return rows
+
+    def add_maintenance(self, window):
+        row = {"created_at": utcnow(), **window,
+               "starts_at": _timestamp(window["starts_at"]), "ends_at": _timestamp(window["ends_at"])}
+        columns = list(row)
+        rows = self._write(
+            f"INSERT INTO maintenance_windows ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)}) RETURNING *",
+            [row[c] for c in columns]
+        )
+        return rows[0]
+
+    def get_maintenance(self, service_id, since, until):
+        return self._read(
+            "SELECT * FROM maintenance_windows WHERE service_id = ? AND starts_at < ? AND ends_at > ? ORDER BY starts_at",
+            (service_id, _timestamp(until), _timestamp(since))
+        )
+
+    def old_pings(self, before, limit):
+        # Parcours par clé primaire: les plus anciens pings sont en tête, sans index sur created_at
+        return self._read("SELECT * FROM pings WHERE created_at < ? ORDER BY id LIMIT ?", (_timestamp(before), limit))
+
+    def delete_pings(self, max_id, before):
+        return len(self._write("DELETE FROM pings WHERE id <= ? AND created_at < ? RETURNING id",
+                               (max_id, _timestamp(before))))
+
+    def rollup_buckets(self, service_ids, resolution, since, until):
+        buckets = set()
+        for chunk in _chunks(sorted(set(service_ids))):
+            placeholders = ", ".join("?" for _ in chunk)
+            rows = self._read(
+                f"SELECT service_id, bucket_start FROM ping_rollups WHERE service_id IN ({placeholders}) "
+                "AND resolution = ? AND bucket_start >= ? AND bucket_start <= ?",
+                [*chunk, resolution, _timestamp(since), _timestamp(until)]
+            )
+            buckets.update((r["service_id"], r["bucket_start"]) for r in rows)
+        return buckets
+
+    def delete_rollups(self, service_ids, resolution, before):
+        deleted = 0
+        for chunk in _chunks(sorted(set(service_ids))):
+            placeholders = ", ".join("?" for _ in chunk)
+            deleted += len(self._write(
+                f"DELETE FROM ping_rollups WHERE service_id IN ({placeholders}) "
+                "AND resolution = ? AND bucket_start < ? RETURNING service_id",
+                [*chunk, resolution, _timestamp(before)]
+            ))
+        return deleted
+
+    def storage_bytes(self):
+        # Pages utilisées: les pages libérées par un DELETE restent dans le fichier et sont réutilisées
+        page_size, pages, free = (self._read(f"PRAGMA {name}")[0][name]
+                                  for name in ("page_size", "page_count", "freelist_count"))
+        return (pages - free) * page_size
+
+    def heartbeat_worker(self, worker_id, expires_at):
+        self._write("INSERT INTO checker_workers (worker_id, expires_at) VALUES (?, ?) "
+                    "ON CONFLICT(worker_id) DO UPDATE SET expires_at = excluded.expires_at",
+                    (worker_id, expires_at))
+
+    def live_workers(self):
+        rows = self._read("SELECT worker_id FROM checker_workers WHERE expires_at > ?", (utcnow(),))
+        return [row["worker_id"] for row in rows]
+
+    def remove_worker(self, worker_id):
+        self._write("DELETE FROM checker_workers WHERE worker_id = ?", (worker_id,))
+
+    def claim_shards(self, shards, worker_id, expires_at):
+        if not shards:
+            return []
+        placeholders = ", ".join("?" for _ in shards)
+        try:
+            with self._write_lock:
+                conn = self._conn()
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    conn.executemany("INSERT OR IGNORE INTO shard_leases (shard, owner, expires_at) VALUES (?, '', ?)",
+                                     [(s, LEASE_EPOCH) for s in shards])
+                    conn.execute(
+                        f"UPDATE shard_leases SET owner = ?, expires_at = ? "
+                        f"WHERE shard IN ({placeholders}) AND (owner = ? OR expires_at < ?)",
+                        [worker_id, expires_at, *shards, worker_id, utcnow()]
+                    )
+                    rows = conn.execute(
+                        f"SELECT shard FROM shard_leases WHERE shard IN ({placeholders}) AND owner = ?",
+                        [*shards, worker_id]
+                    ).fetchall()
+                    conn.execute("COMMIT")
+                except Exception:
+                    conn.execute("ROLLBACK")
+                    raise
+        except sqlite3.Error as e:
+            raise StorageError(str(e)) from e
+        return sorted(row["shard"] for row in rows)
+
+    def release_shards(self, shards, worker_id):
+        if not shards:
+            return
+        placeholders = ", ".join("?" for _ in shards)
+        self._write(f"UPDATE shard_leases SET owner = '', expires_at = ? WHERE shard IN ({placeholders}) AND owner = ?",
+                    [LEASE_EPOCH, *shards, worker_id])
+
+
+_storage = None
+_storage_lock = threading.Lock()
+
+
+def get_storage():
+    """Backend partagé, choisi par STORAGE_BACKEND (supabase ou sqlite)"""
+    global _storage
+    with _storage_lock:
+        if _storage is None:
+            if STORAGE_BACKEND == "sqlite":
+                _storage = SQLiteStorage()
+            else:
+                _storage = SupabaseStorage()
+        return _storage
@@ -0,0 +1,98 @@
+import asyncio
+import threading
+
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+
+import aio_server
+import app as web
+from ringbuffer import RecentResults
+from storage import SQLiteStorage
+
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    storage = SQLiteStorage(str(tmp_path / "aio.db"))
+    monkeypatch.setattr(web, "storage", storage)
+    # Buffers de résultats propres au test: ceux du module sont partagés
+    monkeypatch.setattr(web, "recent", RecentResults())
+    # create_app() active le flux SSE sur l'app Flask partagée
+    monkeypatch.setitem(web.app.config, "LIVE_STREAM", False)
+    web.services_cache.clear()
+    yield storage
+    web.services_cache.clear()
+
+
+def session_cookie(user_id):
+    serializer = web.app.session_interface.get_signing_serializer(web.app)
+    return {web.app.config["SESSION_COOKIE_NAME"]: serializer.dumps({"user_id": user_id})}
+
+
+def get(path, user_id=None, headers=None):
+    async def run():
+        async with TestClient(TestServer(aio_server.create_app())) as client:
+            cookies = session_cookie(user_id) if user_id is not None else None
+            r = await client.get(path, cookies=cookies, headers=headers, allow_redirects=False)
+            return r.status, await r.text()
+
+    return asyncio.run(run())
+
+
+def test_logs_need_a_session_and_ownership(storage):
+    service = storage.add_service({"name": "s", "url": "https://example.com", "owner_id": "1", "guild_id": 0})
+    path = f"/api/logs/{service['id']}"
+    assert get(path)[0] == 302
+    assert get(path, "2")[0] == 403
+    assert get("/api/logs/999", "1")[0] == 404
+    assert get(path, "1") == (200, "[]")
+
+
+def test_services_etag_is_matched_exactly(storage):
+    storage.add_service({"name": "s", "url": "https://example.com", "owner_id": "1", "guild_id": 0})
+
+    async def run():
+        async with TestClient(TestServer(aio_server.create_app())) as client:
+            cookies = session_cookie("1")
+            first = await client.get("/api/services", cookies=cookies)
+            await first.read()
+            etag = first.headers["ETag"]
+            statuses = []
+            for header in (etag, f"W/{etag}", "*", f'"other", {etag}', f"x{etag}", f'"{etag}"'):
+                r = await client.get("/api/services", cookies=cookies, headers={"If-None-Match": header})
+                await r.read()
+                statuses.append(r.status)
+            return statuses
+
+    assert asyncio.run(run()) == [304, 304, 304, 304, 200, 200]
+
+
+def test_other_routes_go_through_the_wsgi_bridge(storage):
+    status, body = get("/api/cache/stats", "1")
+    assert status == 200
+    assert '"name"' in body
+    assert get("/api/cache/stats")[0] == 403
+
+
+def test_bridge_thread_stops_when_the_client_leaves(monkeypatch):
+    closed = threading.Event()
+
+    def endless(environ, start_response):
+        start_response("200 OK", [("Content-Type", "text/plain")])
+        try:
+            while True:
+                yield b"x" * 1024
+        finally:
+            closed.set()
+
+    monkeypatch.setattr(web.app, "wsgi_app", endless)
+    monkeypatch.setitem(web.app.config, "LIVE_STREAM", False)
+
+    async def run():
+        async with TestClient(TestServer(aio_server.create_app())) as client:
+            r = await client.get("/export")
+            assert await r.content.read(4096)
+            r.close()
+        # Le serveur est arrêté et sa boucle va être fermée: le thread ne doit pas rester bloqué
+        return await asyncio.to_thread(closed.wait, 5)
+
+    assert asyncio.run(run())
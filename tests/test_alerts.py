@@ -0,0 +1,147 @@
+import asyncio
+
+from alerts import MAX_DESCRIPTION, AlertDispatcher, TokenBucket
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def service(i, channel=100):
+    return {"id": i, "name": f"s{i}", "alert_channel_id": channel, "guild_id": 1}
+
+
+def test_token_bucket_refills_and_blocks():
+    clock = Clock()
+    bucket = TokenBucket(rate=2, period=10, clock=clock)
+    assert bucket.take() and bucket.take()
+    assert not bucket.take()
+    clock.now = 5
+    assert bucket.take()
+    bucket.block(30)
+    clock.now = 30
+    assert not bucket.take()
+    clock.now = 35
+    assert bucket.take()
+
+
+def test_round_trip_within_the_window_is_not_reported():
+    dispatcher = AlertDispatcher(token="t")
+    dispatcher.notify(service(1), "online", "down")
+    dispatcher.notify(service(1), "down", "online")
+    assert dispatcher.pending() == 0
+    dispatcher.notify(service(2), "online", "down")
+    dispatcher.notify(service(2), "down", "down")
+    assert dispatcher.pending() == 1
+
+
+def test_disabled_without_token():
+    dispatcher = AlertDispatcher(token="")
+    dispatcher.notify(service(1), "online", "down")
+    assert dispatcher.pending() == 0
+
+
+def test_one_message_per_channel():
+    dispatcher = AlertDispatcher(token="t", rate=5, period=10)
+    sent = []
+
+    async def send(channel_id, bucket, embed):
+        sent.append((channel_id, embed))
+        return True
+
+    dispatcher._send = send
+    for i in range(3):
+        dispatcher.notify(service(i), "online", "down")
+    dispatcher.notify(service(9, channel=200), "down", "online", latency_ms=42)
+    asyncio.run(dispatcher.flush())
+    assert sorted(channel for channel, _ in sent) == ["100", "200"]
+    embeds = dict(sent)
+    assert embeds["100"]["title"] == "🚨 3 service(s) down"
+    assert embeds["200"]["description"] == "🟢 **s9** est de nouveau en ligne (42ms)"
+    assert dispatcher.pending() == 0
+
+
+def test_failed_send_is_retried_merged_with_new_transitions():
+    dispatcher = AlertDispatcher(token="t", rate=5, period=10)
+    results = [False, True]
+    sent = []
+
+    async def send(channel_id, bucket, embed):
+        sent.append(embed)
+        return results.pop(0)
+
+    dispatcher._send = send
+    dispatcher.notify(service(1), "online", "down")
+    asyncio.run(dispatcher.flush())
+    dispatcher.notify(service(2), "online", "down")
+    asyncio.run(dispatcher.flush())
+    assert sent[-1]["title"] == "🚨 2 service(s) down"
+
+
+def test_long_batches_are_truncated():
+    dispatcher = AlertDispatcher(token="t")
+    embed = dispatcher._embed([({"name": f"service-{i:04d}"}, "online", "down", None) for i in range(500)])
+    assert len(embed["description"]) <= MAX_DESCRIPTION
+    assert "autres" in embed["description"].splitlines()[-1]
+
+
+class FakeResponse:
+    def __init__(self, status, data):
+        self.status = status
+        self.data = data
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def json(self):
+        return self.data
+
+
+class FakeSession:
+    def __init__(self):
+        self.calls = []
+
+    def get(self, url, **kwargs):
+        self.calls.append(("GET", url, kwargs))
+        return FakeResponse(200, {"system_channel_id": None})
+
+    def post(self, url, **kwargs):
+        self.calls.append(("POST", url, kwargs))
+        return FakeResponse(200, {"id": "555"})
+
+
+def test_dashboard_services_are_sent_to_the_owner_by_dm():
+    dispatcher = AlertDispatcher(token="t")
+    dispatcher.session = FakeSession()
+    sent = []
+
+    async def send(channel_id, bucket, embed):
+        sent.append(channel_id)
+        return True
+
+    dispatcher._send = send
+    dispatcher.notify({"id": 1, "name": "web", "guild_id": 0, "owner_id": "42"}, "online", "down")
+    dispatcher.notify({"id": 2, "name": "web2", "guild_id": 0, "owner_id": "42"}, "online", "down")
+    asyncio.run(dispatcher.flush())
+    assert sent == ["555"]
+    assert dispatcher.session.calls == [("POST", "https://discord.com/api/v10/users/@me/channels",
+                                         {"json": {"recipient_id": "42"}})]
+
+
+def test_alerts_without_destination_are_counted_and_logged(capsys):
+    dispatcher = AlertDispatcher(token="t")
+    dispatcher.session = FakeSession()
+    # Serveur sans salon système
+    dispatcher.notify({"id": 1, "name": "api", "guild_id": 7, "owner_id": "42"}, "online", "down")
+    dispatcher.notify({"id": 2, "name": "orphan", "guild_id": 0, "owner_id": None}, "online", "down")
+    asyncio.run(dispatcher.flush())
+    assert dispatcher.dropped == 2
+    assert dispatcher.pending() == 0
+    assert capsys.readouterr().out.count("ignorée(s)") == 2
@@ -0,0 +1,74 @@
+import asyncio
+from types import SimpleNamespace
+
+from benchmark import (
+    STUB_PORT, BackgroundLoop, PostgrestStub, TargetFarm, bench_sweep, make_services, percentile, summary_ms,
+)
+from probe import ProbeEngine
+from storage import SupabaseStorage
+
+
+def test_percentiles_and_summary():
+    assert percentile([], 50) is None
+    assert percentile([3, 1, 2], 50) == 2
+    assert percentile(list(range(101)), 99) == 99
+    assert summary_ms([0.001, 0.003]) == {"p50_ms": 1.0, "p99_ms": 3.0, "max_ms": 3.0, "mean_ms": 2.0}
+
+
+def test_farm_serves_one_host_per_address_and_injects_errors():
+    async def run(error_rate):
+        farm = TargetFarm(hosts=2, latency_ms=1, jitter_ms=0, error_rate=error_rate, hang_rate=0)
+        engine = ProbeEngine(concurrency=4, per_host=2, timeout=2)
+        await farm.start()
+        try:
+            results = [await engine.probe({"id": i, "url": farm.url(i)}) for i in range(4)]
+        finally:
+            await engine.close()
+            await farm.stop()
+        return farm, {r["service"]["url"].split("/")[2] for r in results}, {r["status"] for r in results}
+
+    farm, hosts, statuses = asyncio.run(run(0))
+    assert farm.requests == 4
+    assert hosts == set(f"{host}:18080" for host in farm.host_names())
+    assert statuses == {"online"}
+    assert asyncio.run(run(1))[2] == {"down"}
+
+
+def test_sweep_against_the_stub_writes_pings_and_rollups(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    stub = PostgrestStub()
+    farm = TargetFarm(hosts=2, latency_ms=1, jitter_ms=0, error_rate=0.5, hang_rate=0)
+    farm_loop, stub_loop = BackgroundLoop("farm"), BackgroundLoop("postgrest-stub")
+    try:
+        farm_loop.run(farm.start())
+        stub_loop.run(stub.start())
+        stub.reset(make_services(20, farm))
+        storage = SupabaseStorage(url=f"http://127.0.0.1:{STUB_PORT}", key="benchmark")
+        args = SimpleNamespace(concurrency=10, per_host=4, timeout=2)
+        result = asyncio.run(bench_sweep(storage, stub, args))
+    finally:
+        stub_loop.run(stub.stop())
+        farm_loop.run(farm.stop())
+        stub_loop.stop()
+        farm_loop.stop()
+    assert "Erreur" not in capsys.readouterr().out
+    assert result["pings_written"] == 20
+    assert result["storage_calls"]["POST rpc/merge_rollups"] >= 1
+    rollups = [r for r in stub.tables["ping_rollups"] if r["resolution"] == "1m"]
+    assert sum(r["count"] for r in rollups) == 20
+    assert sum(r["failures"] for r in rollups) == result["down"]
+
+
+def test_status_counts_are_read_in_one_request():
+    stub = PostgrestStub()
+    loop = BackgroundLoop("postgrest-stub")
+    try:
+        loop.run(stub.start())
+        stub.reset([{"name": "a", "status": "online"}, {"name": "b", "status": "down"},
+                    {"name": "c", "status": "online"}, {"name": "d", "status": None}])
+        counts = SupabaseStorage(url=f"http://127.0.0.1:{STUB_PORT}", key="benchmark").count_by_status()
+    finally:
+        loop.run(stub.stop())
+        loop.stop()
+    assert counts == {"online": 2, "down": 1, "total": 4}
+    assert stub.calls == {"GET service_status_counts": 1}
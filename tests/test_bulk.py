@@ -0,0 +1,69 @@
+import io
+
+import pytest
+
+from bulk import MAX_NAME_LENGTH, export_services, import_services, parse_service, read_rows
+from storage import SQLiteStorage
+
+
+def test_parse_service_normalizes_values():
+    service = parse_service({"name": " api ", "url": "https://a", "check_interval": "60",
+                             "probe_mode": "", "extra": "ignored"})
+    assert service == {"name": "api", "url": "https://a", "check_interval": 60,
+                       "probe_mode": None, "accepted_status": None, "keyword": None}
+
+
+@pytest.mark.parametrize("row, message", [
+    ({"url": "https://a"}, "name manquant"),
+    ({"name": "x" * (MAX_NAME_LENGTH + 1), "url": "https://a"}, "name trop long"),
+    ({"name": "a"}, "url manquante"),
+    ({"name": "a", "url": "https://a", "check_interval": "soon"}, "check_interval invalide"),
+    ({"name": "a", "url": "https://a", "check_interval": "5"}, "check_interval doit être"),
+    ({"name": "a", "url": "https://a", "probe_mode": "ftp"}, "mode inconnu"),
+    ({"name": "a", "url": "https://a", "accepted_status": "700"}, "plage de statuts"),
+    ({"name": "a", "url": "https://a", "probe_mode": "head", "keyword": "ok"}, "mot-clé"),
+    ({"name": "a", "url": ":443", "probe_mode": "tcp"}, "hôte manquant"),
+])
+def test_parse_service_rejects_invalid_rows(row, message):
+    with pytest.raises(ValueError, match=message):
+        parse_service(row)
+
+
+def test_read_rows_reports_bad_json_lines():
+    rows = list(read_rows(io.StringIO('{"name": "a"}\n\nnot json\n[1]\n'), "ndjson"))
+    assert rows[0] == (1, {"name": "a"})
+    assert [n for n, _ in rows[1:]] == [3, 4]
+    assert all(isinstance(r, ValueError) for _, r in rows[1:])
+
+
+def test_import_then_export_roundtrip(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / "bulk.db"))
+    storage.add_service({"name": "taken", "url": "https://t", "owner_id": "1", "guild_id": 0})
+    csv_file = io.StringIO(
+        "name,url,check_interval\n"
+        "a,https://a,60\n"
+        "b,https://b,\n"
+        "a,https://a2,\n"
+        "taken,https://t,\n"
+        ",https://c,\n"
+    )
+    created = []
+    results = list(import_services(storage, read_rows(csv_file, "csv"), {"owner_id": "1", "guild_id": 0},
+                                   on_created=created.extend, chunk_size=2))
+    summary = results.pop()["summary"]
+    assert summary == {"created": 2, "exists": 1, "duplicate": 1, "invalid": 1, "error": 0}
+    assert sorted((r["line"], r["result"]) for r in results) == [
+        (2, "created"), (3, "created"), (4, "duplicate"), (5, "exists"), (6, "invalid")]
+    assert sorted(row["name"] for row in created) == ["a", "b"]
+
+    exported = "".join(export_services(storage, "1", "csv", page_size=1)).splitlines()
+    assert exported[0].startswith("id,name,url")
+    assert sorted(line.split(",")[1] for line in exported[1:]) == ["a", "b", "taken"]
+
+
+def test_import_stops_at_max_rows(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / "bulk.db"))
+    rows = ((n, {"name": f"s{n}", "url": "https://a"}) for n in range(1, 10))
+    results = list(import_services(storage, rows, {"owner_id": "1", "guild_id": 0}, max_rows=3))
+    assert results[-1]["summary"]["created"] == 3
+    assert [r["result"] for r in results[:-1]].count("invalid") == 1
@@ -0,0 +1,49 @@
+from cache import TTLCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_entries_expire_after_ttl():
+    clock = Clock()
+    cache = TTLCache("test-ttl", ttl=10, clock=clock)
+    cache.set("a", 1)
+    clock.now = 9.9
+    assert cache.get("a") == 1
+    clock.now = 10
+    assert cache.get("a") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_least_recently_used_is_evicted():
+    cache = TTLCache("test-lru", ttl=60, maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    assert cache.evictions == 1
+
+
+def test_get_or_load_caches_falsy_values_and_invalidate():
+    cache = TTLCache("test-load", ttl=60)
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return []
+
+    assert cache.get_or_load("k", loader) == []
+    assert cache.get_or_load("k", loader) == []
+    assert calls == [1]
+    cache.invalidate("k")
+    cache.get_or_load("k", loader)
+    assert calls == [1, 1]
+    stats = cache.stats()
+    assert (stats["hits"], stats["invalidations"]) == (1, 1)
@@ -0,0 +1,52 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import discord_bot
+from storage import SQLiteStorage
+
+
+class Response:
+    def __init__(self):
+        self.messages = []
+
+    async def send_message(self, content=None, **kwargs):
+        self.messages.append(content)
+
+
+def interaction(user_id="1"):
+    return SimpleNamespace(user=SimpleNamespace(id=user_id), response=Response())
+
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    storage = SQLiteStorage(str(tmp_path / "bot.db"))
+    monkeypatch.setattr(discord_bot, "storage", storage)
+    return storage
+
+
+def set_probe(name, mode, **options):
+    ctx = interaction()
+    asyncio.run(discord_bot.set_probe.callback(ctx, name, mode, **options))
+    return ctx.response.messages[-1]
+
+
+def add(storage, name, url):
+    return storage.add_service({"name": name, "url": url, "owner_id": "1", "guild_id": 0})
+
+
+def test_set_probe_checks_the_stored_url(storage):
+    service = add(storage, "no-host", "https://")
+    assert set_probe("no-host", "tcp").startswith("❌ hôte manquant")
+    assert storage.get_service(service["id"])["probe_mode"] is None
+
+
+def test_set_probe_updates_a_valid_service(storage):
+    service = add(storage, "db", "db.example.com:5432")
+    assert set_probe("db", "tcp").startswith("✅")
+    assert storage.get_service(service["id"])["probe_mode"] == "tcp"
+
+
+def test_set_probe_unknown_service(storage):
+    assert set_probe("absent", "head") == "❌ Service 'absent' non trouvé"
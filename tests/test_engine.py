@@ -0,0 +1,86 @@
+import asyncio
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from probe import ProbeEngine
+
+
+def service(url, i=1, **extra):
+    return {"id": i, "name": f"s{i}", "url": url, **extra}
+
+
+async def with_server(handler, body):
+    app = web.Application()
+    app.router.add_route("*", "/{tail:.*}", handler)
+    async with TestServer(app) as server:
+        engine = ProbeEngine(concurrency=4, per_host=2, timeout=5)
+        try:
+            return await body(engine, str(server.make_url("/")))
+        finally:
+            await engine.close()
+
+
+async def empty(request):
+    return web.Response(status=204)
+
+
+def test_session_is_shared_and_connections_kept_alive():
+    async def body(engine, url):
+        session = await engine.start()
+        first = await engine.probe(service(url, probe_mode="head"))
+        second = await engine.probe(service(url, i=2, probe_mode="head"))
+        assert await engine.start() is session
+        return first, second
+
+    first, second = asyncio.run(with_server(empty, body))
+    assert first["status"] == second["status"] == "online"
+    assert not first["phases"]["reused"]
+    assert second["phases"]["reused"]
+
+
+def test_close_then_start_opens_a_new_session():
+    async def run():
+        engine = ProbeEngine()
+        session = await engine.start()
+        await engine.close()
+        assert session.closed and engine.session is None
+        reopened = await engine.start()
+        await engine.close()
+        return session is not reopened
+
+    assert asyncio.run(run())
+
+
+async def pages(request):
+    if request.path == "/moved":
+        raise web.HTTPFound("/")
+    if request.method == "HEAD":
+        return web.Response(status=405)
+    response = web.StreamResponse()
+    await response.prepare(request)
+    # Mot-clé coupé entre deux morceaux
+    await response.write(b"x" * 10000 + b"all sys")
+    await response.write(b"tems go" + b"y" * 10000)
+    return response
+
+
+def probe_all(*services):
+    async def body(engine, url):
+        return [(await engine.probe(service(url.rstrip("/") + path, **extra)))["status"]
+                for path, extra in services]
+
+    return asyncio.run(with_server(pages, body))
+
+
+def test_keyword_split_across_chunks_is_found():
+    assert probe_all(("/", {"keyword": "systems go"}), ("/", {"keyword": "absent"})) == ["online", "down"]
+
+
+def test_head_mode_and_accepted_status():
+    assert probe_all(("/", {"probe_mode": "head"}),
+                     ("/", {"probe_mode": "head", "accepted_status": "200-399,405"})) == ["down", "online"]
+
+
+def test_redirects_are_not_followed():
+    assert probe_all(("/moved", {}), ("/moved", {"accepted_status": "200"})) == ["online", "down"]
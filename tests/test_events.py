@@ -0,0 +1,41 @@
+import asyncio
+
+from events import EventBroker
+
+
+def test_events_only_reach_the_owner():
+    broker = EventBroker(max_queue=10)
+    mine, other = broker.subscribe(1), broker.subscribe(2)
+    broker.publish("1", "status", {"id": 5})
+    assert mine.get_nowait() == ("status", {"id": 5})
+    assert other.empty()
+    broker.unsubscribe(mine)
+    broker.publish(1, "status", {})
+    assert broker.subscribers() == 1
+
+
+def test_slow_client_gets_a_resync():
+    broker = EventBroker(max_queue=2)
+    q = broker.subscribe(1)
+    for i in range(3):
+        broker.publish(1, "status", {"i": i})
+    assert q.get_nowait() == ("resync", {})
+    assert q.empty()
+    assert broker.dropped == 1
+
+
+def test_async_subscription_receives_events_from_threads():
+    broker = EventBroker(max_queue=2)
+
+    async def run():
+        subscription = broker.subscribe_async(1)
+        await asyncio.to_thread(broker.publish, 1, "status", {"id": 1})
+        first = await subscription.get(1)
+        for i in range(3):
+            broker.publish(1, "status", {"i": i})
+        await asyncio.sleep(0)
+        return first, await subscription.get(1)
+
+    first, second = asyncio.run(run())
+    assert first == ("status", {"id": 1})
+    assert second == ("resync", {})
@@ -0,0 +1,28 @@
+import io
+
+from PIL import Image
+
+from discord_bot import create_graph_image, render_graph_png
+
+
+def logs(*latencies):
+    return [{"latency_ms": latency} for latency in latencies]
+
+
+def test_png_has_the_graph_size():
+    png = render_graph_png("api", logs(10, 30, None, 20))
+    assert png.startswith(b"\x89PNG")
+    assert Image.open(io.BytesIO(png)).size == (800, 400)
+
+
+def test_too_few_points_still_render():
+    for data in ([], logs(10), logs(0, 0)):
+        assert create_graph_image("api", data).size == (800, 400)
+
+
+def test_precomputed_stats_are_used_without_recomputing():
+    stats = {"latency_avg": 999, "latency_min": 1, "latency_max": 2000, "uptime": 99.5}
+    with_stats = render_graph_png("api", logs(10, 30), stats)
+    assert with_stats != render_graph_png("api", logs(10, 30))
+    assert render_graph_png("api", logs(10, 30), dict(stats, latency_avg=None, uptime=None)) == \
+        render_graph_png("api", logs(10, 30))
@@ -0,0 +1,53 @@
+import os
+import runpy
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from jobs import JobRunner
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def wait_done(runner, job_id, owner_id):
+    for _ in range(200):
+        job = runner.get(job_id, owner_id)
+        if job["state"] != "pending":
+            return job
+        time.sleep(0.01)
+    raise AssertionError("job toujours en attente")
+
+
+def test_job_result_is_only_visible_to_its_owner():
+    runner = JobRunner(workers=1, ttl=60)
+    job_id = runner.submit(42, lambda job_id, x: x * 2, 21)
+    assert wait_done(runner, job_id, "42") == {"id": job_id, "owner_id": "42", "state": "done", "result": 42}
+    assert runner.get(job_id, 7) is None
+    assert runner.get("unknown", 42) is None
+
+
+def test_job_errors_are_reported():
+    runner = JobRunner(workers=1, ttl=60)
+
+    def fail(job_id):
+        raise RuntimeError("boom")
+
+    job = wait_done(runner, runner.submit(1, fail), 1)
+    assert (job["state"], job["error"]) == ("error", "boom")
+
+
+def test_create_and_finish_for_jobs_run_elsewhere():
+    runner = JobRunner(workers=1, ttl=60)
+    job_id = runner.create(1)
+    assert runner.get(job_id, 1)["state"] == "pending"
+    runner.finish(job_id, 1, {"status": "online"})
+    assert runner.get(job_id, 1)["result"] == {"status": "online"}
+
+
+def test_gunicorn_refuses_several_workers():
+    conf = runpy.run_path(os.path.join(ROOT, "gunicorn.conf.py"))
+    assert conf["workers"] == 1
+    conf["on_starting"](SimpleNamespace(cfg=SimpleNamespace(workers=1)))
+    with pytest.raises(RuntimeError):
+        conf["on_starting"](SimpleNamespace(cfg=SimpleNamespace(workers=4)))
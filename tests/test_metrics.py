@@ -0,0 +1,61 @@
+import pytest
+
+from metrics import Registry, timed
+
+
+def test_counter_and_gauge_render():
+    registry = Registry()
+    requests = registry.counter("t_requests_total", "Requêtes", ["route"])
+    requests.inc(route="/a")
+    requests.inc(2, route="/a")
+    registry.gauge("t_queue", "File").set(1.5)
+    text = registry.render()
+    assert "# TYPE t_requests_total counter" in text
+    assert 't_requests_total{route="/a"} 3' in text
+    assert "t_queue 1.5" in text
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = Registry()
+    histogram = registry.histogram("t_seconds", "Durée", buckets=(0.1, 1))
+    for value in (0.05, 0.5, 5):
+        histogram.observe(value)
+    lines = registry.render().splitlines()
+    assert 't_seconds_bucket{le="0.1"} 1' in lines
+    assert 't_seconds_bucket{le="1"} 2' in lines
+    assert 't_seconds_bucket{le="+Inf"} 3' in lines
+    assert "t_seconds_count 3" in lines
+
+
+def test_labels_are_checked_and_escaped():
+    registry = Registry()
+    counter = registry.counter("t_errors_total", "Erreurs", ["reason"])
+    with pytest.raises(ValueError):
+        counter.inc(other="x")
+    counter.inc(reason='say "hi"\n')
+    assert 't_errors_total{reason="say \\"hi\\"\\n"} 1' in registry.render()
+    assert registry.counter("t_errors_total", "Erreurs", ["reason"]) is counter
+    with pytest.raises(ValueError):
+        registry.gauge("t_errors_total", "Erreurs")
+
+
+def test_collectors_are_read_at_render_and_errors_skipped():
+    registry = Registry()
+    registry.collector(lambda: [("t_live", "gauge", "Valeur lue au rendu", [({}, 7), ({"x": "1"}, None)])])
+
+    @registry.collector
+    def broken():
+        raise RuntimeError("boom")
+
+    text = registry.render()
+    assert "t_live 7" in text
+    assert 'x="1"' not in text
+
+
+def test_timed_observes_even_on_error():
+    registry = Registry()
+    histogram = registry.histogram("t_block_seconds", "Bloc", ["verb"])
+    with pytest.raises(KeyError):
+        with timed(histogram, verb="GET"):
+            raise KeyError("x")
+    assert 't_block_seconds_count{verb="GET"} 1' in registry.render()
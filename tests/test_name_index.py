@@ -0,0 +1,46 @@
+from name_index import NameIndex
+
+
+def make_index():
+    index = NameIndex()
+    index.load([
+        {"owner_id": 1, "name": "API prod"},
+        {"owner_id": 1, "name": "api-staging"},
+        {"owner_id": 1, "name": "Blog"},
+        {"owner_id": 1, "name": "Status API"},
+        {"owner_id": 2, "name": "api-other-user"},
+    ])
+    return index
+
+
+def test_prefix_matches_first_case_insensitive():
+    index = make_index()
+    assert index.search(1, "api") == ["API prod", "api-staging", "Status API"]
+    assert index.search("1", "API P") == ["API prod"]
+
+
+def test_substring_search_uses_trigrams():
+    index = make_index()
+    assert index.search(1, "stag") == ["api-staging"]
+    assert index.search(1, "log") == ["Blog"]
+    assert index.search(1, "xyz") == []
+
+
+def test_short_substring_falls_back_to_scan():
+    index = make_index()
+    assert index.search(1, "og") == ["Blog"]
+
+
+def test_limit_and_empty_query():
+    index = make_index()
+    assert index.search(1, "", limit=2) == ["API prod", "api-staging"]
+    assert index.search(1, "api", limit=1) == ["API prod"]
+
+
+def test_users_are_isolated_and_updates_apply():
+    index = make_index()
+    assert index.search(3, "api") == []
+    index.add(1, "Apigee")
+    index.remove(1, "api-staging")
+    assert index.search(1, "api") == ["API prod", "Apigee", "Status API"]
+    assert index.search(1, "stag") == []
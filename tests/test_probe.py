@@ -0,0 +1,188 @@
+import asyncio
+
+import pytest
+
+from probe import AdaptiveTimeouts, CircuitBreaker, ProbeEngine, parse_status_spec, status_accepted, validate_probe_settings
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def open_breaker(threshold=2, base_delay=10, max_delay=40):
+    clock = Clock()
+    breaker = CircuitBreaker(threshold=threshold, base_delay=base_delay, max_delay=max_delay,
+                             probe_timeout=1, clock=clock)
+    for _ in range(threshold):
+        assert breaker.allow("h") == "closed"
+        breaker.failure("h")
+    return breaker, clock
+
+
+def test_opens_after_threshold_and_short_circuits():
+    breaker, clock = open_breaker()
+    assert breaker.is_open("h")
+    assert breaker.allow("h") is None
+    assert breaker.short_circuited == 1
+    assert breaker.open_hosts() == 1
+    assert breaker.allow("other") == "closed"
+
+
+def test_half_open_allows_a_single_probe():
+    breaker, clock = open_breaker()
+    clock.now = 10
+    assert breaker.allow("h") == "half_open"
+    assert breaker.allow("h") is None
+    assert breaker.is_open("h")
+
+
+def test_half_open_success_closes():
+    breaker, clock = open_breaker()
+    clock.now = 10
+    breaker.allow("h")
+    breaker.success("h")
+    assert not breaker.is_open("h")
+    assert breaker.allow("h") == "closed"
+
+
+def test_half_open_failure_reopens_with_doubled_delay_up_to_max():
+    breaker, clock = open_breaker()
+    delays = []
+    for _ in range(4):
+        clock.now = breaker._hosts["h"]["until"]
+        assert breaker.allow("h") == "half_open"
+        breaker.failure("h")
+        delays.append(breaker._hosts["h"]["until"] - clock.now)
+    assert delays == [20, 40, 40, 40]
+
+
+def test_release_lets_the_next_check_retry():
+    breaker, clock = open_breaker()
+    clock.now = 10
+    breaker.allow("h")
+    breaker.release("h")
+    assert breaker.allow("h") == "half_open"
+
+
+def test_adaptive_timeout_follows_recent_latencies():
+    timeouts = AdaptiveTimeouts(maximum=10, minimum=1, multiplier=3, samples=10, min_samples=3)
+    assert timeouts.timeout_for(1) == 10
+    for seconds in (0.5, 0.6, 0.8):
+        timeouts.record(1, seconds)
+    assert timeouts.timeout_for(1) == pytest.approx(2.4)
+    timeouts.record(2, 0.01)
+    timeouts.record(2, 0.01)
+    timeouts.record(2, 0.01)
+    assert timeouts.timeout_for(2) == 1
+    timeouts.record(3, 9)
+    assert timeouts.timeout_for(3) == 10
+
+
+def test_timeout_escalates_until_next_success():
+    timeouts = AdaptiveTimeouts(maximum=10, minimum=1, multiplier=3, samples=10, min_samples=1)
+    timeouts.record(1, 0.5)
+    timeouts.timed_out(1)
+    assert timeouts.timeout_for(1) == 10
+    timeouts.record(1, 0.5)
+    assert timeouts.timeout_for(1) == 1.5
+    timeouts.prune({2})
+    assert timeouts.timeout_for(1) == 10
+
+
+def test_parse_status_spec_ranges_and_singles():
+    assert parse_status_spec("200-299, 301") == ((200, 299), (301, 301))
+    assert parse_status_spec("404,") == ((404, 404),)
+
+
+@pytest.mark.parametrize("spec", ["", " , ", "abc", "200-abc", "299-200", "99", "600", "200-600"])
+def test_parse_status_spec_rejects_invalid(spec):
+    with pytest.raises(ValueError):
+        parse_status_spec(spec)
+
+
+def test_status_accepted_falls_back_to_default_spec():
+    assert status_accepted(301, "200-299,301")
+    assert not status_accepted(302, "200-299,301")
+    assert status_accepted(302, "garbage")
+    assert not status_accepted(404, None)
+
+
+def test_validate_probe_settings():
+    validate_probe_settings("head", "200-299")
+    with pytest.raises(ValueError):
+        validate_probe_settings("ftp")
+    with pytest.raises(ValueError):
+        validate_probe_settings("head", keyword="ok")
+
+
+@pytest.mark.parametrize("url", [":443", "tcp://:22", "tls://"])
+def test_tcp_and_tls_require_a_host(url):
+    with pytest.raises(ValueError):
+        validate_probe_settings("tcp", url=url)
+    with pytest.raises(ValueError):
+        validate_probe_settings("tls", url=url)
+    # Sans mode tcp/tls l'URL n'est pas vérifiée ici
+    validate_probe_settings("get", url=url)
+
+
+def test_probe_without_host_is_down():
+    engine = ProbeEngine()
+
+    async def run():
+        try:
+            return await engine.probe({"id": 1, "url": "tcp://:22", "probe_mode": "tcp"})
+        finally:
+            await engine.close()
+
+    result = asyncio.run(run())
+    assert result["status"] == "down"
+    assert "hôte manquant" in result["error"]
+
+
+def test_cancelled_half_open_probe_releases_the_breaker():
+    engine = ProbeEngine()
+    engine.breaker._hosts["example.org"] = {"failures": 5, "opens": 1, "until": 0, "probing": False}
+
+    async def hang(service, timings):
+        await asyncio.sleep(60)
+
+    engine._connect = hang
+
+    async def run():
+        task = asyncio.create_task(engine.probe({"id": 1, "url": "tcp://example.org:81", "probe_mode": "tcp"}))
+        await asyncio.sleep(0.05)
+        assert engine.breaker._hosts["example.org"]["probing"]
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        await engine.close()
+
+    asyncio.run(run())
+    assert engine.breaker.allow("example.org") == "half_open"
+
+
+def test_prune_drops_hosts_no_longer_checked():
+    engine = ProbeEngine()
+
+    async def connect(service, timings):
+        pass
+
+    engine._connect = connect
+    services = [{"id": i, "url": f"tcp://host{i}.example:80", "probe_mode": "tcp"} for i in range(3)]
+
+    async def run():
+        for service in services:
+            await engine.probe(service)
+        await engine.close()
+
+    asyncio.run(run())
+    engine.breaker.failure("host2.example")
+    assert set(engine._host_semaphores) == {"host0.example", "host1.example", "host2.example"}
+    engine.prune(services[:1])
+    assert set(engine._host_semaphores) == {"host0.example"}
+    assert engine.breaker._hosts == {}
+    assert set(engine.timeouts._latencies) <= {0}
@@ -0,0 +1,53 @@
+from datetime import datetime, timedelta, timezone
+
+from retention import RetentionJob, row_bytes
+from rollups import bucket_start
+from storage import SQLiteStorage
+
+NOW = datetime(2026, 6, 1, tzinfo=timezone.utc)
+
+
+def test_old_pings_are_summarized_once_then_deleted(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / "retention.db"))
+    service = storage.add_service({"name": "a", "url": "https://a", "owner_id": "1", "guild_id": 0})
+    old = NOW - timedelta(days=10)
+    covered = old + timedelta(minutes=5)
+    storage.merge_rollups([{"service_id": service["id"], "resolution": "1m",
+                            "bucket_start": bucket_start(covered, "1m"), "count": 1, "failures": 0,
+                            "latency_min": 9, "latency_max": 9, "latency_sum": 9, "sketch": {}}])
+    storage.insert_pings([
+        {"service_id": service["id"], "status": "online", "latency_ms": 100, "created_at": old.isoformat()},
+        {"service_id": service["id"], "status": "down", "latency_ms": None, "created_at": old.isoformat()},
+        {"service_id": service["id"], "status": "online", "latency_ms": 9, "created_at": covered.isoformat()},
+        {"service_id": service["id"], "status": "online", "latency_ms": 1, "created_at": NOW.isoformat()},
+    ])
+    job = RetentionJob(storage, ping_days=7, batch_size=2, pause=0, rollup_days={"1m": 30, "1h": 90})
+    report = job.run(now=NOW)
+    assert (report["pings_deleted"], report["pings_summarized"]) == (3, 2)
+    assert report["batches"] >= 2
+    assert [p["latency_ms"] for p in storage.get_pings(service["id"])] == [1]
+    [minute] = storage.get_rollups(service["id"], "1m", since=old - timedelta(minutes=1),
+                                   until=old + timedelta(minutes=1))
+    assert (minute["count"], minute["failures"], minute["latency_sum"]) == (2, 1, 100)
+    # Minute déjà couverte: pas comptée deux fois
+    [already] = storage.get_rollups(service["id"], "1m", since=covered, until=covered + timedelta(minutes=1))
+    assert already["count"] == 1
+
+
+def test_expired_rollups_are_deleted_but_daily_ones_kept(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / "retention.db"))
+    service = storage.add_service({"name": "a", "url": "https://a", "owner_id": "1", "guild_id": 0})
+    old = NOW - timedelta(days=400)
+    storage.merge_rollups([{"service_id": service["id"], "resolution": resolution,
+                            "bucket_start": bucket_start(old, resolution), "count": 1, "failures": 0,
+                            "latency_min": 1, "latency_max": 1, "latency_sum": 1, "sketch": {}}
+                           for resolution in ("1m", "1h", "1d")])
+    report = RetentionJob(storage, ping_days=7, pause=0, rollup_days={"1m": 30, "1h": 90}).run(now=NOW)
+    assert report["rollups_deleted"] == 2
+    assert len(storage.get_rollups(service["id"], "1d")) == 1
+
+
+def test_rollups_outlive_raw_pings():
+    job = RetentionJob(storage=object(), ping_days=40, rollup_days={"1m": 30, "1h": 0})
+    assert job.rollup_days == {"1m": 40, "1h": 0}
+    assert row_bytes({"a": 1, "b": None, "c": "héllo"}) == 28 + 8 + 6
@@ -0,0 +1,63 @@
+from ringbuffer import RingBuffer, RecentResults
+
+
+def test_wraps_and_keeps_the_latest_entries():
+    buffer = RingBuffer(capacity=3)
+    for i in range(5):
+        buffer.append(float(i), True, 10 * i)
+    assert len(buffer) == 3
+    assert [e[0] for e in buffer.entries()] == [2.0, 3.0, 4.0]
+
+
+def test_stats_only_count_successful_latencies():
+    buffer = RingBuffer(capacity=4)
+    buffer.append(1.0, True, 100)
+    buffer.append(2.0, False, None)
+    buffer.append(3.0, True, 300)
+    assert buffer.stats() == {"count": 3, "uptime": 66.67, "latency_avg": 200,
+                              "latency_min": 100, "latency_max": 300}
+    assert buffer.entries()[1] == (2.0, False, None)
+
+
+def test_min_max_recomputed_when_the_extreme_is_evicted():
+    buffer = RingBuffer(capacity=3)
+    for i, latency in enumerate([5, 50, 20, 30]):
+        buffer.append(float(i), True, latency)
+    stats = buffer.stats()
+    assert (stats["latency_min"], stats["latency_max"]) == (20, 50)
+    buffer.append(4.0, True, 25)
+    stats = buffer.stats()
+    assert (stats["latency_min"], stats["latency_max"]) == (20, 30)
+    assert stats["latency_avg"] == 25
+
+
+def test_seed_prepends_older_rows_once():
+    buffer = RingBuffer(capacity=3)
+    buffer.append(10.0, True, 1)
+    buffer.seed([
+        {"created_at": 5.0, "status": "down", "latency_ms": None},
+        {"created_at": 8.0, "status": "online", "latency_ms": 2},
+        {"created_at": 10.0, "status": "online", "latency_ms": 99},
+    ])
+    assert buffer.entries() == [(5.0, False, None), (8.0, True, 2), (10.0, True, 1)]
+    assert buffer.seeded
+
+
+def test_recent_results_seeds_from_loader_and_respects_limit():
+    recent = RecentResults(capacity=5)
+    recent.record(1, "2026-01-01T00:00:10+00:00", "online", 40)
+    recent.record(2, 1.0, "online", 1, create=False)
+    assert recent.snapshot(2) is None
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return [{"created_at": "2026-01-01T00:00:00+00:00", "status": "down", "latency_ms": None}]
+
+    rows, stats = recent.snapshot(1, loader, limit=10)
+    assert [r["status"] for r in rows] == ["down", "online"]
+    assert stats["uptime"] == 50.0
+    recent.snapshot(1, loader)
+    assert calls == [1]
+    recent.prune({2})
+    assert recent.snapshot(1) is None
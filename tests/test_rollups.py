@@ -0,0 +1,102 @@
+import random
+
+import pytest
+
+from rollups import (
+    SKETCH_ACCURACY, LatencySketch, RollupAggregator, bucket_start, empty_rollup, merge_rollup,
+    pick_resolution, summarize,
+)
+
+
+def test_bucket_start_per_resolution():
+    ts = "2026-03-04T05:06:07.891+00:00"
+    assert bucket_start(ts, "1m") == "2026-03-04T05:06:00.000000+00:00"
+    assert bucket_start(ts, "1h") == "2026-03-04T05:00:00.000000+00:00"
+    assert bucket_start(ts, "1d") == "2026-03-04T00:00:00.000000+00:00"
+
+
+def test_pick_resolution():
+    assert pick_resolution(24 * 3600) == "1m"
+    assert pick_resolution(30 * 86400) == "1h"
+    assert pick_resolution(365 * 86400) == "1d"
+
+
+@pytest.mark.parametrize("q", [0.5, 0.9, 0.99])
+def test_sketch_quantiles_within_relative_accuracy(q):
+    rng = random.Random(42)
+    values = sorted(rng.lognormvariate(5, 1) for _ in range(5000))
+    sketch = LatencySketch()
+    for value in values:
+        sketch.add(value)
+    exact = values[int(q * (len(values) - 1))]
+    # +1 ms: le sketch indexe ms + 1, et le résultat est arrondi
+    assert abs(sketch.quantile(q) - exact) <= SKETCH_ACCURACY * (exact + 1) + 1
+
+
+def test_sketch_merge_equals_sketch_of_union():
+    a, b, both = LatencySketch(), LatencySketch(), LatencySketch()
+    for value in range(0, 500, 7):
+        a.add(value)
+        both.add(value)
+    for value in range(3, 900, 11):
+        b.add(value)
+        both.add(value)
+    merged = LatencySketch(a.to_dict()).merge(b)
+    assert merged.counts == both.counts
+    assert LatencySketch().quantile(0.5) is None
+
+
+def test_merge_rollup_adds_counts_and_keeps_extremes():
+    into = empty_rollup(1, "1m", "t")
+    other = {**empty_rollup(1, "1m", "t"), "count": 3, "failures": 1, "latency_min": 10,
+             "latency_max": 30, "latency_sum": 40, "sketch": {"5": 2}}
+    merge_rollup(into, other)
+    merge_rollup(into, {**other, "latency_min": 5, "latency_max": None})
+    assert (into["count"], into["failures"], into["latency_sum"]) == (6, 2, 80)
+    assert (into["latency_min"], into["latency_max"]) == (5, 30)
+    assert into["sketch"] == {"5": 4}
+
+
+def test_aggregator_flushes_one_delta_per_bucket_and_resolution():
+    aggregator = RollupAggregator()
+    aggregator.add(1, "2026-01-01T00:00:10+00:00", "online", 100)
+    aggregator.add(1, "2026-01-01T00:00:20+00:00", "down", 5000)
+    aggregator.add(1, "2026-01-01T00:01:10+00:00", "online", 300)
+
+    class Storage:
+        rows = None
+
+        def merge_rollups(self, rows):
+            self.rows = rows
+
+    storage = Storage()
+    assert aggregator.flush(storage) == 4
+    minute = next(r for r in storage.rows if r["resolution"] == "1m" and r["bucket_start"].endswith("00:00.000000+00:00"))
+    assert (minute["count"], minute["failures"], minute["latency_sum"]) == (2, 1, 100)
+    day = next(r for r in storage.rows if r["resolution"] == "1d")
+    summary = summarize(day)
+    assert (summary["count"], summary["uptime"], summary["latency_avg"]) == (3, 66.67, 200)
+    assert aggregator.pending() == 0
+
+
+def test_aggregator_keeps_deltas_when_flush_fails():
+    aggregator = RollupAggregator()
+    aggregator.add(1, "2026-01-01T00:00:10+00:00", "online", 100)
+
+    class Failing:
+        def merge_rollups(self, rows):
+            raise RuntimeError("storage down")
+
+    with pytest.raises(RuntimeError):
+        aggregator.flush(Failing())
+    aggregator.add(1, "2026-01-01T00:00:20+00:00", "online", 50)
+
+    class Storage:
+        def merge_rollups(self, rows):
+            self.rows = rows
+
+    storage = Storage()
+    aggregator.flush(storage)
+    minute = next(r for r in storage.rows if r["resolution"] == "1m")
+    assert (minute["count"], minute["latency_sum"], minute["latency_min"]) == (2, 150, 50)
+    assert sum(minute["sketch"].values()) == 2
@@ -0,0 +1,79 @@
+import random
+
+from scheduler import CheckScheduler, MIN_CHECK_INTERVAL, MAX_CHECK_INTERVAL
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_scheduler(**kwargs):
+    clock = Clock()
+    return CheckScheduler(default_interval=60, jitter=0, clock=clock, **kwargs), clock
+
+
+def test_pop_due_returns_services_in_due_order():
+    random.seed(1)
+    scheduler, clock = make_scheduler()
+    scheduler.sync([{"id": i, "check_interval": 60} for i in range(20)])
+    clock.now += 60
+    due = scheduler.pop_due()
+    assert sorted(s["id"] for s in due) == list(range(20))
+    expected = sorted(scheduler._due, key=lambda i: scheduler._due[i])
+    for service in due:
+        scheduler.done(service["id"])
+    clock.now += 60
+    assert [s["id"] for s in scheduler.pop_due()] == expected
+
+
+def test_pop_due_respects_limit_and_keeps_the_rest():
+    scheduler, clock = make_scheduler()
+    scheduler.sync([{"id": i} for i in range(10)])
+    clock.now += 60
+    first = scheduler.pop_due(limit=4)
+    assert len(first) == 4
+    rest = scheduler.pop_due()
+    assert {s["id"] for s in first} | {s["id"] for s in rest} == set(range(10))
+
+
+def test_interval_is_clamped():
+    scheduler, _ = make_scheduler()
+    assert scheduler.interval_for({"check_interval": 1}) == MIN_CHECK_INTERVAL
+    assert scheduler.interval_for({"check_interval": 10 ** 6}) == MAX_CHECK_INTERVAL
+    assert scheduler.interval_for({"check_interval": None}) == 60
+
+
+def test_late_service_is_checked_once_and_rescheduled_from_now():
+    scheduler, clock = make_scheduler()
+    scheduler.sync([{"id": 1, "check_interval": 60}])
+    clock.now += 10 * 60
+    assert [s["id"] for s in scheduler.pop_due()] == [1]
+    scheduler.done(1)
+    assert scheduler.pop_due() == []
+    assert scheduler.coalesced == 1
+    assert scheduler._due[1] == clock.now + 60
+
+
+def test_running_service_is_not_stacked():
+    scheduler, clock = make_scheduler()
+    scheduler.sync([{"id": 1, "check_interval": 60}])
+    clock.now += 60
+    assert len(scheduler.pop_due()) == 1
+    clock.now += 60
+    # Check précédent pas terminé (done() pas appelé)
+    assert scheduler.pop_due() == []
+    scheduler.done(1)
+    clock.now += 60
+    assert len(scheduler.pop_due()) == 1
+
+
+def test_removed_service_is_never_popped():
+    scheduler, clock = make_scheduler()
+    scheduler.sync([{"id": 1}, {"id": 2}])
+    scheduler.sync([{"id": 2}])
+    clock.now += 60
+    assert [s["id"] for s in scheduler.pop_due()] == [2]
@@ -0,0 +1,74 @@
+import asyncio
+
+from sharding import HashRing, ShardCoordinator, shard_of
+from storage import LEASE_EPOCH, SHARD_COUNT, SQLiteStorage
+
+KEYS = [f"shard-{s}" for s in range(SHARD_COUNT)]
+
+
+def owners(ring):
+    return {key: ring.node_for(key) for key in KEYS}
+
+
+def test_ring_is_deterministic_and_balanced():
+    ring = HashRing(["a", "b", "c"])
+    assert owners(ring) == owners(HashRing(["c", "a", "b"]))
+    counts = {node: list(owners(ring).values()).count(node) for node in "abc"}
+    assert min(counts.values()) > SHARD_COUNT / 3 / 2
+    assert HashRing([]).node_for("shard-1") is None
+
+
+def test_adding_a_node_only_moves_shards_to_it():
+    before = owners(HashRing(["a", "b", "c"]))
+    after = owners(HashRing(["a", "b", "c", "d"]))
+    moved = [key for key in KEYS if before[key] != after[key]]
+    assert all(after[key] == "d" for key in moved)
+    assert len(moved) < SHARD_COUNT / 2
+
+
+def test_shard_of_matches_the_column():
+    assert shard_of(5) == 5
+    assert shard_of(SHARD_COUNT + 3) == 3
+
+
+def test_leases_are_not_stolen_until_released_or_expired(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / "leases.db"))
+    far = "2999-01-01T00:00:00.000000+00:00"
+    assert storage.claim_shards([1, 2], "w1", far) == [1, 2]
+    assert storage.claim_shards([2, 3], "w2", far) == [3]
+    storage.release_shards([2], "w1")
+    assert storage.claim_shards([2], "w2", far) == [2]
+    # Lease expiré: repris
+    storage.claim_shards([1], "w1", LEASE_EPOCH)
+    assert storage.claim_shards([1], "w2", far) == [1]
+
+
+def test_workers_heartbeat_and_expire(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / "workers.db"))
+    storage.heartbeat_worker("w1", "2999-01-01T00:00:00.000000+00:00")
+    storage.heartbeat_worker("w2", LEASE_EPOCH)
+    assert storage.live_workers() == ["w1"]
+    storage.remove_worker("w1")
+    assert storage.live_workers() == []
+
+
+def test_two_coordinators_split_every_shard_once(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / "coord.db"))
+    first = ShardCoordinator(storage, "w1", lease_ttl=60)
+    second = ShardCoordinator(storage, "w2", lease_ttl=60)
+
+    async def run():
+        await first.tick()
+        assert first.shards() == list(range(SHARD_COUNT))
+        await second.tick()
+        # w1 tient encore les shards de w2: rien n'est volé
+        assert not set(first.shards()) & set(second.shards())
+        await first.tick()
+        await second.tick()
+        assert sorted(first.shards() + second.shards()) == list(range(SHARD_COUNT))
+        assert first.owns({"id": first.shards()[0]})
+        await first.leave()
+        await second.tick()
+        assert second.shards() == list(range(SHARD_COUNT))
+
+    asyncio.run(run())
@@ -0,0 +1,115 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from sla import DAY, DayAccumulator, _iso, maintenance_window, merge_windows, uptime_report
+
+
+def test_gap_beyond_limit_counts_as_no_data():
+    day = DayAccumulator(0, 1000, gap_limit=120, windows=[], merge_gap=0)
+    day.add(0, 1, 0)
+    day.add(60, 1, 0)
+    # Checker arrêté entre 180 et 600
+    day.add(600, 1, 0)
+    stats = day.finish()
+    assert stats["monitored_s"] == 60 + 120 + 120
+    assert stats["checks"] == 3
+    assert stats["down_s"] == 0
+
+
+def test_maintenance_time_is_excluded():
+    day = DayAccumulator(0, 180, gap_limit=120, windows=[(60, 120)], merge_gap=0)
+    for start in (0, 60, 120):
+        day.add(start, 1, 1)
+    stats = day.finish()
+    assert stats["maintenance_s"] == 60
+    assert stats["monitored_s"] == 120
+    assert stats["down_s"] == 120
+
+
+def test_close_incidents_are_merged_and_partial_failures_weighted():
+    day = DayAccumulator(0, 300, gap_limit=120, windows=[], merge_gap=100)
+    day.add(0, 1, 1)
+    day.add(60, 1, 0)
+    day.add(120, 4, 1)
+    day.add(180, 1, 0)
+    day.add(240, 1, 1)
+    stats = day.finish()
+    # 60 s down, puis 1 échec sur 4 checks pendant 60 s, puis 60 s down: un seul incident
+    assert stats["down_s"] == 60 + 15 + 60
+    assert stats["incidents"] == [[0, 300, 135.0]]
+
+
+def test_distant_incidents_stay_separate():
+    day = DayAccumulator(0, 600, gap_limit=120, windows=[], merge_gap=60)
+    for start, failures in ((0, 1), (60, 0), (120, 0), (180, 0), (240, 1)):
+        day.add(start, 1, failures)
+    assert [i[:2] for i in day.finish()["incidents"]] == [[0, 60], [240, 360]]
+
+
+def test_merge_windows_sorts_merges_and_drops_empty():
+    rows = [
+        {"starts_at": _iso(100), "ends_at": _iso(200)},
+        {"starts_at": _iso(0), "ends_at": _iso(150)},
+        {"starts_at": _iso(300), "ends_at": _iso(300)},
+        {"starts_at": _iso(400), "ends_at": _iso(500)},
+    ]
+    assert merge_windows(rows) == [(0, 200), (400, 500)]
+
+
+def test_maintenance_window_row():
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    row = maintenance_window(7, 90, start, "upgrade")
+    assert row["service_id"] == 7
+    assert row["ends_at"].startswith("2026-01-01T01:30:00")
+
+
+class FakeStorage:
+    def __init__(self, buckets, windows=()):
+        self.buckets = buckets
+        self.windows = list(windows)
+        self.reads = []
+
+    def iter_rollups(self, service_id, resolution, since, until, page_size=1000):
+        self.reads.append((since, until))
+        return iter([b for b in self.buckets if since <= b["bucket_start"] < until])
+
+    def get_maintenance(self, service_id, since, until):
+        return self.windows
+
+
+def minute_buckets(start, minutes, failing=()):
+    return [{"bucket_start": _iso(start + 60 * m), "count": 1, "failures": int(start + 60 * m in failing)}
+            for m in range(minutes)]
+
+
+@pytest.fixture
+def today():
+    return datetime.now(timezone.utc).timestamp() // DAY * DAY
+
+
+def test_incident_across_midnight_is_reported_once(today):
+    # Incident de 23:58 à 00:01
+    midnight = today
+    failing = {midnight - 120, midnight - 60, midnight}
+    storage = FakeStorage(minute_buckets(midnight - 600, 70, failing))
+    service = {"id": "sla-midnight", "check_interval": 60, "created_at": _iso(today - 10 * DAY)}
+    report = uptime_report(storage, service, days=2, now=midnight + 3600)
+    assert report["incidents"]["count"] == 1
+    assert report["incidents"]["longest_s"] == 180
+    assert report["down_s"] == 180
+    assert report["monitored_s"] == 70 * 60
+    assert [d["down_s"] for d in report["daily"]] == [120, 60]
+
+
+def test_finished_days_come_from_the_cache(today):
+    storage = FakeStorage(minute_buckets(today - 2 * DAY, 3 * 24 * 60))
+    service = {"id": "sla-cache", "check_interval": 60, "created_at": _iso(today - 10 * DAY)}
+    now = today + 3600
+    first = uptime_report(storage, service, days=3, now=now)
+    storage.reads.clear()
+    second = uptime_report(storage, service, days=3, now=now)
+    assert first == second
+    # Seul le jour courant est relu
+    assert storage.reads == [(_iso(today), _iso(now))]
+    assert first["uptime"] == 100.0
@@ -0,0 +1,51 @@
+import asyncio
+import os
+import subprocess
+import sys
+
+import pytest
+
+import discord_bot
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def loaded_after(code, tmp_path, modules):
+    env = {**os.environ, "PYTHONPATH": ROOT, "STORAGE_BACKEND": "sqlite", "SQLITE_PATH": str(tmp_path / "s.db")}
+    out = subprocess.run([sys.executable, "-c", f"import sys; {code}; print([m for m in {modules!r} if m in sys.modules])"],
+                         env=env, cwd=str(tmp_path), capture_output=True, text=True, check=True)
+    return out.stdout.strip().splitlines()[-1]
+
+
+def test_web_process_does_not_load_the_bot_stack(tmp_path):
+    assert loaded_after("import app", tmp_path, ["discord", "aiohttp", "PIL"]) == "[]"
+
+
+def test_bot_loads_pillow_only_for_graphs(tmp_path):
+    assert loaded_after("import discord_bot", tmp_path, ["PIL"]) == "[]"
+
+
+@pytest.fixture
+def synced(tmp_path, monkeypatch):
+    calls = []
+
+    async def sync():
+        calls.append(1)
+        return []
+
+    monkeypatch.setattr(discord_bot, "COMMAND_SYNC_STATE", str(tmp_path / "hash"))
+    monkeypatch.setattr(discord_bot.bot.tree, "sync", sync)
+    return calls
+
+
+def test_unchanged_commands_are_not_synced_again(synced):
+    asyncio.run(discord_bot.sync_command_tree())
+    asyncio.run(discord_bot.sync_command_tree())
+    assert len(synced) == 1
+
+
+def test_changed_commands_are_synced(synced, monkeypatch):
+    asyncio.run(discord_bot.sync_command_tree())
+    monkeypatch.setattr(discord_bot, "command_tree_hash", lambda: "autre")
+    asyncio.run(discord_bot.sync_command_tree())
+    assert len(synced) == 2
@@ -0,0 +1,38 @@
+from state import StateTracker
+
+
+def test_down_only_after_threshold_consecutive_failures():
+    tracker = StateTracker(threshold=3)
+    service = {"id": 1, "status": "online"}
+    assert tracker.observe(service, "down") is None
+    assert tracker.observe(service, "down") is None
+    assert tracker.observe(service, "down") == ("online", "down")
+    assert tracker.observe(service, "down") is None
+    assert tracker.status(1) == "down"
+
+
+def test_single_success_resets_failures_and_recovers():
+    tracker = StateTracker(threshold=2)
+    service = {"id": 1, "status": "online"}
+    tracker.observe(service, "down")
+    tracker.observe(service, "online")
+    # Le compteur est reparti de zéro: un seul échec ne suffit plus
+    assert tracker.observe(service, "down") is None
+    assert tracker.observe(service, "down") == ("online", "down")
+    assert tracker.observe(service, "online") == ("down", "online")
+    assert tracker.transitions == 2
+
+
+def test_first_check_starts_from_stored_status():
+    tracker = StateTracker(threshold=3)
+    assert tracker.observe({"id": 1, "status": "down"}, "down") is None
+    assert tracker.observe({"id": 2, "status": "down"}, "online") == ("down", "online")
+
+
+def test_reconcile_forgets_removed_and_reports_mismatches():
+    tracker = StateTracker(threshold=1)
+    tracker.observe({"id": 1, "status": "online"}, "down")
+    tracker.observe({"id": 2, "status": "online"}, "online")
+    assert tracker.reconcile([{"id": 1, "status": "online"}]) == [(1, "down")]
+    assert tracker.status(2) is None
+    assert tracker.stats()["tracked"] == 1
@@ -0,0 +1,113 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from storage import SQLiteStorage, StorageError, Storage, _timestamp
+
+
+@pytest.fixture
+def storage(tmp_path):
+    return SQLiteStorage(str(tmp_path / "test.db"))
+
+
+def add(storage, name, owner="1", **fields):
+    return storage.add_service({"name": name, "url": f"https://{name}", "owner_id": owner, "guild_id": 0, **fields})
+
+
+def test_storage_is_abstract():
+    with pytest.raises(TypeError):
+        Storage()
+
+
+def test_services_crud_scoped_by_owner(storage):
+    a = add(storage, "a", owner=1)
+    add(storage, "b", owner="2")
+    assert a["owner_id"] == "1" and a["status"] == "online"
+    assert [s["name"] for s in storage.list_services(1)] == ["a"]
+    assert storage.get_service(a["id"])["name"] == "a"
+    assert storage.update_service({"check_interval": 60, "unknown": 1}, owner_id="2", name="a") == []
+    assert storage.update_service({"check_interval": 60}, owner_id="1", name="a")[0]["check_interval"] == 60
+    assert [s["name"] for s in storage.delete_service(owner_id="1", name="a")] == ["a"]
+    assert storage.get_service(a["id"]) is None
+    with pytest.raises(StorageError):
+        storage.delete_service()
+
+
+def test_unique_name_per_owner(storage):
+    add(storage, "a")
+    with pytest.raises(StorageError):
+        add(storage, "a")
+    created = storage.add_services([
+        {"name": "a", "url": "https://a", "owner_id": "1"},
+        {"name": "b", "url": "https://b", "owner_id": "1"},
+    ])
+    assert [s["name"] for s in created] == ["b"]
+
+
+def test_pagination_and_shards(storage):
+    ids = [add(storage, f"s{i}")["id"] for i in range(5)]
+    assert [s["id"] for s in storage.iter_services("1", page_size=2)] == ids
+    assert [s["id"] for s in storage.list_services_page("1", after_id=ids[2])] == ids[3:]
+    assert [s["id"] for s in storage.list_services(shards=[ids[0] % 256])] == [ids[0]]
+    assert storage.list_services(shards=[]) == []
+
+
+def test_set_status_and_counts(storage):
+    ids = [add(storage, f"s{i}")["id"] for i in range(3)]
+    storage.set_status(ids[:2], "down")
+    assert storage.count_by_status() == {"online": 1, "down": 2, "total": 3}
+    assert storage.get_service(ids[0])["last_check"] is not None
+
+
+def test_pings_order_and_window(storage):
+    service = add(storage, "a")
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    storage.insert_pings([{"service_id": service["id"], "status": "online", "latency_ms": i,
+                           "created_at": (start + timedelta(minutes=i)).isoformat()} for i in range(5)])
+    assert [p["latency_ms"] for p in storage.get_pings(service["id"])] == [0, 1, 2, 3, 4]
+    assert [p["latency_ms"] for p in storage.get_pings(service["id"], limit=2, newest=True)] == [3, 4]
+    window = storage.get_pings(service["id"], since=start + timedelta(minutes=1), until=start + timedelta(minutes=3))
+    assert [p["latency_ms"] for p in window] == [1, 2]
+
+
+def test_merge_rollups_adds_deltas(storage):
+    service = add(storage, "a")
+    bucket = _timestamp("2026-01-01T00:00:00Z")
+    delta = {"service_id": service["id"], "resolution": "1m", "bucket_start": bucket, "count": 2, "failures": 1,
+             "latency_min": 10, "latency_max": 10, "latency_sum": 10, "sketch": {"3": 1}}
+    storage.merge_rollups([delta])
+    storage.merge_rollups([{**delta, "latency_min": 5, "latency_max": 20, "latency_sum": 25, "sketch": {"3": 1, "9": 1}}])
+    [row] = storage.get_rollups(service["id"], "1m")
+    assert (row["count"], row["failures"], row["latency_sum"]) == (4, 2, 35)
+    assert (row["latency_min"], row["latency_max"]) == (5, 20)
+    assert row["sketch"] == {"3": 2, "9": 1}
+
+
+def test_iter_rollups_pages_through_the_window(storage):
+    service = add(storage, "a")
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    storage.merge_rollups([{"service_id": service["id"], "resolution": "1m",
+                            "bucket_start": _timestamp(start + timedelta(minutes=i)), "count": 1, "failures": 0,
+                            "latency_min": i, "latency_max": i, "latency_sum": i, "sketch": {}} for i in range(7)])
+    rows = list(storage.iter_rollups(service["id"], "1m", start + timedelta(minutes=1),
+                                     start + timedelta(minutes=6), page_size=2))
+    assert [r["latency_sum"] for r in rows] == [1, 2, 3, 4, 5]
+
+
+def test_maintenance_overlap(storage):
+    service = add(storage, "a")
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    storage.add_maintenance({"service_id": service["id"], "starts_at": start, "ends_at": start + timedelta(hours=1)})
+    assert len(storage.get_maintenance(service["id"], start + timedelta(minutes=30), start + timedelta(hours=2))) == 1
+    assert storage.get_maintenance(service["id"], start + timedelta(hours=1), start + timedelta(hours=2)) == []
+
+
+def test_retention_helpers(storage):
+    service = add(storage, "a")
+    old = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    storage.insert_pings([{"service_id": service["id"], "status": "online", "created_at": old.isoformat()},
+                          {"service_id": service["id"], "status": "online"}])
+    cutoff = datetime(2021, 1, 1, tzinfo=timezone.utc)
+    [ping] = storage.old_pings(cutoff, 10)
+    assert storage.delete_pings(ping["id"], cutoff) == 1
+    assert len(storage.get_pings(service["id"])) == 1
@@ -0,0 +1,120 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+
+from vantage import VantageAgent, VantagePanel, agent_host, decode_votes, encode_votes, parse_agents
+
+
+def panel(agents=2, quorum=0):
+    return VantagePanel([SimpleNamespace(name=f"a{i}") for i in range(agents)], quorum=quorum, name="local")
+
+
+def local(status, latency=40):
+    return {"service": {"id": 1}, "status": status, "latency_ms": latency, "phases": {"ttfb_ms": latency},
+            "error": None if status == "online" else "timeout"}
+
+
+def test_default_quorum_is_a_majority_and_capped():
+    assert panel(2).quorum == 2
+    assert panel(3).quorum == 3
+    assert panel(1, quorum=5).quorum == 2
+
+
+def test_agreeing_votes_keep_the_local_result():
+    result = panel().merge(local("online"), {"a0": (True, 50), "a1": (True, 60)})
+    assert result["status"] == "online"
+    assert result["latency_ms"] == 40
+    assert not result["inconclusive"]
+    assert set(result["votes"]) == {"local", "a0", "a1"}
+
+
+def test_local_failure_overruled_by_remote_quorum():
+    result = panel().merge(local("down", 5000), {"a0": (True, 50), "a1": (True, 70)}, previous="online")
+    assert result["status"] == "online"
+    assert result["latency_ms"] == 60
+    assert result["error"] is None
+
+
+def test_down_needs_a_quorum():
+    result = panel().merge(local("online"), {"a0": (False, None), "a1": (False, None)})
+    assert result["status"] == "down"
+    assert result["error"] == "down vu par 2/3 points de vue"
+
+
+def test_split_vote_keeps_previous_status():
+    result = panel(3).merge(local("down"), {"a0": (False, None), "a1": (True, 50), "a2": (True, 60)},
+                            previous="down")
+    assert result["status"] == "down"
+    assert result["inconclusive"]
+
+
+def test_missing_votes_are_not_down_votes():
+    result = panel().merge(local("online"), {"a0": None, "a1": (True, 50)})
+    assert result["status"] == "online"
+    assert set(result["votes"]) == {"local", "a1"}
+
+
+def test_no_agent_reachable_falls_back_to_local():
+    result = panel().merge(local("down"), {"a0": None, "a1": None}, previous="online")
+    assert result["status"] == "down"
+    assert not result["inconclusive"]
+
+
+def test_votes_roundtrip():
+    votes = {"local": (True, 42), "eu": (False, None), "us": (True, None)}
+    text = encode_votes(votes)
+    assert text == "local:42,eu:x,us:"
+    assert decode_votes(text) == votes
+    assert encode_votes({}) is None
+
+
+def test_parse_agents():
+    assert parse_agents(" eu=http://10.0.0.2:8700/ , us=http://h:1") == [
+        ("eu", "http://10.0.0.2:8700"), ("us", "http://h:1")]
+    assert parse_agents("") == []
+    with pytest.raises(ValueError):
+        parse_agents("eu")
+
+
+def test_agent_without_token_stays_local():
+    assert agent_host("", None) == "127.0.0.1"
+    assert agent_host("secret", None) == "0.0.0.0"
+    assert agent_host("", "localhost") == "localhost"
+    with pytest.raises(ValueError):
+        agent_host("", "0.0.0.0")
+
+
+class FakeEngine:
+    in_flight = 0
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+    async def probe(self, service):
+        return {"status": "online" if service["id"] % 2 else "down", "latency_ms": 10}
+
+
+def call_agent(agent, headers, services):
+    async def run():
+        async with TestClient(TestServer(agent.create_app())) as client:
+            resp = await client.post("/probe", json={"services": services}, headers=headers)
+            return resp.status, await resp.json()
+    return asyncio.run(run())
+
+
+def test_agent_checks_the_token():
+    agent = VantageAgent("eu", token="secret", engine=FakeEngine())
+    assert call_agent(agent, {"Authorization": "Bearer nope"}, [])[0] == 401
+    status, body = call_agent(agent, {"Authorization": "Bearer secret"}, [{"id": 1}, {"id": 2}])
+    assert status == 200
+    assert body["results"] == [[1, 1, 10], [2, 0, 10]]
+
+
+def test_lost_responses_are_left_out():
+    agent = VantageAgent("eu", token="", loss=1.0, engine=FakeEngine())
+    assert call_agent(agent, {}, [{"id": 1}])[1]["results"] == []
@@ -0,0 +1,53 @@
+import pytest
+
+import app as web
+from ringbuffer import RecentResults
+from storage import SQLiteStorage
+
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    storage = SQLiteStorage(str(tmp_path / "web.db"))
+    monkeypatch.setattr(web, "storage", storage)
+    # Buffers de résultats propres au test: ceux du module sont partagés
+    monkeypatch.setattr(web, "recent", RecentResults())
+    web.services_cache.clear()
+    yield storage
+    web.services_cache.clear()
+
+
+def client(user_id=None):
+    client = web.app.test_client()
+    if user_id is not None:
+        with client.session_transaction() as session:
+            session["user_id"] = user_id
+    return client
+
+
+def add(storage, owner):
+    service = storage.add_service({"name": f"s{owner}", "url": "https://example.com", "owner_id": owner, "guild_id": 0})
+    storage.insert_pings([{"service_id": service["id"], "status": "online", "latency_ms": 12}])
+    return service
+
+
+def test_logs_are_scoped_to_the_owner(storage):
+    service = add(storage, "1")
+    assert client("2").get(f"/api/logs/{service['id']}").status_code == 403
+    assert client("2").get("/api/logs/999").status_code == 404
+    response = client("1").get(f"/api/logs/{service['id']}")
+    assert response.status_code == 200
+    assert [log["latency_ms"] for log in response.get_json()] == [12]
+
+
+def test_owner_check_uses_the_cached_list(storage, monkeypatch):
+    service = add(storage, "1")
+    web.services_cache.set("1", [service])
+    monkeypatch.setattr(storage, "get_service", lambda service_id: pytest.fail("stockage relu"))
+    assert web.check_owner("1", service["id"]) is None
+
+
+def test_cache_stats_require_a_session_or_token(storage, monkeypatch):
+    monkeypatch.setattr(web, "METRICS_TOKEN", "secret")
+    assert client().get("/api/cache/stats").status_code == 403
+    assert client().get("/api/cache/stats", headers={"Authorization": "Bearer secret"}).status_code == 200
+    assert client("1").get("/api/cache/stats").status_code == 200
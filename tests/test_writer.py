@@ -0,0 +1,109 @@
+import asyncio
+import os
+import threading
+
+from writer import ResultWriter
+
+
+class FakeStorage:
+    def __init__(self):
+        self.down = False
+        self.pings = []
+        self.statuses = []
+        self.inserts = 0
+
+    def insert_pings(self, pings):
+        if self.down:
+            raise RuntimeError("storage down")
+        self.inserts += 1
+        self.pings.extend(p["n"] for p in pings)
+
+    def set_status(self, ids, status, last_check=None):
+        if self.down:
+            raise RuntimeError("storage down")
+        self.statuses.append((sorted(ids), status))
+
+
+def make_writer(tmp_path, storage, **kwargs):
+    return ResultWriter(storage=storage, retries=1, spill_path=str(tmp_path / "spill.ndjson"), **kwargs)
+
+
+def test_results_are_batched_and_last_status_wins(tmp_path):
+    storage = FakeStorage()
+
+    async def run():
+        writer = make_writer(tmp_path, storage, batch_size=100, flush_ms=50)
+        await writer.start()
+        for n in range(10):
+            await writer.enqueue({"n": n}, n % 2, "down" if n < 9 else "online")
+        await writer.close()
+        return writer
+
+    writer = asyncio.run(run())
+    assert storage.pings == list(range(10))
+    assert storage.inserts == 1
+    assert sorted(storage.statuses) == [([0], "down"), ([1], "online")]
+    assert writer.written == 10
+
+
+def test_spilled_batches_are_replayed_in_order_and_counted_once(tmp_path):
+    storage = FakeStorage()
+    spill = tmp_path / "spill.ndjson"
+
+    async def run():
+        writer = make_writer(tmp_path, storage)
+        storage.down = True
+        for n in range(3):
+            await writer._flush([({"n": n}, 1, None)])
+        assert writer.spilled == 3
+        # Panne pendant la reprise: le lot repart devant, sans être recompté
+        await writer._flush([({"n": 3}, 1, None)])
+        assert writer.spilled == 4
+        storage.down = False
+        await writer._flush([({"n": 4}, 1, "online")])
+        return writer
+
+    writer = asyncio.run(run())
+    assert storage.pings == [0, 1, 2, 3, 4]
+    assert writer.written == 5
+    assert not spill.exists()
+    assert not os.path.exists(str(spill) + ".replay")
+
+
+def test_leftover_replay_file_is_resumed_first(tmp_path):
+    storage = FakeStorage()
+    spill = tmp_path / "spill.ndjson"
+    (tmp_path / "spill.ndjson.replay").write_text('{"pings": [{"n": 0}], "statuses": {}}\n')
+    spill.write_text('{"pings": [{"n": 1}], "statuses": {}}\n')
+
+    async def run():
+        writer = make_writer(tmp_path, storage)
+        await writer._flush([({"n": 2}, 1, None)])
+
+    asyncio.run(run())
+    # Le .replay, puis le spill, puis le nouveau lot
+    assert storage.pings == [0, 1, 2]
+    assert not spill.exists()
+
+
+def test_spill_is_written_off_the_event_loop(tmp_path):
+    storage = FakeStorage()
+    storage.down = True
+    threads = []
+
+    async def run():
+        writer = make_writer(tmp_path, storage)
+        append = writer._append_spill
+
+        def recorded(line):
+            threads.append(threading.get_ident())
+            append(line)
+
+        writer._append_spill = recorded
+        await writer._flush([({"n": 0}, 1, None)])
+        return writer
+
+    writer = asyncio.run(run())
+    assert writer.spilled == 1
+    assert threads and threading.get_ident() not in threads
+    assert (tmp_path / "spill.ndjson").read_text().count("\n") == 1
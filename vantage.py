@@ -0,0 +1,336 @@
+"""Points de vue multiples: agents de probe et décision au quorum
+
+Un seul checker qui voit un service down ne suffit plus à changer son
+statut: un incident réseau local ferait basculer des centaines de
+services d'un coup. Chaque service est vérifié par le checker (point de
+vue local, VANTAGE_NAME) et par les agents de VANTAGE_AGENTS, lancés sur
+d'autres machines ou régions:
+
+    VANTAGE_TOKEN=... python vantage.py --name eu-west --port 8700
+    python vantage.py --name lent --port 8701 --delay 300 --loss 0.2   # réseau simulé, localhost
+
+Un agent ne fait que des probes: pas de stockage, pas de planification.
+Le checker coordonne. Les services à vérifier sont regroupés par agent
+pendant VANTAGE_BATCH_MS (une requête HTTP par lot, pas par service) et
+chaque agent répond par un triplet [id, en ligne, latence] par service. La
+fusion des votes est en O(K) par service. Le statut passe "down" quand au
+moins VANTAGE_QUORUM points de vue le voient down, "online" quand au moins
+autant le voient en ligne; sinon le statut confirmé précédent est gardé. Si
+aucun agent ne répond, le résultat local décide. Les votes sont stockés
+avec le ping, dans une seule colonne texte (voir encode_votes).
+"""
+import argparse
+import asyncio
+import hmac
+import random
+import statistics
+import time
+
+import aiohttp
+from aiohttp import web
+
+from config import (
+    VANTAGE_NAME, VANTAGE_AGENTS, VANTAGE_QUORUM, VANTAGE_TOKEN, VANTAGE_PORT,
+    VANTAGE_BATCH_MS, VANTAGE_BATCH_SIZE, PROBE_TIMEOUT,
+)
+from metrics import registry
+from probe import ProbeEngine
+
+# Colonnes de service envoyées aux agents
+AGENT_FIELDS = ("id", "name", "url", "probe_mode", "accepted_status", "keyword")
+# Pause avant de réessayer un agent injoignable (secondes)
+AGENT_RETRY_DELAY = 10
+
+VANTAGE_VOTES = registry.counter(
+    "downdetector_vantage_votes_total", "Votes reçus par point de vue", ["vantage", "vote"])
+VANTAGE_DECISIONS = registry.counter(
+    "downdetector_vantage_decisions_total", "Résultats fusionnés au quorum", ["outcome"])
+
+
+def parse_agents(spec):
+    """"eu=http://10.0.0.2:8700,us=http://10.0.1.2:8700" -> [(nom, url)]"""
+    agents = []
+    for part in (spec or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        name, sep, url = part.partition("=")
+        if not sep or not name.strip() or not url.strip():
+            raise ValueError(f"agent invalide (nom=url attendu): {part}")
+        agents.append((name.strip(), url.strip().rstrip("/")))
+    return agents
+
+
+def encode_votes(votes):
+    """{nom: (en ligne, latence)} -> "local:42,eu:57,us:x" (x: down, rien: latence inconnue)"""
+    if not votes:
+        return None
+    return ",".join(
+        f"{name}:{'x' if not online else ('' if latency is None else int(latency))}"
+        for name, (online, latency) in votes.items()
+    )
+
+
+def decode_votes(text):
+    votes = {}
+    for part in (text or "").split(","):
+        name, sep, value = part.rpartition(":")
+        if not sep:
+            continue
+        votes[name] = (False, None) if value == "x" else (True, int(value) if value else None)
+    return votes
+
+
+class RemoteVantage:
+    """Client d'un agent: les probes sont envoyées par lots de batch_size ou toutes les batch_ms"""
+
+    def __init__(self, name, url, token=VANTAGE_TOKEN, batch_ms=VANTAGE_BATCH_MS,
+                 batch_size=VANTAGE_BATCH_SIZE, timeout=PROBE_TIMEOUT + 5):
+        self.name = name
+        self.url = url
+        self.token = token
+        self.batch_ms = batch_ms
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self._pending = []
+        self._timer = None
+        self._sends = set()
+        self._retry_at = 0
+        self.requests = 0
+        self.errors = 0
+        self.last_error = None
+
+    @property
+    def available(self):
+        return time.monotonic() >= self._retry_at
+
+    async def probe(self, session, service):
+        """(en ligne, latence) vu par l'agent, ou None sans réponse"""
+        if not self.available:
+            return None
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((service, future))
+        if len(self._pending) >= self.batch_size:
+            self._flush(session)
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.batch_ms / 1000, self._flush, session)
+        return await future
+
+    def _flush(self, session):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.create_task(self._send(session, batch))
+            self._sends.add(task)
+            task.add_done_callback(self._sends.discard)
+
+    async def _send(self, session, batch):
+        payload = {"services": [{field: service.get(field) for field in AGENT_FIELDS} for service, _ in batch]}
+        headers = {"Authorization": f"Bearer {self.token}"} if self.token else {}
+        results = {}
+        self.requests += 1
+        try:
+            async with session.post(f"{self.url}/probe", json=payload, headers=headers,
+                                    timeout=aiohttp.ClientTimeout(total=self.timeout)) as resp:
+                resp.raise_for_status()
+                data = await resp.json()
+            results = {service_id: (bool(online), latency) for service_id, online, latency in data["results"]}
+        except Exception as e:
+            self.errors += 1
+            self.last_error = str(e) or type(e).__name__
+            self._retry_at = time.monotonic() + AGENT_RETRY_DELAY
+            print(f"⚠️ Agent {self.name} injoignable: {self.last_error}")
+        for service, future in batch:
+            if not future.done():
+                future.set_result(results.get(service["id"]))
+
+    async def close(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        for _, future in self._pending:
+            if not future.done():
+                future.set_result(None)
+        self._pending = []
+        if self._sends:
+            await asyncio.gather(*self._sends, return_exceptions=True)
+
+
+class VantagePanel:
+    """Les agents distants et la règle du quorum (M points de vue sur K)"""
+
+    def __init__(self, agents=None, quorum=VANTAGE_QUORUM, name=VANTAGE_NAME):
+        if agents is None:
+            agents = [RemoteVantage(n, url) for n, url in parse_agents(VANTAGE_AGENTS)]
+        self.agents = agents
+        self.name = name
+        self.size = 1 + len(agents)
+        # 0: majorité des points de vue
+        self.quorum = min(quorum or self.size // 2 + 1, self.size)
+        self.session = None
+
+    async def start(self):
+        if self.agents and (self.session is None or self.session.closed):
+            self.session = aiohttp.ClientSession()
+
+    async def close(self):
+        for agent in self.agents:
+            await agent.close()
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+        self.session = None
+
+    async def collect(self, service):
+        """{nom: (en ligne, latence) ou None} des agents pour ce service"""
+        await self.start()
+        votes = await asyncio.gather(*(agent.probe(self.session, service) for agent in self.agents))
+        return {agent.name: vote for agent, vote in zip(self.agents, votes)}
+
+    def merge(self, local, remote, previous=None):
+        """Résultat local + votes des agents -> résultat décidé au quorum
+
+        Même forme qu'un résultat de ProbeEngine.probe(), plus "votes".
+        Sans quorum ni d'un côté ni de l'autre, le statut reste previous
+        (statut confirmé du service) et "inconclusive" vaut True. Si aucun
+        agent n'a répondu, le résultat local est gardé tel quel.
+        """
+        votes = {self.name: (local["status"] == "online", local["latency_ms"])}
+        for name, vote in remote.items():
+            VANTAGE_VOTES.inc(vantage=name, vote="missing" if vote is None else "online" if vote[0] else "down")
+            if vote is not None:
+                votes[name] = vote
+        VANTAGE_VOTES.inc(vantage=self.name, vote=local["status"])
+        if len(votes) == 1:
+            # Aucun agent joignable: le résultat local décide, sinon les statuts resteraient figés
+            VANTAGE_DECISIONS.inc(outcome="local_only")
+            return {**local, "votes": votes, "inconclusive": False}
+        up = sum(1 for online, _ in votes.values() if online)
+        down = len(votes) - up
+        result = {**local, "votes": votes, "inconclusive": False}
+        if down >= self.quorum:
+            status = "down"
+        elif up >= self.quorum:
+            status = "online"
+        else:
+            status = previous or local["status"]
+            result["inconclusive"] = True
+        result["status"] = status
+        if status != local["status"]:
+            if status == "online":
+                # Échec vu d'ici seulement: latence médiane des points de vue en ligne
+                latencies = [latency for online, latency in votes.values() if online and latency is not None]
+                result["latency_ms"] = int(statistics.median(latencies)) if latencies else None
+                result["phases"] = {}
+                result["skipped"] = False
+                result["error"] = None
+            else:
+                result["latency_ms"] = None
+                result["error"] = f"down vu par {down}/{len(votes)} points de vue"
+        outcome = "inconclusive" if result["inconclusive"] else "overruled" if status != local["status"] else "agreed"
+        VANTAGE_DECISIONS.inc(outcome=outcome)
+        return result
+
+    def stats(self):
+        return [{"name": agent.name, "url": agent.url, "requests": agent.requests, "errors": agent.errors,
+                 "available": agent.available, "last_error": agent.last_error} for agent in self.agents]
+
+
+class VantageAgent:
+    """Serveur d'un agent: POST /probe {"services": [...]} -> {"results": [[id, 0|1, latence]]}
+
+    delay (ms, plus jitter aléatoire) et loss (proportion de réponses
+    perdues, absentes des résultats) simulent un réseau dégradé depuis ce
+    point de vue. L'agent sonde les URL qu'on lui donne: sans VANTAGE_TOKEN
+    il n'écoute que sur localhost.
+    """
+
+    def __init__(self, name, token=VANTAGE_TOKEN, delay=0, jitter=0, loss=0.0, engine=None):
+        self.name = name
+        self.token = token
+        self.delay = delay
+        self.jitter = jitter
+        self.loss = loss
+        self.engine = engine or ProbeEngine()
+
+    async def _probe(self, service):
+        extra = self.delay + (random.uniform(0, self.jitter) if self.jitter else 0)
+        if extra:
+            await asyncio.sleep(extra / 1000)
+        if self.loss and random.random() < self.loss:
+            # Réponse perdue: le vote manque, il ne compte pas comme down
+            return None
+        result = await self.engine.probe(service)
+        latency = result["latency_ms"]
+        if latency is not None:
+            latency = int(latency + extra)
+        return [service["id"], 1 if result["status"] == "online" else 0, latency]
+
+    async def handle_probe(self, request):
+        if self.token and not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {self.token}"):
+            return web.json_response({"error": "Unauthorized"}, status=401)
+        try:
+            services = (await request.json())["services"]
+        except (ValueError, KeyError, TypeError):
+            return web.json_response({"error": "services attendus"}, status=400)
+        results = await asyncio.gather(*(self._probe(service) for service in services))
+        return web.json_response({"vantage": self.name, "results": [r for r in results if r is not None]})
+
+    async def handle_health(self, request):
+        return web.json_response({"vantage": self.name, "in_flight": self.engine.in_flight})
+
+    def create_app(self):
+        app = web.Application(client_max_size=16 * 1024 * 1024)
+        app.router.add_post("/probe", self.handle_probe)
+        app.router.add_get("/health", self.handle_health)
+        app.on_startup.append(lambda app: self.engine.start())
+        app.on_cleanup.append(lambda app: self.engine.close())
+        return app
+
+
+def agent_host(token, host=None):
+    """Adresse d'écoute: sans jeton, l'agent (qui sonde n'importe quelle URL) reste local"""
+    if host is None:
+        return "0.0.0.0" if token else "127.0.0.1"
+    if not token and host not in ("127.0.0.1", "localhost", "::1"):
+        raise ValueError("VANTAGE_TOKEN est requis pour écouter sur une autre adresse que localhost")
+    return host
+
+
+async def run_agent(agent, port=VANTAGE_PORT, host=None):
+    host = agent_host(agent.token, host)
+    runner = web.AppRunner(agent.create_app(), handle_signals=False)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    print(f"🛰️ Agent {agent.name} sur {host}:{port}")
+    if not agent.token:
+        print("⚠️ VANTAGE_TOKEN vide: agent limité à localhost")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Agent de probe DownDetector (point de vue distant)")
+    parser.add_argument("--name", required=True, help="nom du point de vue (celui de VANTAGE_AGENTS)")
+    parser.add_argument("--port", type=int, default=VANTAGE_PORT)
+    parser.add_argument("--host", default=None, help="adresse d'écoute (0.0.0.0 si VANTAGE_TOKEN est défini, sinon 127.0.0.1)")
+    parser.add_argument("--delay", type=float, default=0, help="latence ajoutée (ms), réseau simulé")
+    parser.add_argument("--jitter", type=float, default=0, help="latence aléatoire en plus (ms)")
+    parser.add_argument("--loss", type=float, default=0.0, help="proportion de probes perdues (0-1)")
+    args = parser.parse_args()
+    agent = VantageAgent(args.name, delay=args.delay, jitter=args.jitter, loss=args.loss)
+    try:
+        agent_host(agent.token, args.host)
+    except ValueError as e:
+        parser.error(str(e))
+    try:
+        asyncio.run(run_agent(agent, args.port, args.host))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
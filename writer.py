@@ -0,0 +1,185 @@
+"""Écriture asynchrone et groupée des résultats de probes"""
+import asyncio
+import json
+import os
+import shutil
+import time
+
+from config import WRITER_BATCH_SIZE, WRITER_FLUSH_MS, WRITER_MAX_QUEUE, WRITER_RETRIES, WRITER_SPILL_PATH
+from storage import get_storage, utcnow
+
+
+class ResultWriter:
+    """File d'écriture différée: les résultats sont envoyés par lots
+
+    Un lot part quand batch_size lignes sont en attente ou quand flush_ms
+    s'est écoulé depuis la première. La file est bornée: quand le stockage
+    ralentit, enqueue() attend (backpressure) au lieu de consommer de la
+    mémoire. Les appels au stockage (bloquants) tournent dans un thread.
+    Un lot qui échoue après toutes les tentatives est écrit dans
+    spill_path et renvoyé au prochain flush réussi. Chaque processus doit
+    avoir son propre spill_path.
+    """
+
+    def __init__(self, batch_size=WRITER_BATCH_SIZE, flush_ms=WRITER_FLUSH_MS, max_queue=WRITER_MAX_QUEUE,
+                 retries=WRITER_RETRIES, spill_path=WRITER_SPILL_PATH, storage=None):
+        self.storage = storage or get_storage()
+        self.batch_size = batch_size
+        self.flush_ms = flush_ms
+        self.retries = retries
+        self.spill_path = spill_path
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self._task = None
+        self.written = 0
+        self.spilled = 0
+
+    async def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        """Vide la file (lot en cours compris) avant l'arrêt"""
+        if self._task is not None and not self._task.done():
+            # Marqueur de fin: le lot en cours et le reste de la file partent avant l'arrêt
+            await self.queue.put(None)
+            await self._task
+        self._task = None
+
+    async def enqueue(self, ping, service_id, status=None):
+        """Ajoute un ping et/ou un nouveau statut du service à la file (attend si pleine)
+
+        status=None: le statut du service ne change pas, seul le ping est écrit.
+        """
+        await self.queue.put((ping, service_id, status))
+
+    async def _run(self):
+        while True:
+            item = await self.queue.get()
+            if item is None:
+                return
+            batch = [item]
+            stopping = False
+            deadline = time.monotonic() + self.flush_ms / 1000
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            try:
+                await self._flush(batch)
+            except Exception as e:
+                print(f"⚠️ Erreur writer: {e}")
+            if stopping:
+                return
+
+    async def _flush(self, batch):
+        pings = [ping for ping, _, _ in batch if ping is not None]
+        # Dernier statut connu par service, puis regroupé par statut
+        statuses = {}
+        for _, service_id, status in batch:
+            if status is not None:
+                statuses[service_id] = status
+        by_status = {}
+        for service_id, status in statuses.items():
+            by_status.setdefault(status, []).append(service_id)
+
+        # Les lots en attente partent d'abord, pour qu'un vieux statut
+        # n'écrase jamais un statut plus récent.
+        pending = {"pings": pings, "statuses": by_status}
+        if not await self._replay_spill():
+            await self._spill(pending)
+        elif await self._send(pending):
+            self.written += len(pings)
+            if pings:
+                print(f"✅ {len(pings)} logs enregistrés")
+        else:
+            await self._spill(pending)
+
+    async def _send(self, pending):
+        """Un insert groupé dans pings + une mise à jour groupée par statut
+
+        Ce qui est passé est retiré de pending, pour ne jamais renvoyer deux
+        fois les mêmes pings. Retourne True si tout est passé.
+        """
+        now = utcnow()
+        for attempt in range(self.retries):
+            try:
+                if pending["pings"]:
+                    await asyncio.to_thread(self.storage.insert_pings, pending["pings"])
+                    pending["pings"] = []
+                while pending["statuses"]:
+                    status, ids = next(iter(pending["statuses"].items()))
+                    await asyncio.to_thread(self.storage.set_status, ids, status, now)
+                    del pending["statuses"][status]
+                return True
+            except Exception as e:
+                print(f"⚠️ Erreur flush (essai {attempt + 1}/{self.retries}): {e}")
+                if attempt + 1 < self.retries:
+                    await asyncio.sleep(min(2 ** attempt, 30))
+        return False
+
+    async def _spill(self, pending):
+        try:
+            # Hors de la boucle: pendant une panne le disque peut être lent lui aussi,
+            # et les probes doivent continuer
+            await asyncio.to_thread(self._append_spill, json.dumps(pending) + "\n")
+            self.spilled += len(pending["pings"])
+            print(f"⚠️ {len(pending['pings'])} logs mis de côté dans {self.spill_path}")
+        except Exception as e:
+            print(f"❌ Impossible d'écrire le spill: {e}")
+
+    def _append_spill(self, line):
+        with open(self.spill_path, "a", encoding="utf-8") as f:
+            f.write(line)
+
+    async def _replay_spill(self):
+        """Renvoie, dans l'ordre, les lots mis de côté pendant une panne du stockage
+
+        Le fichier est lu ligne à ligne (il peut être gros après une longue
+        panne). Un fichier .replay laissé par un arrêt en cours de reprise
+        est repris en premier. Retourne False si le stockage est toujours
+        indisponible.
+        """
+        replay_path = self.spill_path + ".replay"
+        # Après un .replay laissé par un arrêt, le spill plus récent passe aussi
+        while True:
+            if not os.path.exists(replay_path):
+                if not os.path.exists(self.spill_path):
+                    return True
+                os.replace(self.spill_path, replay_path)
+            replayed = True
+            with open(replay_path, encoding="utf-8") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    entry = json.loads(line)
+                    count = len(entry["pings"])
+                    if not await self._send(entry):
+                        # Le stockage est de nouveau indisponible: le reste repasse
+                        # devant les lots mis de côté depuis, sans être recompté
+                        await asyncio.to_thread(self._requeue, entry, f)
+                        replayed = False
+                        break
+                    self.written += count
+                    print(f"✅ {count} logs récupérés du spill")
+            os.remove(replay_path)
+            if not replayed:
+                return False
+
+    def _requeue(self, entry, rest):
+        """Réécrit le spill: entry, les lignes restantes de rest, puis le spill actuel"""
+        tmp_path = self.spill_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as out:
+            out.write(json.dumps(entry) + "\n")
+            shutil.copyfileobj(rest, out)
+            if os.path.exists(self.spill_path):
+                with open(self.spill_path, encoding="utf-8") as newer:
+                    shutil.copyfileobj(newer, out)
+        os.replace(tmp_path, self.spill_path)